@@ -0,0 +1 @@
+"""Load tests and micro-benchmarks; see ``benchmarks.loadtest``."""
@@ -0,0 +1,261 @@
+"""Reproducible load test of the web tier against local upstream stubs.
+
+Starts the Nominatim and Open-Meteo stubs (``benchmarks.stubs``), migrates
+the database and starts gunicorn with ``gunicorn.conf.py`` (the settings
+``startup.sh`` deploys with), pointed at the stubs. Then it drives a mix of
+page searches, JSON API calls and autocomplete requests from concurrent
+clients. Searched places follow a Zipf distribution over resorts and towns,
+so popular places are cache hits and the long tail misses, as in real
+traffic.
+
+The report has requests/sec, p50/p95/p99 latency, errors and the number of
+calls that reached each upstream. ``--save`` writes it as JSON. With
+``--baseline`` the run fails (exit status 1) when throughput drops or p95
+latency grows by more than ``--max-regression`` compared with a saved
+report::
+
+    python -m benchmarks.loadtest --duration 30 --save baseline.json
+    python -m benchmarks.loadtest --duration 30 --baseline baseline.json
+
+Database and cache come from the usual settings (``DJANGO_SETTINGS_MODULE``
+and the ``DB*``/``CACHELOCATION`` environment variables). Use a throwaway
+database: the run writes snapshots and search statistics.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from .stubs import start_stubs
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Towns and cities that aren't in the gazetteer, so they exercise geocoding.
+TOWNS = [
+    "Innsbruck", "Salzburg", "Munich", "Grenoble", "Geneva", "Bolzano", "Turin", "Zurich",
+    "Chur", "Annecy", "Bern", "Lucerne", "Trento", "Lyon", "Milan", "Bergen",
+]
+DEFAULT_MIX = "page=70,api=20,autocomplete=10"
+
+
+def places():
+    with open(ROOT / "ski_app" / "data" / "resorts.csv", newline="", encoding="utf-8") as f:
+        resorts = [row["name"] for row in csv.DictReader(f)]
+    # Interleave so both kinds appear among the most popular places.
+    mixed = [place for pair in zip(resorts, TOWNS) for place in pair]
+    return mixed + resorts[len(TOWNS):]
+
+
+class Workload:
+    """Picks the next request for a client from a seeded random stream."""
+
+    def __init__(self, mix, seed, zipf_s=1.1):
+        self.places = places()
+        self.weights = [1 / rank**zipf_s for rank in range(1, len(self.places) + 1)]
+        self.kinds, self.kind_weights = zip(*mix.items())
+        self.seed = seed
+
+    def requests(self, client):
+        rng = random.Random(f"{self.seed}:{client}")
+        while True:
+            kind = rng.choices(self.kinds, self.kind_weights)[0]
+            place = rng.choices(self.places, self.weights)[0]
+            if kind == "page":
+                yield kind, "/", {"city": place}
+            elif kind == "api":
+                yield kind, "/api/forecast/", {"city": place}
+            else:
+                yield kind, "/api/autocomplete/", {"q": place[: rng.randint(2, 4)]}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * p / 100), len(sorted_values) - 1)]
+
+
+def drive(base_url, workload, concurrency, duration, warmup):
+    """Run clients for ``warmup + duration`` seconds; returns ``(kind, seconds, ok)`` samples."""
+    samples, lock = [], threading.Lock()
+    start = time.monotonic()
+    record_from, deadline = start + warmup, start + warmup + duration
+
+    def client(n):
+        session = requests.Session()
+        local = []
+        for kind, path, params in workload.requests(n):
+            sent = time.monotonic()
+            if sent >= deadline:
+                break
+            try:
+                response = session.get(base_url + path, params=params, timeout=60)
+                ok = response.status_code < 500
+            except requests.RequestException:
+                ok = False
+            if sent >= record_from:
+                local.append((kind, time.monotonic() - sent, ok))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def summarize(samples, duration):
+    def stats(group):
+        latencies = sorted(seconds for _, seconds, _ in group)
+        return {
+            "requests": len(group),
+            "errors": sum(not ok for *_, ok in group),
+            "rps": round(len(group) / duration, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        }
+
+    report = stats(samples)
+    report["by_kind"] = {
+        kind: stats([s for s in samples if s[0] == kind]) for kind in sorted({s[0] for s in samples})
+    }
+    return report
+
+
+def compare(report, baseline, max_regression):
+    """Regressions of ``report`` against ``baseline``, as messages."""
+    problems = []
+    if report["rps"] < baseline["rps"] * (1 - max_regression):
+        problems.append(f"throughput {report['rps']} req/s < baseline {baseline['rps']} req/s")
+    if report["p95_ms"] > baseline["p95_ms"] * (1 + max_regression):
+        problems.append(f"p95 {report['p95_ms']} ms > baseline {baseline['p95_ms']} ms")
+    return problems
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} didn't come up within {timeout}s")
+
+
+def start_app(env, workers, asgi, log):
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--noinput"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT, check=True,
+    )
+    port = free_port()
+    app = "skiproject.asgi:application" if asgi else "skiproject.wsgi"
+    command = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}"]
+    if workers:
+        command += ["--workers", str(workers)]
+    process = subprocess.Popen(command + [app], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(url + "/", process)
+    except Exception:
+        process.terminate()
+        raise
+    return process, url
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("page", "api", "autocomplete"):
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind!r}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds.")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before that.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients.")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Default: {DEFAULT_MIX}")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--upstream-latency", type=float, default=0.08, help="Stub answer delay in seconds.")
+    parser.add_argument("--upstream-jitter", type=float, default=0.02)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, help="Override the gunicorn worker count.")
+    parser.add_argument("--asgi", action="store_true", help="Serve with uvicorn workers (ASGI=1).")
+    parser.add_argument("--url", help="Load an already running server instead of starting one.")
+    parser.add_argument("--save", type=Path, help="Write the report to this JSON file.")
+    parser.add_argument("--baseline", type=Path, help="Fail on regressions against this report.")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    stubs = start_stubs(args.upstream_latency, args.upstream_jitter, args.upstream_error_rate, args.seed)
+    env = {
+        **os.environ,
+        "NOMINATIM_URL": stubs["nominatim"].url + "search",
+        "OPEN_METEO_URL": stubs["open-meteo"].url + "v1/forecast",
+        "OPEN_METEO_ARCHIVE_URL": stubs["open-meteo-archive"].url + "v1/archive",
+    }
+    if args.asgi:
+        env["ASGI"] = "1"
+
+    process = None
+    with tempfile.NamedTemporaryFile("w+", prefix="loadtest-gunicorn-", suffix=".log", delete=False) as log:
+        try:
+            if args.url:
+                url = args.url.rstrip("/")
+            else:
+                process, url = start_app(env, args.workers, args.asgi, log)
+            samples = drive(url, Workload(args.mix, args.seed), args.concurrency, args.duration, args.warmup)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    report = summarize(samples, args.duration)
+    report["upstream_calls"] = {name: dict(stub.counters) for name, stub in stubs.items()}
+    report["config"] = {
+        key: getattr(args, key)
+        for key in ("duration", "concurrency", "seed", "upstream_latency", "upstream_jitter",
+                    "upstream_error_rate", "workers", "asgi")
+    }
+    report["config"]["mix"] = args.mix
+
+    print(json.dumps(report, indent=2))
+    print(f"gunicorn log: {log.name}", file=sys.stderr)
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    if args.baseline:
+        problems = compare(report, json.loads(args.baseline.read_text()), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
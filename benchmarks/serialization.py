@@ -0,0 +1,106 @@
+"""Size and speed of cached forecast entries per Redis serializer/compressor.
+
+Builds forecast cache entries the way the app does (``new_entry`` over the
+``benchmarks.stubs`` Open-Meteo payloads, 7 days of hourly data) and runs
+them through django-redis serializer/compressor pairs, without a Redis
+server: what django-redis writes is what Redis keeps, so the stored size is
+the value's memory in Redis apart from the per-key overhead.
+
+    python -m benchmarks.serialization --entries 200
+
+``decode`` includes reading every hourly series once: lists for pickle,
+arrays for the packed format.
+"""
+import argparse
+import os
+import sys
+import time
+
+import django
+
+COMBINATIONS = [
+    ("pickle", "zlib"),
+    ("pickle", "lz4"),
+    ("packed", "none"),
+    ("packed", "zlib"),
+    ("packed", "lz4"),
+]
+SERIALIZERS = {
+    "pickle": "django_redis.serializers.pickle.PickleSerializer",
+    "packed": "ski_app.serializers.ForecastSerializer",
+}
+COMPRESSORS = {
+    "none": "django_redis.compressors.identity.IdentityCompressor",
+    "zlib": "django_redis.compressors.zlib.ZlibCompressor",
+    "lz4": "django_redis.compressors.lz4.Lz4Compressor",
+}
+
+
+def forecast_entries(count):
+    from ski_app.forecast import FORECAST_PARAMS, new_entry
+
+    from .stubs import open_meteo_response
+
+    entries = []
+    for i in range(count):
+        lat, lon = 45.5 + i * 0.0137, 6.0 + i * 0.0291
+        data = open_meteo_response(
+            {"latitude": [str(lat)], "longitude": [str(lon)], "timezone": [FORECAST_PARAMS["timezone"]]}
+        )
+        entries.append(new_entry(data, time.time()))
+    return entries
+
+
+def measure(entries, serializer, compressor, repeat):
+    from django.utils.module_loading import import_string
+
+    serializer = import_string(SERIALIZERS[serializer])({})
+    compressor = import_string(COMPRESSORS[compressor])({})
+    encoded = [compressor.compress(serializer.dumps(entry)) for entry in entries]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for entry in entries:
+            compressor.compress(serializer.dumps(entry))
+    encode = (time.perf_counter() - start) / (repeat * len(entries))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for value in encoded:
+            entry = serializer.loads(compressor.decompress(value))
+            for series in entry["data"]["hourly"].values():
+                series[-1]
+    decode = (time.perf_counter() - start) / (repeat * len(entries))
+
+    return {
+        "bytes": sum(map(len, encoded)) / len(encoded),
+        "encode_us": encode * 1e6,
+        "decode_us": decode * 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200, help="Distinct forecast entries.")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the entries per timing.")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "skiproject.settings")
+    django.setup()
+    entries = forecast_entries(args.entries)
+
+    results = {pair: measure(entries, *pair, args.repeat) for pair in COMBINATIONS}
+    baseline = results[COMBINATIONS[0]]
+    print(f"{'serializer':<10} {'compressor':<10} {'bytes/entry':>12} {'encode µs':>10} {'decode µs':>10}")
+    for (serializer, compressor), result in results.items():
+        print(
+            f"{serializer:<10} {compressor:<10} {result['bytes']:>12,.0f} "
+            f"{result['encode_us']:>10.1f} {result['decode_us']:>10.1f}"
+            f"   ({result['bytes'] / baseline['bytes']:.0%} of the size,"
+            f" {baseline['decode_us'] / result['decode_us']:.1f}x decode speed)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Cold-start benchmark: import time, time to first response and memory.
+
+Measures what a scale-out event costs a new web container:
+
+* ``import``: a fresh interpreter running ``django.setup()`` and loading
+  the URLconf, with the slowest imports by package (``-X importtime``);
+* ``boot``: seconds from starting the container's commands to the first
+  successful response, for the classic sequence (``manage.py migrate``,
+  then gunicorn) and for ``FAST_START=1`` (gunicorn only, app preloaded in
+  the master);
+* the proportional set size (PSS) of gunicorn and its workers once up,
+  where ``/proc`` reports it, which shows the memory workers share.
+
+    python -m benchmarks.startup --runs 3 --workers 4
+
+Database and cache come from the usual settings, as for
+``benchmarks.loadtest``. The database is migrated once up front, so both
+sequences are timed with no migrations pending, the common case.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from .loadtest import ROOT, free_port, wait_until_up
+
+SETUP_CODE = "import django; django.setup(); import skiproject.urls"
+
+
+def import_time(runs):
+    """Wall times of ``SETUP_CODE`` in fresh interpreters, and the slowest packages to import."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", SETUP_CODE], cwd=ROOT, check=True)
+        times.append(time.perf_counter() - started)
+
+    profile = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SETUP_CODE], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stderr
+    by_package = defaultdict(int)
+    for self_us, name in re.findall(r"import time:\s+(\d+) \|\s+\d+ \|\s*([\w.]+)", profile):
+        by_package[name.split(".")[0]] += int(self_us)
+    slowest = sorted(by_package.items(), key=lambda item: -item[1])[:10]
+    return {
+        "min_s": round(min(times), 3),
+        "median_s": round(statistics.median(times), 3),
+        "slowest_packages_ms": {name: round(us / 1000, 1) for name, us in slowest},
+    }
+
+
+def pss_mb(pid):
+    """PSS of ``pid`` and its child processes in MB, or None where /proc doesn't report it."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids = [pid, *map(int, f.read().split())]
+        total = 0
+        for p in pids:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                total += int(re.search(r"^Pss:\s+(\d+) kB", f.read(), re.M).group(1))
+        return round(total / 1024, 1)
+    except (OSError, AttributeError):
+        return None
+
+
+def boot(fast, workers, log):
+    """Start the container's commands; returns seconds to the first response and the PSS once up."""
+    env = {**os.environ, "GUNICORN_WORKERS": str(workers)}
+    env.pop("FAST_START", None)
+    if fast:
+        env["FAST_START"] = "1"
+    started = time.perf_counter()
+    if not fast:
+        subprocess.run(
+            [sys.executable, "manage.py", "migrate", "--noinput"],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT, check=True,
+        )
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "skiproject.wsgi"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        wait_until_up(f"http://127.0.0.1:{port}/", process)
+        elapsed = time.perf_counter() - started
+        # Let the other workers finish booting before measuring memory.
+        time.sleep(2)
+        return elapsed, pss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Repetitions of each measurement.")
+    parser.add_argument("--workers", type=int, default=2, help="Gunicorn workers.")
+    parser.add_argument("--save", help="Write the report to this JSON file.")
+    args = parser.parse_args(argv)
+
+    with open(os.devnull, "w") as log:
+        subprocess.run([sys.executable, "manage.py", "migrate", "--noinput"], cwd=ROOT, stdout=log, check=True)
+        report = {"import": import_time(args.runs)}
+        for name, fast in (("classic", False), ("fast_start", True)):
+            runs = [boot(fast, args.workers, log) for _ in range(args.runs)]
+            report[name] = {
+                "first_response_s": round(statistics.median(seconds for seconds, _ in runs), 2),
+                "pss_mb": runs[-1][1],
+            }
+    report["config"] = {"runs": args.runs, "workers": args.workers}
+
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            f.write(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Local stand-ins for Nominatim, Open-Meteo and the Open-Meteo archive.
+
+Each stub is a threaded HTTP server on 127.0.0.1 that answers in the
+upstream's JSON format after a configurable delay, and fails a
+configurable share of requests with a 503. Responses are deterministic
+functions of the query, so runs with the same seed see the same data.
+
+Run them on their own to point a development server at them::
+
+    python -m benchmarks.stubs --latency 0.08 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FORECAST_HOURS = 24 * 7
+FORECAST_DAYS = 7
+
+
+def _unit(*parts):
+    """A stable pseudo-random number in [0, 1) derived from ``parts``."""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+def nominatim_response(query):
+    """Nominatim ``/search`` results for ``q``: one place in the Alps, or none."""
+    q = query.get("q", [""])[0]
+    if not q or q.lower().startswith("nowhere"):
+        return []
+    return [{
+        "lat": f"{45.5 + 2.5 * _unit(q, 'lat'):.5f}",
+        "lon": f"{6.0 + 8.0 * _unit(q, 'lon'):.5f}",
+        "display_name": f"{q}, Stub",
+    }]
+
+
+def _forecast(lat, lon, query):
+    start = datetime.combine(date.today(), datetime.min.time())
+    hours = [start + timedelta(hours=i) for i in range(FORECAST_HOURS)]
+    days = [start.date() + timedelta(days=i) for i in range(FORECAST_DAYS)]
+    base = -10 + 10 * _unit(lat, lon)
+    return {
+        "latitude": float(lat),
+        "longitude": float(lon),
+        "timezone": query.get("timezone", ["GMT"])[0],
+        "utc_offset_seconds": 0,
+        "current": {
+            "temperature_2m": round(base, 1),
+            "snow_depth": round(_unit(lat, lon, "depth") * 2, 2),
+            "snowfall": round(_unit(lat, lon, "snow"), 1),
+            "weather_code": 71,
+        },
+        "hourly": {
+            "time": [h.strftime("%Y-%m-%dT%H:%M") for h in hours],
+            "temperature_2m": [round(base + 5 * _unit(lat, lon, i), 1) for i in range(FORECAST_HOURS)],
+            "snowfall": [round(_unit(lat, lon, "s", i) ** 4 * 3, 2) for i in range(FORECAST_HOURS)],
+            "snow_depth": [round(_unit(lat, lon, "depth") * 2, 2)] * FORECAST_HOURS,
+            "weather_code": [71 if _unit(lat, lon, "w", i) > 0.5 else 3 for i in range(FORECAST_HOURS)],
+            "cloud_cover": [int(100 * _unit(lat, lon, "c", i)) for i in range(FORECAST_HOURS)],
+        },
+        "daily": {
+            "time": [d.isoformat() for d in days],
+            "temperature_2m_max": [round(base + 5, 1)] * FORECAST_DAYS,
+            "temperature_2m_min": [round(base - 5, 1)] * FORECAST_DAYS,
+            "sunshine_duration": [round(36000 * _unit(lat, lon, "sun", i)) for i in range(FORECAST_DAYS)],
+        },
+    }
+
+
+def open_meteo_response(query):
+    """Open-Meteo ``/v1/forecast``: an object for one location, a list for several."""
+    latitudes = query.get("latitude", ["0"])[0].split(",")
+    longitudes = query.get("longitude", ["0"])[0].split(",")
+    forecasts = [_forecast(lat, lon, query) for lat, lon in zip(latitudes, longitudes)]
+    return forecasts[0] if len(forecasts) == 1 else forecasts
+
+
+def archive_response(query):
+    """Open-Meteo archive ``/v1/archive``: daily snowfall and mean temperature, hourly snow depth.
+
+    Every location gets a plausible winter: a seasonal temperature curve,
+    snow on some cold days, a snowpack that builds up and melts.
+    """
+    lat, lon = query.get("latitude", ["0"])[0], query.get("longitude", ["0"])[0]
+    start = date.fromisoformat(query["start_date"][0])
+    end = date.fromisoformat(query["end_date"][0])
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    altitude = _unit(lat, lon, "altitude")
+    temperature, snowfall, depth, snowpack = [], [], [], 0.0
+    for day in days:
+        season = math.cos(2 * math.pi * (day.timetuple().tm_yday - 20) / 365.25)
+        mean = round(4 - 8 * altitude - 9 * season + 4 * (_unit(lat, lon, day, "t") - 0.5), 1)
+        snow = round(30 * _unit(lat, lon, day, "s") ** 4, 1) if mean < 1 else 0.0
+        # New snow settles to about a third of its depth.
+        snowpack = max(snowpack + snow / 300 - max(mean, 0) * 0.03, 0.0)
+        temperature.append(mean)
+        snowfall.append(snow)
+        depth.append(round(snowpack, 2))
+    return {
+        "latitude": float(lat),
+        "longitude": float(lon),
+        "timezone": "GMT",
+        "utc_offset_seconds": 0,
+        "daily": {
+            "time": [day.isoformat() for day in days],
+            "snowfall_sum": snowfall,
+            "temperature_2m_mean": temperature,
+        },
+        "hourly": {
+            "time": [f"{day.isoformat()}T{hour:02d}:00" for day in days for hour in range(24)],
+            "snow_depth": [value for value in depth for _ in range(24)],
+        },
+    }
+
+
+class StubServer(ThreadingHTTPServer):
+    """Serves ``respond(query)`` as JSON after ``latency`` ± ``jitter`` seconds."""
+
+    daemon_threads = True
+
+    def __init__(self, respond, latency=0.05, jitter=0.0, error_rate=0.0, seed=0, port=0):
+        super().__init__(("127.0.0.1", port), _StubHandler)
+        self.respond = respond
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.counters = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def _draw(self):
+        with self._lock:
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0)
+            failed = self._random.random() < self.error_rate
+            self.counters["calls"] += 1
+            self.counters["errors"] += failed
+        return delay, failed
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        delay, failed = self.server._draw()
+        time.sleep(delay)
+        if failed:
+            status, body = 503, b'{"error": true, "reason": "stub failure"}'
+        else:
+            status = 200
+            body = json.dumps(self.server.respond(parse_qs(urlsplit(self.path).query))).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stubs(latency=0.05, jitter=0.0, error_rate=0.0, seed=0):
+    """Start the stubs; returns ``{"nominatim": server, "open-meteo": server, "open-meteo-archive": server}``."""
+    return {
+        "nominatim": StubServer(nominatim_response, latency, jitter, error_rate, seed).start(),
+        "open-meteo": StubServer(open_meteo_response, latency, jitter, error_rate, seed + 1).start(),
+        "open-meteo-archive": StubServer(archive_response, latency, jitter, error_rate, seed + 2).start(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before each answer.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random ± added to the latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    stubs = start_stubs(args.latency, args.jitter, args.error_rate, args.seed)
+    print(f"NOMINATIM_URL={stubs['nominatim'].url}search")
+    print(f"OPEN_METEO_URL={stubs['open-meteo'].url}v1/forecast")
+    print(f"OPEN_METEO_ARCHIVE_URL={stubs['open-meteo-archive'].url}v1/archive")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,12 @@
 import logging
+import math
+import random
 import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import Any
 
 import pandas as pd
@@ -11,15 +18,26 @@ from PureCloudPlatformClientV2.rest import ApiException
 
 task_logger = logging.getLogger("airflow.task")
 
+# Responses to retry: rate limiting and server errors.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+BASE_RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+# States an asynchronous details job ends in without results.
+FAILED_JOB_STATES = {"FAILED", "CANCELLED", "EXPIRED"}
+# Endpoint parameters a manually triggered run may override with its dag_run.conf.
+RUN_CONF_OVERRIDES = ("interval", "mode")
+
 
 ##################################Initialize client#####################################
 
 
-def initialize_api_client(secrets: tuple) -> Any:
+def initialize_api_client(secrets: tuple, host: str | None = None) -> Any:
     """Initializes Genesys API client based on client_id and client_secret.
 
     Args:
         secrets: Tuple of client credentials secrets, fetched from Airflow Variables.
+        host: API host to use instead of the eu_central_1 region, e.g. the local
+            stub of stubs/genesys_api.py.
 
     Returns:
         Initialized and configured API client.
@@ -27,7 +45,7 @@ def initialize_api_client(secrets: tuple) -> Any:
     client = PureCloudPlatformClientV2
 
     region = client.PureCloudRegionHosts.eu_central_1
-    client.configuration.host = region.get_api_host()
+    client.configuration.host = host or region.get_api_host()
 
     token = client.api_client.ApiClient().get_client_credentials_token(
         client_id=secrets[0],
@@ -157,11 +175,233 @@ def transform_to_conversations_segments_participants(
     return df_conversations, df_participants_per_call, df_segments_per_call
 
 
+class RequestThrottle:
+    """Shares rate-limit feedback between the threads fetching pages.
+
+    At most ``limit`` requests are in flight at once. A 429 response pauses every
+    thread until its Retry-After delay has passed and halves ``limit``; each
+    successful request raises it by one again, up to ``max_concurrency``.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.resume_at = 0.0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            while True:
+                delay = self.resume_at - time.monotonic()
+                if delay <= 0 and self.in_flight < self.limit:
+                    break
+                self.condition.wait(timeout=delay if delay > 0 else None)
+            self.in_flight += 1
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def succeeded(self):
+        """Allows one more request in flight, up to ``max_concurrency``."""
+        with self.condition:
+            self.limit = min(self.limit + 1, self.max_concurrency)
+            self.condition.notify_all()
+
+    def throttled(self, delay: float):
+        """Halves the requests in flight and pauses them all for ``delay`` seconds."""
+        with self.condition:
+            self.limit = max(self.limit // 2, 1)
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+
+def retry_delay(exception: ApiException, attempt: int) -> float:
+    """Returns the seconds to wait before retrying a failed request.
+
+    Args:
+        exception: The exception raised by the failed request.
+        attempt: The number of retries made so far.
+
+    Returns:
+        The response's Retry-After delay if it has one, otherwise an exponential
+        backoff with jitter. Either is capped at ``MAX_RETRY_DELAY`` seconds.
+    """
+    retry_after = (exception.headers or {}).get("Retry-After", "")
+    try:
+        delay = float(retry_after)
+    except ValueError:
+        delay = BASE_RETRY_DELAY * 2**attempt * random.uniform(0.5, 1)
+    return min(delay, MAX_RETRY_DELAY)
+
+
+def call_with_retries(
+    request: Callable[[], Any],
+    description: str,
+    throttle: RequestThrottle,
+    max_retries: int,
+) -> Any:
+    """Sends a Genesys API request, retrying it on rate limiting and server errors.
+
+    Requests answered with 429 or 5xx are retried up to ``max_retries`` times,
+    waiting as long as the API asks to; any other error is raised at once.
+
+    Args:
+        request: Sends the request and returns the API response.
+        description: What is requested, for the log.
+        throttle: The RequestThrottle shared by all requests to the API.
+        max_retries: The number of retries before the error is raised.
+
+    Returns:
+        The API response.
+    """
+    attempt = 0
+    while True:
+        try:
+            with throttle:
+                api_response = request()
+        except ApiException as e:
+            if e.status not in RETRYABLE_STATUSES or attempt == max_retries:
+                raise
+            delay = retry_delay(e, attempt)
+            task_logger.info(
+                f"ConversationsApi returned {e.status} for {description}, "
+                f"retrying in {delay:.1f}s ({attempt + 1}/{max_retries})."
+            )
+            if e.status == 429:
+                throttle.throttled(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+            continue
+        throttle.succeeded()
+        return api_response
+
+
+def fetch_conversations_page(
+    client: Any,
+    conv_api: Any,
+    params: dict,
+    page_number: int,
+    throttle: RequestThrottle,
+) -> Any:
+    """Fetches one page of the analytics conversation details query.
+
+    Args:
+        client: An instance of the Genesys PureCloudPlatformClientV2 client.
+        conv_api: The ConversationsApi to send the query with.
+        params: A config file containing parameters.
+        page_number: The page to fetch, starting at 1.
+        throttle: The RequestThrottle shared by all page requests.
+
+    Returns:
+        The API response for the page.
+    """
+    query = client.ConversationQuery()
+    query.interval = params["interval"]
+    query.paging = PureCloudPlatformClientV2.PagingSpec()
+    query.paging.page_size = params["page_size"]
+    query.paging.page_number = page_number
+
+    return call_with_retries(
+        lambda: conv_api.post_analytics_conversations_details_query(query),
+        f"page {page_number}",
+        throttle,
+        params.get("max_retries", 5),
+    )
+
+
+def concat_call_log_pages(
+    pages: Iterable[list],
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Transforms pages of conversations and concatenates them in page order.
+
+    Args:
+        pages: Lists of conversation entities, one per page of API results.
+
+    Returns:
+        The conversations, participants and segments DataFrames of all pages.
+    """
+    all_calls, all_participants, all_segments = [], [], []
+
+    for conversations in pages:
+        if not conversations:
+            continue
+
+        calls_page, participants_page, segments_page = (
+            transform_to_conversations_segments_participants(conversations)
+        )
+
+        all_calls.append(calls_page)
+        all_participants.append(participants_page)
+        all_segments.append(segments_page)
+
+    df_calls = pd.concat(all_calls, ignore_index=True)
+    df_participants = pd.concat(all_participants, ignore_index=True)
+    df_segments = pd.concat(all_segments, ignore_index=True)
+
+    return df_calls, df_participants, df_segments
+
+
+def run_params(params: dict, conf: dict | None) -> dict:
+    """Applies the overrides of a DAG run's configuration to the endpoint parameters.
+
+    Scheduled call_logs runs cover one hour each. A backfill is triggered by hand
+    with the interval to extract as configuration, e.g. ``{"interval":
+    "2024-01-01T00:00:00+00:00/2024-02-01T00:00:00+00:00"}``; ``use_details_job``
+    then picks the details job for it. ``"mode"`` forces one of the two modes.
+
+    Args:
+        params: The parameters of the endpoint from configs/endpoints.json.
+        conf: The ``dag_run.conf`` of the run, if any.
+
+    Returns:
+        The parameters to extract with.
+    """
+    conf = conf or {}
+    overrides = {key: conf[key] for key in RUN_CONF_OVERRIDES if key in conf}
+    if overrides:
+        task_logger.info(f"Overriding endpoint parameters with {overrides}.")
+    return {**params, **overrides}
+
+
+def parse_interval(interval: str) -> tuple[datetime, datetime]:
+    """Splits an ISO-8601 ``start/end`` interval into its two datetimes."""
+    start, end = (datetime.fromisoformat(part) for part in interval.split("/"))
+    return start, end
+
+
+def use_details_job(params: dict) -> bool:
+    """Tells whether to extract ``params["interval"]`` with a details job.
+
+    Intervals longer than ``params["job_min_hours"]`` hours are extracted with a
+    job; shorter ones, such as the scheduled hourly runs, with the query. Longer
+    intervals come from manually triggered backfill runs, see ``run_params``.
+    ``params["mode"]`` set to ``"query"`` or ``"job"`` overrides this.
+
+    Args:
+        params: A config file containing parameters.
+
+    Returns:
+        True to use ``extract_call_logs_with_job``.
+    """
+    mode = params.get("mode")
+    if mode is not None:
+        return mode == "job"
+    start, end = parse_interval(params["interval"])
+    return (end - start).total_seconds() > params.get("job_min_hours", 24) * 3600
+
+
 def extract_call_logs(
     client: Any, params: dict
 ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """Fetches and returns call log information from the ConversationsApi response.
 
+    Long intervals are extracted with an asynchronous details job, see
+    ``use_details_job`` and ``extract_call_logs_with_job``; others with the
+    paged details query of ``fetch_query_pages``.
+
     Args:
         client: An instance of the Genesys PureCloudPlatformClientV2 client.
         params: A config file containing parameters.
@@ -169,45 +409,213 @@ def extract_call_logs(
     Returns:
         A pandas DataFrame containing all requested call log information.
     """
+    if use_details_job(params):
+        return extract_call_logs_with_job(client, params)
+    return concat_call_log_pages(fetch_query_pages(client, params))
+
+
+def fetch_query_pages(client: Any, params: dict) -> list[list]:
+    """Fetches the conversations of ``params["interval"]`` with the details query.
+
+    The first page tells how many conversations there are; the remaining pages
+    are then fetched ``params["max_concurrent_pages"]`` at a time. Without a
+    total, pages are fetched in batches of that size until one comes back empty.
+
+    Args:
+        client: An instance of the Genesys PureCloudPlatformClientV2 client.
+        params: A config file containing parameters.
+
+    Returns:
+        Lists of conversation entities, one per page, in page order.
+    """
     conv_api = client.ConversationsApi()
-    query = client.ConversationQuery()
-    query.paging = PureCloudPlatformClientV2.PagingSpec()
+    max_concurrency = params.get("max_concurrent_pages", 4)
+    throttle = RequestThrottle(max_concurrency)
+
+    def fetch_page(page_number: int) -> list:
+        api_response = fetch_conversations_page(
+            client, conv_api, params, page_number, throttle
+        )
+        return api_response.conversations or []
+
+    first_page = fetch_conversations_page(client, conv_api, params, 1, throttle)
+    pages = [first_page.conversations or []]
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        if first_page.total_hits is not None:
+            last_page = math.ceil(first_page.total_hits / params["page_size"])
+            # executor.map returns the pages in page order.
+            pages.extend(executor.map(fetch_page, range(2, last_page + 1)))
+        else:
+            while pages[-1]:
+                batch = range(len(pages) + 1, len(pages) + 1 + max_concurrency)
+                pages.extend(executor.map(fetch_page, batch))
+
+    return pages
+
+
+def job_data_available_until(conv_api: Any, params: dict) -> datetime:
+    """Returns the time up to which details jobs have data.
 
+    Args:
+        conv_api: The ConversationsApi to ask.
+        params: A config file containing parameters.
+
+    Returns:
+        The data availability date; conversations after it are only available
+        through the details query.
+    """
+    api_response = call_with_retries(
+        conv_api.get_analytics_conversations_details_jobs_availability,
+        "the job data availability",
+        RequestThrottle(1),
+        params.get("max_retries", 5),
+    )
+    return api_response.data_availability_date
+
+
+def submit_conversations_job(client: Any, conv_api: Any, params: dict) -> str:
+    """Submits an asynchronous conversation details job for ``params["interval"]``.
+
+    Args:
+        client: An instance of the Genesys PureCloudPlatformClientV2 client.
+        conv_api: The ConversationsApi to submit the job with.
+        params: A config file containing parameters.
+
+    Returns:
+        The id of the job.
+    """
+    query = client.AsyncConversationQuery()
     query.interval = params["interval"]
+    api_response = call_with_retries(
+        lambda: conv_api.post_analytics_conversations_details_jobs(query),
+        "the job submission",
+        RequestThrottle(1),
+        params.get("max_retries", 5),
+    )
+    task_logger.info(
+        f"Submitted conversation details job {api_response.job_id} "
+        f"for {params['interval']}."
+    )
+    return api_response.job_id
 
-    page_number = 1
 
-    all_calls, all_participants, all_segments = [], [], []
+def wait_for_conversations_job(conv_api: Any, job_id: str, params: dict):
+    """Polls a conversation details job every ``params["job_poll_interval"]`` seconds.
 
-    while page_number:
-        try:
-            query.paging.page_number = page_number
-            api_response = conv_api.post_analytics_conversations_details_query(query)
+    Args:
+        conv_api: The ConversationsApi the job was submitted with.
+        job_id: The id of the job.
+        params: A config file containing parameters.
 
-            if api_response.conversations:
-                calls_page, participants_page, segments_page = (
-                    transform_to_conversations_segments_participants(
-                        api_response.conversations
-                    )
-                )
+    Raises:
+        RuntimeError: The job failed, was cancelled or expired.
+        TimeoutError: The job wasn't done within ``params["job_timeout"]`` seconds.
+    """
+    deadline = time.monotonic() + params.get("job_timeout", 240)
+    throttle = RequestThrottle(1)
+    while True:
+        status = call_with_retries(
+            lambda: conv_api.get_analytics_conversations_details_job(job_id),
+            f"the status of job {job_id}",
+            throttle,
+            params.get("max_retries", 5),
+        )
+        if status.state == "FULFILLED":
+            return
+        if status.state in FAILED_JOB_STATES:
+            raise RuntimeError(
+                f"Conversation details job {job_id} ended as {status.state}: "
+                f"{status.error_message}"
+            )
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Conversation details job {job_id} is still {status.state}."
+            )
+        time.sleep(params.get("job_poll_interval", 5))
+
+
+def iter_job_result_pages(conv_api: Any, job_id: str, params: dict) -> Iterator[list]:
+    """Yields the conversations of a fulfilled job, one page of results at a time.
 
-                all_calls.append(calls_page)
-                all_participants.append(participants_page)
-                all_segments.append(segments_page)
+    Args:
+        conv_api: The ConversationsApi the job was submitted with.
+        job_id: The id of the job.
+        params: A config file containing parameters.
 
-                page_number += 1
+    Yields:
+        Lists of up to ``params["job_page_size"]`` conversation entities.
+    """
+    throttle = RequestThrottle(1)
+    kwargs = {"page_size": params.get("job_page_size", 1000)}
+    while True:
+        api_response = call_with_retries(
+            lambda: conv_api.get_analytics_conversations_details_job_results(
+                job_id, **kwargs
+            ),
+            f"the results of job {job_id}",
+            throttle,
+            params.get("max_retries", 5),
+        )
+        yield api_response.conversations or []
+        if not api_response.cursor:
+            return
+        kwargs["cursor"] = api_response.cursor
 
-            else:
-                page_number = False
 
-        except ApiException as e:
-            task_logger.info(f"Exception when calling ConversationsApi: {e}")
+def extract_call_logs_with_job(
+    client: Any, params: dict
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Fetches call log information with an asynchronous conversation details job.
 
-    df_calls = pd.concat(all_calls, ignore_index=True)
-    df_participants = pd.concat(all_participants, ignore_index=True)
-    df_segments = pd.concat(all_segments, ignore_index=True)
+    Meant for long intervals and backfills: the job is submitted once, polled
+    until it's done and its results are downloaded in pages of up to
+    ``params["job_page_size"]`` conversations, each transformed as it arrives.
 
-    return df_calls, df_participants, df_segments
+    Jobs only cover conversations up to their data availability date. The part
+    of the interval after it is fetched with the details query; an interval
+    that starts after it is fetched with the query entirely.
+
+    Args:
+        client: An instance of the Genesys PureCloudPlatformClientV2 client.
+        params: A config file containing parameters.
+
+    Returns:
+        A pandas DataFrame containing all requested call log information.
+    """
+    conv_api = client.ConversationsApi()
+    start, end = parse_interval(params["interval"])
+    available = job_data_available_until(conv_api, params)
+    if available <= start:
+        task_logger.info(
+            f"Details jobs have data up to {available.isoformat()} only, "
+            f"querying {params['interval']} instead."
+        )
+        return concat_call_log_pages(fetch_query_pages(client, params))
+
+    job_params, recent_params = params, None
+    if available < end:
+        job_params = {
+            **params,
+            "interval": f"{start.isoformat()}/{available.isoformat()}",
+        }
+        recent_params = {
+            **params,
+            "interval": f"{available.isoformat()}/{end.isoformat()}",
+        }
+        task_logger.info(
+            f"Details jobs have data up to {available.isoformat()}, "
+            f"querying {recent_params['interval']} instead."
+        )
+    job_id = submit_conversations_job(client, conv_api, job_params)
+    wait_for_conversations_job(conv_api, job_id, job_params)
+
+    def pages() -> Iterator[list]:
+        yield from iter_job_result_pages(conv_api, job_id, job_params)
+        if recent_params is not None:
+            yield from fetch_query_pages(client, recent_params)
+
+    return concat_call_log_pages(pages())
 
 
 ##################################Contact extraction####################################
@@ -5,6 +5,7 @@ from typing import Any
 import pandas as pd
 import pendulum
 from airflow.decorators import task
+from airflow.operators.python import get_current_context
 from genesys.tasks.helpers import (
     download_df_from_ADLS,
     extract_call_logs,
@@ -12,6 +13,7 @@ from genesys.tasks.helpers import (
     extract_users,
     initialize_api_client,
     load_secrets,
+    run_params,
     transform_df,
     upload_df_to_ADLS,
 )
@@ -19,16 +21,21 @@ from genesys.tasks.helpers import (
 task_logger = logging.getLogger("airflow.task")
 
 
+# Backfills with a details job wait for the job and then page through its results.
 @task.short_circuit(
     retries=1,
-    execution_timeout=pendulum.duration(minutes=5),
+    execution_timeout=pendulum.duration(minutes=30),
     retry_delay=pendulum.duration(minutes=5),
 )
 def extract_data(conn_config, endp_config, endpoint) -> bool:
     """Extracts data from Genesys endpoints and stores it as csv in blob storage."""
     # Create and configure client
-    api_client = initialize_api_client(load_secrets(conn_config["secrets"]))
-    params = endp_config[endpoint]["params"]
+    api_client = initialize_api_client(
+        load_secrets(conn_config["secrets"]), conn_config.get("api_host")
+    )
+    params = run_params(
+        endp_config[endpoint]["params"], get_current_context()["dag_run"].conf
+    )
     # Dispatcher mapping endpoints to their respective functions
     endpoint_dispatcher: dict[
         str,
@@ -72,7 +79,7 @@ def extract_data(conn_config, endp_config, endpoint) -> bool:
 
 @task(
     retries=1,
-    execution_timeout=pendulum.duration(minutes=5),
+    execution_timeout=pendulum.duration(minutes=30),
     retry_delay=pendulum.duration(minutes=5),
 )
 def transform_data(conn_config, endp_config, endpoint):
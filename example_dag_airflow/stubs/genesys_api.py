@@ -0,0 +1,374 @@
+"""Local stub of the Genesys Cloud APIs used by the call_logs extraction.
+
+Serves enough of the API on 127.0.0.1 for both extraction modes to run offline:
+
+* ``POST /oauth/token``: client credentials login, any credentials are accepted.
+* ``POST /api/v2/analytics/conversations/details/query``: the paged details query.
+* ``POST /api/v2/analytics/conversations/details/jobs``: submits a details job,
+  which is QUEUED, then PENDING and after ``--job-delay`` seconds FULFILLED.
+* ``GET /api/v2/analytics/conversations/details/jobs/availability``: the date up to
+  which jobs have data, ``--data-available-until`` (default: the current hour).
+* ``GET /api/v2/analytics/conversations/details/jobs/{id}``: the state of a job.
+* ``GET /api/v2/analytics/conversations/details/jobs/{id}/results``: its results,
+  ``pageSize`` conversations at a time with a cursor to the next page.
+
+Conversations are generated from the queried interval, ``--conversations-per-hour``
+of them, and are the same for the same interval on every run. With
+``--rate-limit`` set, requests beyond that many per second are answered with a
+429 and a Retry-After header.
+
+Run it and set ``"api_host"`` in configs/connections.json to the printed URL::
+
+    python stubs/genesys_api.py --conversations-per-hour 500
+
+or extract an interval in both modes against it and compare the two::
+
+    python stubs/genesys_api.py --check 2024-01-01T00:00:00Z/2024-01-08T00:00:00Z
+"""
+
+import argparse
+import contextlib
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import UTC, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+DETAILS_PATH = "/api/v2/analytics/conversations/details"
+JOB_PATH = re.compile(rf"^{DETAILS_PATH}/jobs/([\w-]+)(/results)?$")
+
+
+def _iso(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _id(*parts: Any) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, "/".join(map(str, parts))))
+
+
+def parse_interval(interval: str) -> tuple[datetime, datetime]:
+    """Splits an ISO-8601 ``start/end`` interval into its two datetimes."""
+    start, end = (datetime.fromisoformat(part) for part in interval.split("/"))
+    return start, end
+
+
+def conversation(start: datetime, number: int) -> dict:
+    """Returns conversation ``number`` of the hour starting at ``start``.
+
+    A customer calls (or is called by) an agent, talks and the agent wraps up.
+    """
+    begin = start + timedelta(seconds=(number * 7919) % 3600)
+    talk = timedelta(seconds=30 + (number * 131) % 600)
+    wrapup = timedelta(seconds=10 + number % 50)
+    conversation_id = _id(start.isoformat(), number)
+    ani, dnis = f"tel:+316{number:08d}", "tel:+31850000000"
+    return {
+        "conversationId": conversation_id,
+        "conversationStart": _iso(begin),
+        "conversationEnd": _iso(begin + talk + wrapup),
+        "originatingDirection": "outbound" if number % 4 == 0 else "inbound",
+        "participants": [
+            {
+                "participantId": _id(conversation_id, "customer"),
+                "participantName": f"Customer {number}",
+                "purpose": "customer",
+                "sessions": [
+                    {
+                        "sessionId": _id(conversation_id, "customer", "session"),
+                        "ani": ani,
+                        "dnis": dnis,
+                        "segments": [
+                            {
+                                "segmentType": "interact",
+                                "segmentStart": _iso(begin),
+                                "segmentEnd": _iso(begin + talk),
+                            }
+                        ],
+                    }
+                ],
+            },
+            {
+                "participantId": _id(conversation_id, "agent"),
+                "participantName": f"Agent {number % 25}",
+                "purpose": "agent",
+                "teamId": _id("team", number % 3),
+                "userId": _id("user", number % 25),
+                "sessions": [
+                    {
+                        "sessionId": _id(conversation_id, "agent", "session"),
+                        "ani": ani,
+                        "dnis": dnis,
+                        "metrics": [
+                            {
+                                "name": "tTalkComplete",
+                                "value": int(talk.total_seconds() * 1000),
+                                "emitDate": _iso(begin + talk),
+                            }
+                        ],
+                        "segments": [
+                            {
+                                "segmentType": "interact",
+                                "segmentStart": _iso(begin),
+                                "segmentEnd": _iso(begin + talk),
+                            },
+                            {
+                                "segmentType": "wrapup",
+                                "segmentStart": _iso(begin + talk),
+                                "segmentEnd": _iso(begin + talk + wrapup),
+                            },
+                        ],
+                    }
+                ],
+            },
+        ],
+    }
+
+
+class GenesysStub(ThreadingHTTPServer):
+    """The stub server; ``start`` runs it in a background thread.
+
+    ``counters`` counts the requests made per kind: login, query, job_availability,
+    job_submit, job_status, job_results and rate_limited.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        conversations_per_hour: int = 100,
+        job_delay: float = 2.0,
+        latency: float = 0.05,
+        rate_limit: int = 0,
+        port: int = 0,
+        data_available_until: datetime | None = None,
+    ):
+        super().__init__(("127.0.0.1", port), _GenesysHandler)
+        self.conversations_per_hour = conversations_per_hour
+        self.job_delay = job_delay
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.data_available_until = data_available_until
+        self.counters: Counter = Counter()
+        self.jobs: dict[str, tuple[str, float]] = {}
+        self._recent: deque = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """The base URL to use as the API host."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "GenesysStub":
+        """Serves requests in a daemon thread and returns the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def conversations(self, interval: str, offset: int, limit: int) -> list[dict]:
+        """Returns conversations ``offset`` to ``offset + limit`` of ``interval``."""
+        start, _ = parse_interval(interval)
+        total = self.total(interval)
+        per_hour = self.conversations_per_hour
+        return [
+            conversation(start + timedelta(hours=i // per_hour), i % per_hour)
+            for i in range(offset, min(offset + limit, total))
+        ]
+
+    def total(self, interval: str) -> int:
+        """Returns the number of conversations in ``interval``."""
+        start, end = parse_interval(interval)
+        hours = int((end - start).total_seconds() // 3600)
+        return hours * self.conversations_per_hour
+
+    def admit(self) -> bool:
+        """Counts a request against ``rate_limit``; False if it's over the limit."""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - 1:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                return False
+            self._recent.append(now)
+            return True
+
+    def data_availability_date(self) -> datetime:
+        """Returns the date up to which details jobs have data."""
+        if self.data_available_until is not None:
+            return self.data_available_until
+        return datetime.now(UTC).replace(minute=0, second=0, microsecond=0)
+
+    def job_state(self, job_id: str) -> str:
+        """Returns the state of a submitted job, by the time since it was submitted."""
+        elapsed = time.monotonic() - self.jobs[job_id][1]
+        if elapsed >= self.job_delay:
+            return "FULFILLED"
+        return "QUEUED" if elapsed < self.job_delay / 2 else "PENDING"
+
+
+class _GenesysHandler(BaseHTTPRequestHandler):
+    server: GenesysStub
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = urlsplit(self.path).path
+        if path == "/oauth/token":
+            self._send(
+                200,
+                {"access_token": "stub", "token_type": "bearer", "expires_in": 86400},
+                "login",
+            )
+        elif path == f"{DETAILS_PATH}/query":
+            query = json.loads(body)
+            paging = query.get("paging") or {}
+            page_size = paging.get("pageSize") or 25
+            page_number = paging.get("pageNumber") or 1
+            conversations = self.server.conversations(
+                query["interval"], (page_number - 1) * page_size, page_size
+            )
+            response: dict = {"totalHits": self.server.total(query["interval"])}
+            if conversations:
+                response["conversations"] = conversations
+            self._send(200, response, "query")
+        elif path == f"{DETAILS_PATH}/jobs":
+            job_id = str(uuid.uuid4())
+            self.server.jobs[job_id] = (json.loads(body)["interval"], time.monotonic())
+            self._send(202, {"jobId": job_id}, "job_submit")
+        else:
+            self._send(404, {"message": f"No stub for POST {path}"}, "not_found")
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == f"{DETAILS_PATH}/jobs/availability":
+            available = self.server.data_availability_date()
+            self._send(
+                200, {"dataAvailabilityDate": _iso(available)}, "job_availability"
+            )
+            return
+        match = JOB_PATH.match(url.path)
+        if not match or match.group(1) not in self.server.jobs:
+            self._send(404, {"message": f"No stub for GET {url.path}"}, "not_found")
+            return
+        job_id, results = match.groups()
+        state = self.server.job_state(job_id)
+        if not results:
+            self._send(200, {"state": state}, "job_status")
+            return
+        if state != "FULFILLED":
+            self._send(400, {"message": f"Job {job_id} is {state}"}, "job_results")
+            return
+        query = parse_qs(url.query)
+        offset = int(query.get("cursor", ["0"])[0])
+        page_size = int(query.get("pageSize", ["1000"])[0])
+        interval = self.server.jobs[job_id][0]
+        response: dict = {
+            "conversations": self.server.conversations(interval, offset, page_size)
+        }
+        if offset + page_size < self.server.total(interval):
+            response["cursor"] = str(offset + page_size)
+        self._send(200, response, "job_results")
+
+    def _send(self, status: int, payload: dict, kind: str):
+        time.sleep(self.server.latency)
+        headers = {"Content-Type": "application/json"}
+        if kind != "login" and not self.server.admit():
+            kind, status, headers["Retry-After"] = "rate_limited", 429, "1"
+            payload = {"message": "Rate limit exceeded the maximum."}
+        self.server.counters[kind] += 1
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def check(stub: GenesysStub, interval: str):
+    """Extracts ``interval`` in both call_logs modes against ``stub`` and compares.
+
+    Needs the Airflow requirements (airflow_home/requirements-airflow.txt).
+    """
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "airflow_home/dags"))
+    from genesys.tasks.helpers import extract_call_logs, initialize_api_client
+
+    endpoints = Path(__file__).resolve().parents[1] / (
+        "airflow_home/dags/genesys/configs/endpoints.json"
+    )
+    params = {
+        **json.loads(endpoints.read_text())["call_logs"]["params"],
+        "interval": interval,
+        "job_poll_interval": 0.5,
+    }
+    client = initialize_api_client(("stub", "stub"), stub.url)
+
+    results = {}
+    for mode in ("query", "job"):
+        stub.counters.clear()
+        started = time.perf_counter()
+        results[mode] = extract_call_logs(client, {**params, "mode": mode})
+        requests = sum(stub.counters.values()) - stub.counters["login"]
+        print(
+            f"{mode:>5}: {time.perf_counter() - started:6.2f}s, {requests} requests, "
+            f"{len(results[mode][0])} conversations"
+        )
+    for query_df, job_df in zip(results["query"], results["job"], strict=True):
+        if not query_df.equals(job_df):
+            print("The two modes returned different data.")
+            return 1
+    print("Both modes returned the same data.")
+    return 0
+
+
+def main():
+    """Runs the stub until interrupted, or the ``--check`` comparison."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--conversations-per-hour", type=int, default=100)
+    parser.add_argument(
+        "--job-delay", type=float, default=2.0, help="Seconds until a job is done."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Seconds before each answer."
+    )
+    parser.add_argument(
+        "--rate-limit", type=int, default=0, help="Requests per second, 0 for none."
+    )
+    parser.add_argument(
+        "--data-available-until",
+        type=datetime.fromisoformat,
+        help="Date up to which jobs have data, default the current hour.",
+    )
+    parser.add_argument(
+        "--check", metavar="INTERVAL", help="Compare both modes for this interval."
+    )
+    args = parser.parse_args()
+    stub = GenesysStub(
+        args.conversations_per_hour,
+        args.job_delay,
+        args.latency,
+        args.rate_limit,
+        0 if args.check else args.port,
+        args.data_available_until,
+    ).start()
+    if args.check:
+        return check(stub, args.check)
+
+    print(f"Genesys stub serving at {stub.url}")
+    with contextlib.suppress(KeyboardInterrupt):
+        threading.Event().wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
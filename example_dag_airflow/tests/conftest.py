@@ -0,0 +1,50 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "airflow_home/dags"), str(ROOT / "stubs")]
+
+from genesys.tasks.helpers import initialize_api_client  # noqa: E402
+from genesys_api import GenesysStub  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def _server():
+    server = GenesysStub(conversations_per_hour=20, latency=0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub(_server):
+    """The Genesys API stub, with quick jobs and its counters reset.
+
+    One stub serves every test: the SDK keeps its first API client, and with it
+    the host, for the rest of the process.
+    """
+    _server.counters.clear()
+    _server.job_delay = 0.3
+    _server.data_available_until = None
+    return _server
+
+
+@pytest.fixture
+def client(stub):
+    """An API client logged in to ``stub``."""
+    return initialize_api_client(("stub", "stub"), stub.url)
+
+
+@pytest.fixture
+def params():
+    """The call_logs parameters of configs/endpoints.json for an hourly run."""
+    endpoints = ROOT / "airflow_home/dags/genesys/configs/endpoints.json"
+    return {
+        **json.loads(endpoints.read_text())["call_logs"]["params"],
+        "interval": "2024-01-01T00:00:00+00:00/2024-01-01T01:00:00+00:00",
+        "job_page_size": 100,
+        "job_poll_interval": 0.05,
+    }
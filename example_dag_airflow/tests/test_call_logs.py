@@ -0,0 +1,77 @@
+import math
+from datetime import UTC, datetime
+
+import pytest
+from genesys.tasks.helpers import extract_call_logs, run_params, use_details_job
+
+BACKFILL = "2024-01-01T00:00:00+00:00/2024-01-03T00:00:00+00:00"
+
+
+def assert_same_data(left, right):
+    """Asserts two extractions returned the same three DataFrames."""
+    for left_df, right_df in zip(left, right, strict=True):
+        assert left_df.equals(right_df)
+
+
+def test_run_conf_overrides_interval_and_mode(params):
+    """A triggered run's configuration overrides only the interval and mode."""
+    assert run_params(params, None) == params
+    overridden = run_params(params, {"interval": BACKFILL, "page_size": 1})
+    assert overridden == {**params, "interval": BACKFILL}
+    assert run_params(params, {"mode": "job"})["mode"] == "job"
+
+
+def test_mode_is_picked_by_interval_length(params):
+    """Hourly runs use the query, longer intervals a job, unless mode says otherwise."""
+    assert not use_details_job(params)
+    assert use_details_job(run_params(params, {"interval": BACKFILL}))
+    assert use_details_job({**params, "mode": "job"})
+    assert not use_details_job({**params, "interval": BACKFILL, "mode": "query"})
+
+
+def test_hourly_runs_use_the_query(stub, client, params):
+    """A scheduled hourly run never submits a job."""
+    calls, _, _ = extract_call_logs(client, params)
+    assert len(calls) == 20
+    assert stub.counters["query"] == 1
+    assert stub.counters["job_submit"] == 0
+
+
+def test_backfill_runs_poll_a_job_and_page_through_its_results(stub, client, params):
+    """A backfill polls one job and reads its results a page at a time."""
+    backfill = run_params(params, {"interval": BACKFILL})
+    by_job = extract_call_logs(client, backfill)
+
+    assert stub.counters["job_submit"] == 1
+    assert stub.counters["job_status"] > 1
+    assert stub.counters["job_results"] == math.ceil(48 * 20 / 100)
+    assert stub.counters["query"] == 0
+    assert len(by_job[0]) == 48 * 20
+    assert_same_data(by_job, extract_call_logs(client, {**backfill, "mode": "query"}))
+
+
+def test_part_after_data_availability_is_queried(stub, client, params):
+    """Conversations after the job data availability date come from the query."""
+    stub.data_available_until = datetime(2024, 1, 2, 12, tzinfo=UTC)
+    backfill = run_params(params, {"interval": BACKFILL})
+    by_job = extract_call_logs(client, backfill)
+
+    assert stub.counters["job_submit"] == 1
+    assert stub.counters["job_results"] == math.ceil(36 * 20 / 100)
+    assert stub.counters["query"] == math.ceil(12 * 20 / params["page_size"])
+    assert_same_data(by_job, extract_call_logs(client, {**backfill, "mode": "query"}))
+
+
+def test_interval_after_data_availability_is_queried_entirely(stub, client, params):
+    """No job is submitted for an interval jobs have no data for yet."""
+    stub.data_available_until = datetime(2023, 12, 1, tzinfo=UTC)
+    calls, _, _ = extract_call_logs(client, run_params(params, {"interval": BACKFILL}))
+    assert len(calls) == 48 * 20
+    assert stub.counters["job_submit"] == 0
+
+
+def test_unfinished_job_times_out(stub, client, params):
+    """A job that isn't done within job_timeout raises TimeoutError."""
+    stub.job_delay = 60
+    with pytest.raises(TimeoutError):
+        extract_call_logs(client, {**params, "mode": "job", "job_timeout": 0.2})
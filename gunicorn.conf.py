@@ -0,0 +1,45 @@
+# Gunicorn settings shared by startup.sh and the load-test harness (benchmarks/loadtest.py).
+# Command-line options override these, e.g. --bind in the harness.
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+timeout = 60
+accesslog = '-'
+errorlog = '-'
+
+# Set ASGI=1 to serve the async views with uvicorn workers instead of threaded WSGI workers
+if os.environ.get('ASGI') == '1':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    threads = 4
+
+
+# FAST_START=1 (startup.sh): load the app once in the master so workers fork with it in
+# shared memory; on_starting applies pending migrations and warms up (ski_app/startup.py)
+preload_app = os.environ.get('FAST_START') == '1'
+
+
+def on_starting(server):
+    if preload_app:
+        from ski_app.startup import prepare_master
+
+        server.log.info(prepare_master())
+
+
+def worker_exit(server, worker):
+    # Write the forecasts fetched since the worker's last snapshot batch (ski_app/snapshots.py)
+    from ski_app.snapshots import snapshot_buffer
+
+    try:
+        server.log.info('Wrote %d pending forecast snapshots', snapshot_buffer.flush())
+    except Exception:
+        server.log.exception('Writing pending forecast snapshots failed')
+
+
+def child_exit(server, worker):
+    # Drop a dead worker's live gauges from the shared Prometheus metrics (ski_app/metrics.py)
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,4 +1,17 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ForecastSnapshot, GeocodedLocation
 
+
+@admin.register(GeocodedLocation)
+class GeocodedLocationAdmin(admin.ModelAdmin):
+    list_display = ('query', 'latitude', 'longitude', 'created_at')
+    search_fields = ('query', 'display_name')
+
+
+@admin.register(ForecastSnapshot)
+class ForecastSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('latitude', 'longitude', 'model_run', 'fetched_at')
+    list_filter = ('model_run',)
+    fields = ('latitude', 'longitude', 'model_run', 'fetched_at', 'timezone', 'current')
+    readonly_fields = fields
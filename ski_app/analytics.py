@@ -0,0 +1,164 @@
+"""Write-behind tracking of which resorts people search for.
+
+Searches are counted in Redis (a hash of per-city counters and a
+HyperLogLog of visitors per city and day) with a single pipelined round
+trip per request. ``flush_search_stats`` periodically copies the day's
+totals into ``ResortSearchStats``; trending queries read only that table.
+
+Totals in Redis are cumulative per day, so a flush writes absolute values
+and can safely be repeated.
+"""
+import datetime
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from .geocoding import normalize_city
+from .models import ResortSearchStats
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "analytics:"
+# Redis keys outlive the day they count so a late flush still finds them.
+KEY_TTL = 60 * 60 * 24 * 3
+TRENDING_CACHE_KEY = "analytics:trending"
+
+
+def visitor_id(request):
+    """An anonymous, stable-enough visitor id: a hash of IP and user agent."""
+    raw = f"{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def _searches_key(day):
+    return f"{KEY_PREFIX}searches:{day:%Y%m%d}"
+
+
+def _visitors_key(day, query):
+    return f"{KEY_PREFIX}visitors:{day:%Y%m%d}:{query}"
+
+
+class RedisSearchCounter:
+    def __init__(self, client):
+        self.client = client
+
+    def record(self, day, query, visitor):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(_searches_key(day), query, 1)
+        pipe.expire(_searches_key(day), KEY_TTL)
+        pipe.pfadd(_visitors_key(day, query), visitor)
+        pipe.expire(_visitors_key(day, query), KEY_TTL)
+        pipe.execute()
+
+    def totals(self, day):
+        searches = {
+            query.decode(): int(count)
+            for query, count in self.client.hgetall(_searches_key(day)).items()
+        }
+        pipe = self.client.pipeline(transaction=False)
+        for query in searches:
+            pipe.pfcount(_visitors_key(day, query))
+        return {
+            query: (count, uniques)
+            for (query, count), uniques in zip(searches.items(), pipe.execute())
+        }
+
+
+class LocalSearchCounter:
+    """In-process stand-in for cache backends without Redis (development, tests)."""
+
+    def __init__(self):
+        self._searches = defaultdict(int)
+        self._visitors = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def record(self, day, query, visitor):
+        with self._lock:
+            self._searches[day, query] += 1
+            self._visitors[day, query].add(visitor)
+
+    def totals(self, day):
+        with self._lock:
+            return {
+                query: (count, len(self._visitors[d, query]))
+                for (d, query), count in self._searches.items()
+                if d == day
+            }
+
+
+_counter = None
+
+
+def get_counter():
+    global _counter
+    if _counter is None:
+        try:
+            _counter = RedisSearchCounter(get_redis_connection("default"))
+        except NotImplementedError:
+            _counter = LocalSearchCounter()
+    return _counter
+
+
+def record_search(city, visitor):
+    """Count one search for ``city``; never touches the database.
+
+    Errors are logged, not raised: analytics must not fail a search.
+    """
+    try:
+        get_counter().record(timezone.now().date(), normalize_city(city), visitor)
+    except Exception:
+        logger.warning("Recording a search for %r failed", city, exc_info=True)
+
+
+def flush_search_stats(days=None):
+    """Copy Redis totals for ``days`` (default: today and yesterday) into the database."""
+    today = timezone.now().date()
+    days = days or [today - datetime.timedelta(days=1), today]
+    counter = get_counter()
+    rows = [
+        ResortSearchStats(day=day, query=query, searches=searches, unique_visitors=uniques)
+        for day in days
+        for query, (searches, uniques) in counter.totals(day).items()
+    ]
+    ResortSearchStats.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=["day", "query"],
+        update_fields=["searches", "unique_visitors"],
+    )
+    return len(rows)
+
+
+def trending_resorts(days=None, limit=10):
+    """Most searched cities over the last ``days`` days, from the aggregated table.
+
+    Returns ``(query, searches, unique_visitors)`` tuples. The sum of daily
+    unique visitors over-counts people who search on several days.
+    """
+    days = days or settings.TRENDING_DAYS
+    since = timezone.now().date() - datetime.timedelta(days=days - 1)
+    return list(
+        ResortSearchStats.objects.filter(day__gte=since)
+        .values("query")
+        .annotate(total=Sum("searches"), visitors=Sum("unique_visitors"))
+        .order_by("-total", "query")
+        .values_list("query", "total", "visitors")[:limit]
+    )
+
+
+def cached_trending_resorts(limit=10):
+    """``trending_resorts`` for page views, cached per ``limit`` for a flush interval."""
+    key = f"{TRENDING_CACHE_KEY}:{limit}"
+    trending = cache.get(key)
+    if trending is None:
+        trending = trending_resorts(limit=limit)
+        cache.set(key, trending, settings.SEARCH_STATS_FLUSH_INTERVAL)
+    return trending
@@ -0,0 +1,315 @@
+"""JSON API views.
+
+Responses are compressed in the view rather than by middleware so each
+encoding keeps a strong ETag of its own: ``"<version>-br"``,
+``"<version>-gzip"`` or ``"<version>"``. The version identifies a cached
+forecast (grid cell and fetch time), so conditional requests are answered
+with a 304 before anything is serialized, and a compressed body is
+produced at most once per forecast and encoding.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+
+from .climatology import PERCENTILES, WEEKS, best_resorts, week_of_year
+from .forecast import FORECAST_PARAMS, forecast_cache_key, get_forecast, get_forecasts, grid_cell
+from .gazetteer import as_location, get_gazetteer
+from .geocoding import geocode
+from .models import SnowClimatology
+from .ranking import top_resorts
+from .snapshots import series_values
+from .spatial import nearest_resorts
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+BODY_CACHE_PREFIX = "api:body:"
+
+
+def choose_encoding(request):
+    accepted = {
+        token.split(";")[0].strip()
+        for token in request.META.get("HTTP_ACCEPT_ENCODING", "").lower().split(",")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.API_BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+def conditional_json(request, version, last_modified, max_age, build):
+    """Serve ``build()`` as JSON identified by ``version``.
+
+    ``build`` is only called when the client's copy is out of date and no
+    compressed body for this version and encoding is cached.
+    """
+    encoding = choose_encoding(request)
+    etag = f'"{version}-{encoding}"' if encoding else f'"{version}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        key = BODY_CACHE_PREFIX + hashlib.sha1(etag.encode()).hexdigest()
+        body = cache.get(key)
+        if body is None:
+            body = compress(JsonResponse(build()).content, encoding)
+            cache.set(key, body, max(max_age, 1))
+        response = HttpResponse(body, content_type="application/json")
+        if encoding:
+            response["Content-Encoding"] = encoding
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = f"public, max-age={max_age}"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def plain_series(block):
+    """An ``hourly``/``daily`` block with packed arrays turned back into lists."""
+    return {name: series_values(values) if isinstance(values, np.ndarray) else values for name, values in block.items()}
+
+
+def normalized_forecast(city, location, weather):
+    """The forecast as returned by the API: Open-Meteo series plus metadata."""
+    return {
+        "city": city,
+        "location": {
+            "latitude": location["lat"],
+            "longitude": location["lon"],
+            "display_name": location.get("display_name", ""),
+        },
+        "grid_cell": list(grid_cell(location["lat"], location["lon"])),
+        "fetched_at": datetime.datetime.fromtimestamp(
+            weather["fetched_at"], tz=datetime.timezone.utc
+        ).isoformat(),
+        "stale": weather.get("stale", False),
+        "timezone": weather.get("timezone"),
+        "current": weather.get("current", {}),
+        "conditions": weather.get("conditions", {}),
+        "hourly": plain_series(weather.get("hourly", {})),
+        "daily": plain_series(weather.get("daily", {})),
+    }
+
+
+@require_GET
+def forecast_api(request):
+    city = request.GET.get("city")
+    if not city:
+        return JsonResponse({"error": "The 'city' parameter is required."}, status=400)
+    try:
+        location = geocode(city)
+    except IndexError:
+        return JsonResponse({"error": f"City {city!r} not found."}, status=404)
+    except Exception as e:
+        return JsonResponse({"error": f"Geocoding failed: {e}"}, status=502)
+    try:
+        weather = get_forecast(location["lat"], location["lon"])
+    except Exception as e:
+        return JsonResponse({"error": f"Fetching the forecast failed: {e}"}, status=502)
+
+    cache_key = forecast_cache_key(grid_cell(location["lat"], location["lon"]), FORECAST_PARAMS)
+    identity = json.dumps([cache_key, weather["fetched_at"], city, location], sort_keys=True)
+    version = hashlib.sha1(identity.encode()).hexdigest()[:20]
+    age = time.time() - weather["fetched_at"]
+    return conditional_json(
+        request,
+        version,
+        last_modified=int(weather["fetched_at"]),
+        max_age=max(int(settings.FORECAST_CACHE_TTL - age), 0),
+        build=lambda: normalized_forecast(city, location, weather),
+    )
+
+
+@require_GET
+def compare_api(request):
+    """Forecasts for several cities (``?city=a&city=b``), fetched in batches."""
+    cities = list(dict.fromkeys(request.GET.getlist("city")))
+    if not cities:
+        return JsonResponse({"error": "At least one 'city' parameter is required."}, status=400)
+    if len(cities) > settings.API_MAX_COMPARE_CITIES:
+        return JsonResponse(
+            {"error": f"At most {settings.API_MAX_COMPARE_CITIES} cities can be compared."}, status=400
+        )
+
+    results, located = {}, {}
+    for city in cities:
+        try:
+            located[city] = geocode(city)
+        except IndexError:
+            results[city] = {"city": city, "error": "City not found."}
+        except Exception as e:
+            results[city] = {"city": city, "error": f"Geocoding failed: {e}"}
+    try:
+        forecasts = get_forecasts([(loc["lat"], loc["lon"]) for loc in located.values()])
+    except Exception as e:
+        return JsonResponse({"error": f"Fetching the forecasts failed: {e}"}, status=502)
+    for (city, location), weather in zip(located.items(), forecasts):
+        results[city] = normalized_forecast(city, location, weather)
+
+    return JsonResponse({"forecasts": [results[city] for city in cities]})
+
+
+@require_GET
+def nearby_api(request):
+    """The resorts nearest to ``?city=`` (or ``?lat=&lon=``), with their forecasts."""
+    try:
+        n = min(int(request.GET.get("n", settings.NEARBY_RESORTS)), settings.API_MAX_COMPARE_CITIES)
+        if "lat" in request.GET and "lon" in request.GET:
+            lat, lon = float(request.GET["lat"]), float(request.GET["lon"])
+        elif request.GET.get("city"):
+            location = geocode(request.GET["city"])
+            lat, lon = location["lat"], location["lon"]
+        else:
+            return JsonResponse({"error": "Either 'city' or 'lat' and 'lon' are required."}, status=400)
+    except ValueError:
+        return JsonResponse({"error": "'n', 'lat' and 'lon' must be numbers."}, status=400)
+    except IndexError:
+        return JsonResponse({"error": f"City {request.GET['city']!r} not found."}, status=404)
+    except Exception as e:
+        return JsonResponse({"error": f"Geocoding failed: {e}"}, status=502)
+
+    nearby = nearest_resorts(lat, lon, n=n, max_km=settings.NEARBY_MAX_KM)
+    try:
+        forecasts = get_forecasts([(resort.latitude, resort.longitude) for resort, _ in nearby])
+    except Exception as e:
+        return JsonResponse({"error": f"Fetching the forecasts failed: {e}"}, status=502)
+    return JsonResponse({
+        "resorts": [
+            {
+                **normalized_forecast(resort.name, as_location(resort), weather),
+                "country": resort.country,
+                "distance_km": round(km, 2),
+            }
+            for (resort, km), weather in zip(nearby, forecasts)
+        ]
+    })
+
+
+@require_GET
+def rankings_api(request):
+    try:
+        limit = min(int(request.GET.get("limit", 20)), settings.API_MAX_RANKING_LIMIT)
+    except ValueError:
+        return JsonResponse({"error": "'limit' must be an integer."}, status=400)
+    resorts = [
+        {
+            "name": score.name,
+            "latitude": score.latitude,
+            "longitude": score.longitude,
+            "model_run": score.model_run.isoformat(),
+            "score": round(score.score, 2),
+            "new_snow": round(score.new_snow, 1),
+            "snow_depth": round(score.snow_depth, 2),
+            "mean_temperature": round(score.mean_temperature, 1),
+            "mean_cloud_cover": round(score.mean_cloud_cover),
+        }
+        for score in top_resorts(limit)
+    ]
+    response = JsonResponse({"resorts": resorts})
+    response["Cache-Control"] = f"public, max-age={settings.SNAPSHOT_FLUSH_INTERVAL}"
+    return response
+
+
+@require_GET
+def autocomplete_api(request):
+    """Resorts matching the typed prefix ``?q=``, from the in-memory gazetteer."""
+    try:
+        limit = min(int(request.GET.get("limit", settings.AUTOCOMPLETE_LIMIT)), settings.AUTOCOMPLETE_LIMIT)
+    except ValueError:
+        return JsonResponse({"error": "'limit' must be an integer."}, status=400)
+    resorts = [
+        {"name": r.name, "country": r.country, "latitude": r.latitude, "longitude": r.longitude}
+        for r in get_gazetteer().complete(request.GET.get("q", ""), limit)
+    ]
+    response = JsonResponse({"resorts": resorts})
+    response["Cache-Control"] = "public, max-age=86400"
+    return response
+
+
+def week_starts():
+    """``MM-DD`` of the first day of each climatology week."""
+    return [(datetime.date(2001, 1, 1) + datetime.timedelta(weeks=w)).strftime("%m-%d") for w in range(WEEKS)]
+
+
+@require_GET
+def climatology_api(request):
+    """Typical snow depth and snowfall by week of the year for ``?resort=``."""
+    name = request.GET.get("resort")
+    if not name:
+        return JsonResponse({"error": "The 'resort' parameter is required."}, status=400)
+    resort = get_gazetteer().resolve(name)
+    climatology = SnowClimatology.objects.filter(resort=resort.name if resort else name).first()
+    if climatology is None:
+        return JsonResponse({"error": f"No snow climatology for {name!r}."}, status=404)
+
+    depth = {f"p{p}": series_values(getattr(climatology, f"snow_depth_p{p}")) for p in PERCENTILES}
+    snowfall = series_values(climatology.snowfall_mean)
+    response = JsonResponse({
+        "resort": climatology.resort,
+        "country": climatology.country,
+        "first_date": climatology.first_date.isoformat(),
+        "last_date": climatology.last_date.isoformat(),
+        "years": climatology.years,
+        "weeks": [
+            {
+                "week": w + 1,
+                "starts": starts,
+                "snow_depth": {p: values[w] for p, values in depth.items()},
+                "snowfall_mean": snowfall[w],
+            }
+            for w, starts in enumerate(week_starts())
+        ],
+    })
+    response["Cache-Control"] = "public, max-age=86400"
+    return response
+
+
+@require_GET
+def climatology_best_api(request):
+    """Resorts with the deepest typical snow in ``?week=`` (1-52, default this week)."""
+    try:
+        week = int(request.GET.get("week") or week_of_year(datetime.date.today(), 1)[0] + 1)
+        limit = min(int(request.GET.get("limit", 10)), settings.API_MAX_RANKING_LIMIT)
+    except ValueError:
+        return JsonResponse({"error": "'week' and 'limit' must be integers."}, status=400)
+    if not 1 <= week <= WEEKS:
+        return JsonResponse({"error": f"'week' must be between 1 and {WEEKS}."}, status=400)
+
+    resorts = [
+        {
+            "name": climatology.resort,
+            "country": climatology.country,
+            "latitude": climatology.latitude,
+            "longitude": climatology.longitude,
+            "years": climatology.years,
+            "snow_depth": {
+                f"p{p}": series_values(getattr(climatology, f"snow_depth_p{p}"))[week - 1] for p in (25, 50, 75)
+            },
+            "snowfall_mean": series_values(climatology.snowfall_mean)[week - 1],
+        }
+        for climatology in best_resorts(week, limit)
+    ]
+    response = JsonResponse({"week": week, "starts": week_starts()[week - 1], "resorts": resorts})
+    response["Cache-Control"] = "public, max-age=86400"
+    return response
@@ -1,6 +1,27 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
 
 
 class SkiAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ski_app'
+
+    def ready(self):
+        # Connect signal receivers
+        from django.db.backends.signals import connection_created
+
+        from . import live, ranking  # noqa: F401
+        from .gazetteer import get_gazetteer
+        from .metrics import install_query_timer
+
+        # Build the autocomplete index before the first request needs it
+        get_gazetteer()
+
+        # Time database queries for the metrics middleware
+        connection_created.connect(install_query_timer, dispatch_uid="ski_app.install_query_timer")
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    # Bootstrap and the page styles ship as static/build/site.min.css (manage.py
+    # build_static_assets), so their sources and source maps aren't collected
+    ignore_patterns = [*BaseStaticFilesConfig.ignore_patterns, '*.map', 'bootstrap', 'css/site.css']
@@ -0,0 +1,135 @@
+"""Build-time CSS purging for the site stylesheet.
+
+``purge_css`` drops every style rule whose selectors all mention a class
+that no template uses. Rules without classes (element selectors, ``:root``
+custom properties) and non-style at-rules such as ``@keyframes`` and
+``@font-face`` are kept as they are; ``@media`` and ``@supports`` blocks
+are purged recursively and dropped when nothing in them survives.
+
+The parser only understands as much CSS as stylesheet purging needs: rule
+preludes, nested blocks, strings and comments.
+"""
+import re
+from pathlib import Path
+
+GROUPING_AT_RULES = {"media", "supports", "container", "layer"}
+
+_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_BANNER = re.compile(r"/\*!.*?\*/", re.S)
+_CLASS_ATTRIBUTE = re.compile(r"""\bclass\s*=\s*(["'])(.*?)\1""", re.S)
+_SCRIPT_CLASSES = re.compile(r"""classList\.(?:add|toggle)\(([^)]*)\)|className\s*=\s*(["'])(.*?)\2""")
+_TEMPLATE_TAG = re.compile(r"{%.*?%}|{{.*?}}", re.S)
+_SELECTOR_CLASS = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+_NEGATION = re.compile(r":not\([^()]*\)")
+
+
+def used_classes(templates):
+    """Class names that appear in ``class`` attributes or scripts of ``templates``."""
+    classes = set()
+    for path in templates:
+        text = Path(path).read_text(encoding="utf-8")
+        for _, value in _CLASS_ATTRIBUTE.findall(text):
+            classes.update(_TEMPLATE_TAG.sub(" ", value).split())
+        for args, _, value in _SCRIPT_CLASSES.findall(text):
+            classes.update(re.findall(r"[\w-]+", args + " " + value))
+    return classes
+
+
+def _skip_string(css, i):
+    quote = css[i]
+    i += 1
+    while i < len(css) and css[i] != quote:
+        i += 2 if css[i] == "\\" else 1
+    return i + 1
+
+
+def _blocks(css):
+    """Yield ``(prelude, body)`` for each top-level statement; ``body`` is None for ``@charset`` etc."""
+    pos, n = 0, len(css)
+    while pos < n:
+        i = pos
+        while i < n and css[i] not in "{;}":
+            i = _skip_string(css, i) if css[i] in "\"'" else i + 1
+        if i >= n:
+            return
+        if css[i] != "{":
+            if css[pos:i].strip():
+                yield css[pos:i].strip(), None
+            pos = i + 1
+            continue
+        depth, j = 1, i + 1
+        while j < n and depth:
+            if css[j] in "\"'":
+                j = _skip_string(css, j)
+                continue
+            depth += {"{": 1, "}": -1}.get(css[j], 0)
+            j += 1
+        yield css[pos:i].strip(), css[i + 1:j - 1]
+        pos = j
+
+
+def _split_selectors(prelude):
+    selectors, depth, start = [], 0, 0
+    for i, char in enumerate(prelude):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            selectors.append(prelude[start:i].strip())
+            start = i + 1
+    selectors.append(prelude[start:].strip())
+    return selectors
+
+
+def _selector_used(selector, used):
+    return all(name in used for name in _SELECTOR_CLASS.findall(_NEGATION.sub("", selector)))
+
+
+def purge_css(css, used):
+    """``css`` without the rules that can't match an element with only ``used`` classes."""
+    banner = "".join(_BANNER.findall(css))
+    purged = _purge(_COMMENT.sub("", css), used)
+    # @charset has to stay the very first thing in the file.
+    if purged.startswith("@charset"):
+        charset, _, rest = purged.partition(";")
+        return f"{charset};{banner}{rest}"
+    return banner + purged
+
+
+def _purge(css, used):
+    out = []
+    for prelude, body in _blocks(css):
+        if body is None:
+            out.append(prelude + ";")
+        elif prelude.startswith("@"):
+            name = re.match(r"@([\w-]+)", prelude).group(1).lower()
+            if name not in GROUPING_AT_RULES:
+                out.append(f"{prelude}{{{body}}}")
+            elif inner := _purge(body, used):
+                out.append(f"{prelude}{{{inner}}}")
+        else:
+            selectors = [s for s in _split_selectors(prelude) if _selector_used(s, used)]
+            if selectors:
+                out.append(f"{','.join(selectors)}{{{body}}}")
+    return "".join(out)
+
+
+def minify_css(css):
+    """Strip comments and insignificant whitespace from hand-written CSS."""
+    css = " ".join(_COMMENT.sub("", css).split())
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    return re.sub(r":\s+", ":", css).replace(";}", "}")
+
+
+def build_site_css(static, templates, safelist=()):
+    """The contents of ``static/build/site.min.css``: purged Bootstrap plus the minified page styles.
+
+    ``static`` is the project's static directory; also returns the set of
+    classes ``templates`` use (with ``safelist`` added).
+    """
+    static = Path(static)
+    used = used_classes(templates) | set(safelist)
+    bootstrap = (static / "bootstrap" / "css" / "bootstrap.min.css").read_text(encoding="utf-8")
+    site = (static / "css" / "site.css").read_text(encoding="utf-8")
+    return (purge_css(bootstrap, used) + minify_css(site) + "\n").encode(), used
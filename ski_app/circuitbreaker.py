@@ -0,0 +1,74 @@
+"""Per-upstream circuit breakers.
+
+After ``failure_threshold`` consecutive failed calls an upstream's circuit
+*opens*: calls fail at once with ``CircuitOpenError`` instead of tying up a
+worker thread until a timeout. After ``reset_timeout`` seconds one trial
+call is let through (*half-open*); its outcome closes the circuit again or
+reopens it for another ``reset_timeout``.
+
+State is per process, so each gunicorn worker detects an outage on its own
+after a handful of failures.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or settings.CIRCUIT_RESET_TIMEOUT
+        self.counters = Counter()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def before_call(self):
+        """Raise ``CircuitOpenError`` unless a call may go to the upstream now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                return
+            self.counters["rejected"] += 1
+        raise CircuitOpenError(f"{self.name} is unavailable, not retrying for now.")
+
+    def record(self, success):
+        """Record the outcome of a call allowed by ``before_call``."""
+        with self._lock:
+            if success:
+                self._state = CLOSED
+                self._failures = 0
+                return
+            self.counters["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.counters["opened"] += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def stats(self):
+        with self._lock:
+            return {"state": self._state, **self.counters}
@@ -0,0 +1,185 @@
+"""Snow climatology: which resorts have the best snow at which time of year.
+
+``backfill`` pulls years of daily history per resort from the Open-Meteo
+archive into ``ClimateHistory`` (one packed column per variable) and then
+recomputes the resort's ``SnowClimatology``: snow depth percentiles and
+mean snowfall for each week of the year. The API only ever reads those
+precomputed arrays; ranking resorts for a week stacks one array per resort
+and sorts a single column.
+
+Weeks are counted from 1 January, 7 days each, with the last one or two
+days of the year added to week 52, so a week covers the same dates every
+year.
+"""
+import datetime
+import logging
+import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from django.conf import settings
+
+from .http import OPEN_METEO_ARCHIVE, upstream_get
+from .models import ClimateHistory, SnowClimatology
+
+logger = logging.getLogger(__name__)
+
+WEEKS = 52
+PERCENTILES = (10, 25, 50, 75, 90)
+ARCHIVE_PARAMS = {
+    "daily": "snowfall_sum,temperature_2m_mean",
+    # The archive has no daily snow depth; it's reduced from the hourly values.
+    "hourly": "snow_depth",
+    "timezone": "GMT",
+}
+
+
+def fetch_history(resort, start, end):
+    """Daily ``(snow_depth, snowfall, temperature_mean)`` arrays of ``resort`` from ``start`` to ``end``."""
+    response = upstream_get(
+        OPEN_METEO_ARCHIVE,
+        settings.OPEN_METEO_ARCHIVE_URL,
+        params={
+            "latitude": resort.latitude,
+            "longitude": resort.longitude,
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            **ARCHIVE_PARAMS,
+        },
+    )
+    return daily_series(response.json())
+
+
+def daily_series(payload):
+    daily, hourly = payload["daily"], payload["hourly"]
+    days = len(daily["time"])
+    hourly_depth = np.array(hourly["snow_depth"], np.float64)[: days * 24]
+    hourly_depth = np.pad(hourly_depth, (0, days * 24 - len(hourly_depth)), constant_values=np.nan)
+    with warnings.catch_warnings():
+        # Days without any hourly value reduce to NaN.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        snow_depth = np.nanmax(hourly_depth.reshape(days, 24), axis=1)
+    snowfall = np.array(daily["snowfall_sum"], np.float64)
+    temperature_mean = np.array(daily["temperature_2m_mean"], np.float64)
+    return snow_depth, snowfall, temperature_mean
+
+
+def week_of_year(start, days):
+    """The week (0 to ``WEEKS - 1``) of each of ``days`` days from ``start``."""
+    dates = np.datetime64(start, "D") + np.arange(days)
+    day_of_year = (dates - dates.astype("datetime64[Y]")).astype(int)
+    return np.minimum(day_of_year // 7, WEEKS - 1)
+
+
+def by_week(values, weeks):
+    """A ``(WEEKS, n)`` matrix with the values of each week in its row, padded with NaN."""
+    counts = np.bincount(weeks, minlength=WEEKS)
+    order = np.argsort(weeks, kind="stable")
+    sorted_weeks = weeks[order]
+    position = np.arange(len(weeks)) - (np.cumsum(counts) - counts)[sorted_weeks]
+    matrix = np.full((WEEKS, max(counts.max(initial=0), 1)), np.nan)
+    matrix[sorted_weeks, position] = values[order]
+    return matrix
+
+
+def weekly_statistics(start, snow_depth, snowfall):
+    """Snow depth percentiles (one array per ``PERCENTILES`` entry) and mean snowfall per week."""
+    weeks = week_of_year(start, len(snow_depth))
+    with warnings.catch_warnings():
+        # Weeks without data reduce to NaN.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        depth = np.nanpercentile(by_week(snow_depth, weeks), PERCENTILES, axis=1)
+        snowfall = np.nanmean(by_week(snowfall, weeks), axis=1) * 7
+    return dict(zip(PERCENTILES, depth)), snowfall
+
+
+def update_climatology(history):
+    """Recompute the ``SnowClimatology`` of one resort from its ``ClimateHistory``."""
+    depth, snowfall = weekly_statistics(history.start_date, history.snow_depth, history.snowfall)
+    SnowClimatology.objects.update_or_create(
+        resort=history.resort,
+        defaults={
+            "country": history.country,
+            "latitude": history.latitude,
+            "longitude": history.longitude,
+            "first_date": history.start_date,
+            "last_date": history.end_date,
+            "years": round(len(history.snow_depth) / 365.25, 1),
+            **{f"snow_depth_p{p}": values for p, values in depth.items()},
+            "snowfall_mean": snowfall,
+        },
+    )
+
+
+def store_history(resort, start, series):
+    """Append daily ``series`` starting at ``start`` to the resort's history and refresh its climatology.
+
+    The history is replaced instead when ``start`` doesn't follow on from it.
+    """
+    history = ClimateHistory.objects.filter(resort=resort.name).first()
+    if history is not None and start == history.end_date + datetime.timedelta(days=1):
+        columns = [
+            np.concatenate([existing, new])
+            for existing, new in zip((history.snow_depth, history.snowfall, history.temperature_mean), series)
+        ]
+    else:
+        history = history or ClimateHistory(resort=resort.name)
+        history.start_date = start
+        columns = series
+    history.country, history.latitude, history.longitude = resort.country, resort.latitude, resort.longitude
+    history.snow_depth, history.snowfall, history.temperature_mean = columns
+    history.save()
+    update_climatology(history)
+    return history
+
+
+def default_end():
+    return datetime.date.today() - datetime.timedelta(days=settings.CLIMATE_ARCHIVE_LAG_DAYS)
+
+
+def backfill(resorts, years=None, end=None, full=False, workers=None):
+    """Fetch the missing history of ``resorts`` up to ``end`` and refresh their climatology.
+
+    Each resort's history is extended from where it ends; ``full`` fetches
+    all ``years`` again. Returns the number of days fetched per resort name
+    (0 for resorts that were up to date); resorts whose fetch failed are
+    left out.
+    """
+    end = end or default_end()
+    years = years or settings.CLIMATE_YEARS
+    # 29 February has no counterpart in most years.
+    start = end.replace(year=end.year - years, day=min(end.day, 28) if end.month == 2 else end.day)
+    start += datetime.timedelta(days=1)
+    known = {h.resort: h.end_date for h in ClimateHistory.objects.only("resort", "start_date", "snow_depth")}
+
+    jobs = {}
+    for resort in resorts:
+        first = start
+        if not full and resort.name in known and known[resort.name] >= start:
+            first = known[resort.name] + datetime.timedelta(days=1)
+        if first <= end:
+            jobs[resort] = first
+
+    fetched = {resort.name: 0 for resort in resorts if resort not in jobs}
+    with ThreadPoolExecutor(max_workers=workers or settings.CLIMATE_BACKFILL_WORKERS) as executor:
+        futures = {executor.submit(fetch_history, resort, first, end): resort for resort, first in jobs.items()}
+        for future in as_completed(futures):
+            resort = futures[future]
+            try:
+                series = future.result()
+            except Exception:
+                logger.exception("Fetching the climate history of %s failed", resort.name)
+                continue
+            store_history(resort, jobs[resort], series)
+            fetched[resort.name] = len(series[0])
+    return fetched
+
+
+def best_resorts(week, limit=10):
+    """Resorts ranked by median snow depth in ``week`` (1 to ``WEEKS``), deepest first."""
+    climatologies = list(SnowClimatology.objects.all())
+    if not climatologies:
+        return []
+    median = np.stack([c.snow_depth_p50 for c in climatologies])[:, week - 1]
+    order = np.argsort(-np.nan_to_num(median, nan=-1.0), kind="stable")[:limit]
+    return [climatologies[i] for i in order]
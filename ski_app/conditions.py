@@ -0,0 +1,93 @@
+"""Skier-relevant metrics derived from a forecast's hourly series.
+
+``derive_conditions`` reduces the hourly arrays with NumPy into:
+
+* new snow accumulated over the next 24 and 72 hours (cm),
+* the change in snow depth over the same windows (cm),
+* freeze/thaw cycles over the next 72 hours: thaws (above 0 °C) followed
+  by a refreeze,
+* an hourly powder score from 0 to 100, plus the best hour for powder in
+  the next 72 hours.
+
+Windows start at the hour the forecast was fetched. The metrics are computed
+once per fetch and stored in the forecast cache entry next to the data.
+"""
+import numpy as np
+
+from .snapshots import series_start
+
+WINDOWS = (24, 72)
+
+# Fresh snow over the previous 24 hours that counts as a full powder day, and
+# the share of the score that is fresh, cold snow versus clear sky.
+POWDER_FULL_CM = 20.0
+POWDER_WEIGHTS = {"snow": 0.6, "visibility": 0.4}
+# Snow is fully "cold" at or below COLD_BELOW and wet at or above WET_ABOVE (°C).
+COLD_BELOW, WET_ABOVE = -2.0, 2.0
+
+
+def _series(hourly, variable, hours):
+    # Missing values (None in a stored snapshot, or a variable that wasn't
+    # requested) become NaN, so every series lines up with ``time``.
+    values = np.full(hours, np.nan)
+    given = np.array(hourly.get(variable, []), dtype=np.float64)[:hours]
+    values[: len(given)] = given
+    return values
+
+
+def trailing_sum(values, hours):
+    """Sum of the ``hours`` values up to and including each position, NaN as 0."""
+    totals = np.concatenate(([0.0], np.cumsum(np.nan_to_num(values))))
+    end = np.arange(1, len(values) + 1)
+    return totals[end] - totals[np.maximum(end - hours, 0)]
+
+
+def powder_scores(snowfall, temperature, cloud_cover):
+    """Hourly powder and visibility score from 0 to 100."""
+    fresh = np.clip(trailing_sum(snowfall, 24) / POWDER_FULL_CM, 0, 1)
+    cold = np.clip((WET_ABOVE - np.nan_to_num(temperature)) / (WET_ABOVE - COLD_BELOW), 0, 1)
+    visibility = 1 - np.clip(np.nan_to_num(cloud_cover, nan=100.0), 0, 100) / 100
+    score = POWDER_WEIGHTS["snow"] * fresh * cold + POWDER_WEIGHTS["visibility"] * visibility
+    return np.rint(score * 100).astype(int)
+
+
+def freeze_thaw_cycles(temperature):
+    """Number of times the temperature rises above 0 °C and then drops back."""
+    above = temperature[~np.isnan(temperature)] > 0
+    return int(np.count_nonzero(above[:-1] & ~above[1:]))
+
+
+def depth_change(snow_depth, hours):
+    """Snow depth change in cm from the first hour to ``hours`` later (or the end)."""
+    depth = snow_depth[: hours + 1]
+    depth = depth[~np.isnan(depth)]
+    return round(float(depth[-1] - depth[0]) * 100, 1) if len(depth) else 0.0
+
+
+def derive_conditions(data, fetched_at):
+    """Derived metrics of the Open-Meteo ``data`` of a forecast fetched at ``fetched_at``."""
+    hourly = data.get("hourly") or {}
+    times = hourly.get("time") or []
+    snowfall, snow_depth, temperature, cloud_cover = (
+        _series(hourly, variable, len(times)) for variable in ("snowfall", "snow_depth", "temperature_2m", "cloud_cover")
+    )
+    scores = powder_scores(snowfall, temperature, cloud_cover)
+
+    start = 0
+    if times:
+        start_ts = series_start(hourly, data.get("utc_offset_seconds", 0)).timestamp()
+        start = int(min(max((fetched_at - start_ts) // 3600, 0), len(times) - 1))
+
+    conditions = {}
+    for hours in WINDOWS:
+        window = slice(start, start + hours)
+        conditions[f"new_snow_{hours}h"] = round(float(np.nansum(snowfall[window])), 1)
+        conditions[f"snow_depth_change_{hours}h"] = depth_change(snow_depth[start:], hours)
+    conditions["freeze_thaw_cycles_72h"] = freeze_thaw_cycles(temperature[start:start + 72])
+
+    upcoming = scores[start:start + 72]
+    best = start + int(np.argmax(upcoming)) if len(upcoming) else None
+    conditions["best_powder_hour"] = times[best] if best is not None else None
+    conditions["best_powder_score"] = int(scores[best]) if best is not None else 0
+    conditions["powder_score"] = scores.tolist()
+    return conditions
@@ -0,0 +1,44 @@
+import numpy as np
+from django.db import models
+
+
+class PackedArrayField(models.BinaryField):
+    """A 1-D numeric array stored as packed little-endian binary.
+
+    Values are returned as read-only NumPy arrays decoded straight from the
+    column bytes. Missing values become NaN for float dtypes and -1 for
+    integer dtypes.
+    """
+
+    def __init__(self, *args, dtype="<f4", **kwargs):
+        self.dtype = np.dtype(dtype)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["dtype"] = self.dtype.str
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return np.frombuffer(value, dtype=self.dtype)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return np.frombuffer(value, dtype=self.dtype)
+        return self.pack(value)
+
+    def pack(self, values):
+        if isinstance(values, np.ndarray):
+            return values.astype(self.dtype, copy=False)
+        fill = np.nan if self.dtype.kind == "f" else -1
+        values = [fill if v is None else v for v in values]
+        return np.asarray(values, dtype=self.dtype)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is not None and not isinstance(value, (bytes, memoryview)):
+            value = self.pack(value).tobytes()
+        return super().get_db_prep_value(value, connection, prepared)
@@ -0,0 +1,317 @@
+"""Open-Meteo forecasts, cached per model grid cell.
+
+Forecasts are cached under the grid cell that contains the requested point,
+so nearby towns share one entry. An entry is *fresh* for
+``FORECAST_CACHE_TTL`` seconds (the upstream model update cadence) and is
+kept for ``FORECAST_STALE_TTL`` seconds after that. A stale entry is served
+immediately while a background thread fetches a new one
+(stale-while-revalidate).
+
+When Open-Meteo can't be reached, the newest stored ``ForecastSnapshot``
+of the cell is served instead, flagged ``stale``; so is a cached entry past
+its TTL while the upstream's circuit is open.
+
+Each entry also holds the ``conditions`` derived from the data
+(``ski_app.conditions``), computed once when the forecast is fetched.
+
+A point whose own cell isn't cached may borrow the forecast of an adjacent
+cell that is, if that cell's centre is within ``FORECAST_SNAP_KM``.
+"""
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .circuitbreaker import OPEN
+from .conditions import derive_conditions
+from .http import OPEN_METEO, aupstream_get, breakers, upstream_get
+from .metrics import count_lookup, stage
+from .singleflight import SingleFlight
+from .snapshots import last_known_entry, snapshot_buffer
+from .spatial import haversine_km
+
+logger = logging.getLogger(__name__)
+
+FORECAST_PARAMS = {
+    "hourly": ["temperature_2m", "snowfall", "snow_depth", "weather_code", "cloud_cover"],
+    "daily": ["temperature_2m_max", "temperature_2m_min", "sunshine_duration"],
+    "current": ["temperature_2m", "snow_depth", "snowfall", "weather_code"],
+    "timezone": "Europe/Berlin",
+}
+CACHE_KEY_PREFIX = "forecast:"
+
+forecast_flight = SingleFlight("forecast")
+refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="forecast-refresh")
+
+
+def grid_cell(lat, lon, resolution=None):
+    """Snap a point to the centre of its forecast grid cell."""
+    resolution = resolution or settings.FORECAST_GRID_RESOLUTION
+    return (
+        round(round(float(lat) / resolution) * resolution, 4),
+        round(round(float(lon) / resolution) * resolution, 4),
+    )
+
+
+def snap_to_cached_cell(lat, lon, params=FORECAST_PARAMS, max_km=None):
+    """Return the grid cell whose cached forecast should serve a point.
+
+    That is the point's own cell when it is cached (or when no adjacent
+    cached cell is within ``max_km``), otherwise the nearest cached
+    adjacent cell.
+    """
+    max_km = settings.FORECAST_SNAP_KM if max_km is None else max_km
+    cell = grid_cell(lat, lon)
+    if max_km <= 0:
+        return cell
+    resolution = settings.FORECAST_GRID_RESOLUTION
+    cells = [
+        grid_cell(cell[0] + dlat * resolution, cell[1] + dlon * resolution)
+        for dlat in (-1, 0, 1)
+        for dlon in (-1, 0, 1)
+    ]
+    keys = {forecast_cache_key(c, params): c for c in cells}
+    cached = [keys[key] for key in cache.get_many(list(keys))]
+    if not cached or cell in cached:
+        return cell
+    distances = haversine_km(lat, lon, [c[0] for c in cached], [c[1] for c in cached])
+    nearest = int(distances.argmin())
+    return cached[nearest] if distances[nearest] <= max_km else cell
+
+
+def forecast_cache_key(cell, params=FORECAST_PARAMS):
+    """Cache key for a grid cell and the requested variable set."""
+    variables = json.dumps(params, sort_keys=True)
+    digest = hashlib.sha1(variables.encode()).hexdigest()[:12]
+    return f"{CACHE_KEY_PREFIX}{cell[0]:.4f}:{cell[1]:.4f}:{digest}"
+
+
+def fetch_forecast(lat, lon, params=FORECAST_PARAMS):
+    """Fetch a forecast from Open-Meteo, bypassing the cache."""
+    response = upstream_get(
+        OPEN_METEO, settings.OPEN_METEO_URL, params={"latitude": lat, "longitude": lon, **params}
+    )
+    return response.json()
+
+
+def fetch_forecasts(cells, params=FORECAST_PARAMS):
+    """Fetch forecasts for several points with one Open-Meteo request.
+
+    Returns one forecast per point, in order.
+    """
+    response = upstream_get(OPEN_METEO, settings.OPEN_METEO_URL, params={
+        "latitude": ",".join(str(lat) for lat, _ in cells),
+        "longitude": ",".join(str(lon) for _, lon in cells),
+        **params,
+    })
+    payload = response.json()
+    # A single location comes back as an object, several as a list.
+    return payload if isinstance(payload, list) else [payload]
+
+
+async def afetch_forecast(lat, lon, params=FORECAST_PARAMS):
+    """Async version of ``fetch_forecast`` using the pooled HTTP/2 client."""
+    response = await aupstream_get(
+        OPEN_METEO, settings.OPEN_METEO_URL, params={"latitude": lat, "longitude": lon, **params}
+    )
+    return response.json()
+
+
+def new_entry(data, fetched_at):
+    """A forecast cache entry: the Open-Meteo ``data`` and what's derived from it."""
+    return {"data": data, "fetched_at": fetched_at, "conditions": derive_conditions(data, fetched_at)}
+
+
+def _store(key, cell, params):
+    entry = new_entry(fetch_forecast(*cell, params=params), time.time())
+    cache.set(key, entry, settings.FORECAST_CACHE_TTL + settings.FORECAST_STALE_TTL)
+    snapshot_buffer.add(cell, entry)
+    return entry
+
+
+def _last_known(cell, params):
+    # Snapshots only store the variables of the default parameter set.
+    if params != FORECAST_PARAMS:
+        return None
+    entry = last_known_entry(cell)
+    if entry is not None:
+        logger.warning("Open-Meteo unavailable, serving the stored forecast for %s", cell)
+    return entry
+
+
+def _serve_cached(entry, key, cell, params):
+    if time.time() - entry["fetched_at"] <= settings.FORECAST_CACHE_TTL:
+        count_lookup("forecast", "hits")
+        return entry
+    count_lookup("forecast", "stale_hits")
+    if breakers[OPEN_METEO].state == OPEN:
+        return {**entry, "stale": True}
+    _schedule_refresh(key, cell, params)
+    return entry
+
+
+def _refresh(key, cell, params):
+    try:
+        _store(key, cell, params)
+    except Exception:
+        logger.exception("Background forecast refresh failed for %s", key)
+    finally:
+        cache.delete(key + ":refreshing")
+
+
+def _schedule_refresh(key, cell, params):
+    # cache.add is atomic, so only one worker schedules the refresh for a key.
+    if cache.add(key + ":refreshing", True, settings.FORECAST_REFRESH_LOCK_TIMEOUT):
+        refresh_executor.submit(_refresh, key, cell, params)
+
+
+def get_forecast_entry(lat, lon, params=FORECAST_PARAMS):
+    """Return the cache entry (``data`` and ``fetched_at``) for a point and the grid cell it is from.
+
+    That cell may be an adjacent one (``snap_to_cached_cell``).
+    """
+    cell = grid_cell(lat, lon)
+    key = forecast_cache_key(cell, params)
+    with stage("cache"):
+        entry = cache.get(key)
+        if entry is None and settings.FORECAST_SNAP_KM > 0:
+            cell = snap_to_cached_cell(lat, lon, params)
+            key = forecast_cache_key(cell, params)
+            entry = cache.get(key)
+    if entry is not None:
+        return _serve_cached(entry, key, cell, params), cell
+    count_lookup("forecast", "misses")
+    try:
+        return forecast_flight.do(key, lambda: _store(key, cell, params), lookup=lambda: cache.get(key)), cell
+    except Exception:
+        entry = _last_known(cell, params)
+        if entry is None:
+            raise
+        return entry, cell
+
+
+def get_forecast(lat, lon, params=FORECAST_PARAMS):
+    """Return the Open-Meteo forecast for the grid cell containing a point.
+
+    The returned dict is a shallow copy with the fetch time added as
+    ``fetched_at`` and the grid cell it is from as ``cell``; callers may set
+    top-level keys but must not modify the series in place.
+    """
+    return _forecast_from_entry(*get_forecast_entry(lat, lon, params))
+
+
+def _forecast_from_entry(entry, cell):
+    forecast = dict(entry["data"])
+    forecast["cell"] = cell
+    forecast["fetched_at"] = entry["fetched_at"]
+    forecast["stale"] = entry.get("stale", False)
+    # Entries rebuilt from snapshots (and any cached before conditions were) lack them.
+    if "conditions" in entry:
+        forecast["conditions"] = entry["conditions"]
+    else:
+        forecast["conditions"] = derive_conditions(entry["data"], entry["fetched_at"])
+    return forecast
+
+
+async def aget_forecast(lat, lon, params=FORECAST_PARAMS):
+    """Async version of ``get_forecast``."""
+    cell = grid_cell(lat, lon)
+    key = forecast_cache_key(cell, params)
+    with stage("cache"):
+        entry = await cache.aget(key)
+        if entry is None and settings.FORECAST_SNAP_KM > 0:
+            cell = await sync_to_async(snap_to_cached_cell)(lat, lon, params)
+            key = forecast_cache_key(cell, params)
+            entry = await cache.aget(key)
+    if entry is not None:
+        return _forecast_from_entry(await sync_to_async(_serve_cached)(entry, key, cell, params), cell)
+    count_lookup("forecast", "misses")
+
+    async def fetch():
+        entry = new_entry(await afetch_forecast(*cell, params=params), time.time())
+        await cache.aset(key, entry, settings.FORECAST_CACHE_TTL + settings.FORECAST_STALE_TTL)
+        snapshot_buffer.add(cell, entry)
+        return entry
+
+    try:
+        entry = await forecast_flight.ado(key, fetch, lookup=lambda: cache.get(key))
+    except Exception:
+        entry = await sync_to_async(_last_known)(cell, params)
+        if entry is None:
+            raise
+    return _forecast_from_entry(entry, cell)
+
+
+def prefetch_forecast(lat, lon, params=FORECAST_PARAMS, min_age=0, limiter=None):
+    """Fetch and cache the forecast for a point ahead of any page view.
+
+    Skips the fetch (and returns False) when the cached entry is younger
+    than ``min_age`` seconds. ``limiter.acquire()`` is called before an
+    actual upstream fetch.
+    """
+    cell = grid_cell(lat, lon)
+    key = forecast_cache_key(cell, params)
+    entry = cache.get(key)
+    if entry is not None and time.time() - entry["fetched_at"] < min_age:
+        return False
+    if limiter is not None:
+        limiter.acquire()
+    forecast_flight.do(key, lambda: _store(key, cell, params))
+    return True
+
+
+def peek_forecasts(points, params=FORECAST_PARAMS):
+    """Cached forecasts for ``points`` (None where not cached), without fetching."""
+    cells = [grid_cell(lat, lon) for lat, lon in points]
+    keys = [forecast_cache_key(cell, params) for cell in cells]
+    with stage("cache"):
+        cached = cache.get_many(keys)
+    return [_forecast_from_entry(cached[key], cell) if key in cached else None for cell, key in zip(cells, keys)]
+
+
+def get_forecasts(points, params=FORECAST_PARAMS):
+    """Batch version of ``get_forecast`` for a list of ``(lat, lon)`` points.
+
+    Cached cells are read with one ``get_many``; the remaining cells are
+    fetched with multi-location requests of up to ``FORECAST_BATCH_SIZE``
+    cells each and cached individually, exactly as single fetches are.
+    """
+    cells = [grid_cell(lat, lon) for lat, lon in points]
+    keys = {cell: forecast_cache_key(cell, params) for cell in cells}
+    with stage("cache"):
+        cached = cache.get_many(list(keys.values()))
+    entries = {cell: cached[key] for cell, key in keys.items() if key in cached}
+
+    for cell, entry in entries.items():
+        entries[cell] = _serve_cached(entry, keys[cell], cell, params)
+
+    missing = [cell for cell in keys if cell not in entries]
+    for _ in missing:
+        count_lookup("forecast", "misses")
+    batch_size = settings.FORECAST_BATCH_SIZE
+    for i in range(0, len(missing), batch_size):
+        chunk = missing[i:i + batch_size]
+        fetched_at = time.time()
+        try:
+            forecasts = fetch_forecasts(chunk, params)
+        except Exception:
+            fallbacks = {cell: _last_known(cell, params) for cell in chunk}
+            if None in fallbacks.values():
+                raise
+            entries.update(fallbacks)
+            continue
+        fetched = {cell: new_entry(data, fetched_at) for cell, data in zip(chunk, forecasts)}
+        cache.set_many(
+            {keys[cell]: entry for cell, entry in fetched.items()},
+            settings.FORECAST_CACHE_TTL + settings.FORECAST_STALE_TTL,
+        )
+        for cell, entry in fetched.items():
+            snapshot_buffer.add(cell, entry)
+        entries.update(fetched)
+
+    return [_forecast_from_entry(entries[cell], cell) for cell in cells]
@@ -0,0 +1,155 @@
+"""Offline gazetteer of ski resorts for autocomplete and geocoding.
+
+The bundled ``data/resorts.csv`` is loaded once per process into a sorted
+array of folded name keys that is searched with ``bisect``: a prefix
+lookup is one binary search plus a scan over the matching run, so
+autocomplete never leaves the process. Every official and alternate name
+is indexed, and so is each word suffix of it ("anton" finds
+"St. Anton am Arlberg").
+
+Keys are folded: accents are stripped, case is folded and punctuation is
+treated as whitespace, so "Solden", "sölden" and "SÖLDEN" are the same key.
+"""
+import csv
+import logging
+import sys
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+Resort = namedtuple("Resort", "name country latitude longitude")
+
+
+def fold(text):
+    """Return the index key for ``text``: accent-free, case-folded words."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(
+        char if char.isalnum() else " "
+        for char in text
+        if not unicodedata.combining(char)
+    )
+    return " ".join(text.casefold().split())
+
+
+def as_location(resort):
+    """The resort in the format returned by ``geocoding.geocode``."""
+    return {
+        "lat": resort.latitude,
+        "lon": resort.longitude,
+        "display_name": f"{resort.name}, {resort.country}",
+    }
+
+
+class Gazetteer:
+    """In-memory prefix index over resort names."""
+
+    def __init__(self, entries):
+        """``entries`` is an iterable of ``(Resort, names)`` pairs."""
+        self.resorts = []
+        self._exact = {}
+        index = set()
+        for resort, names in entries:
+            resort_id = len(self.resorts)
+            self.resorts.append(resort)
+            for name in names:
+                key = fold(name)
+                if not key:
+                    continue
+                self._exact.setdefault(key, resort_id)
+                words = key.split(" ")
+                for i in range(len(words)):
+                    # The full name sorts before its suffixes for the same resort.
+                    index.add((" ".join(words[i:]), i, resort_id))
+        index = sorted(index)
+        self._keys = [key for key, _, _ in index]
+        self._ids = [resort_id for _, _, resort_id in index]
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        return cls(
+            (
+                Resort(row["name"], row["country"], float(row["latitude"]), float(row["longitude"])),
+                [row["name"], *filter(None, row["alternate_names"].split("|"))],
+            )
+            for row in rows
+        )
+
+    def __len__(self):
+        return len(self.resorts)
+
+    def resolve(self, name):
+        """Return the resort called exactly ``name`` (after folding), or None."""
+        resort_id = self._exact.get(fold(name))
+        return None if resort_id is None else self.resorts[resort_id]
+
+    def complete(self, prefix, limit=10):
+        """Resorts with a name, or a word in a name, starting with ``prefix``.
+
+        Whole-name matches come before matches on a later word; each group
+        is in alphabetical order of the matched key.
+        """
+        prefix = fold(prefix)
+        if not prefix or limit <= 0:
+            return []
+        start = bisect_left(self._keys, prefix)
+        name_matches, word_matches, seen = [], [], set()
+        for i in range(start, len(self._keys)):
+            if not self._keys[i].startswith(prefix):
+                break
+            resort_id = self._ids[i]
+            if resort_id in seen:
+                continue
+            seen.add(resort_id)
+            is_full_name = self._exact.get(self._keys[i]) == resort_id
+            (name_matches if is_full_name else word_matches).append(self.resorts[resort_id])
+            if len(name_matches) >= limit:
+                break
+        return (name_matches + word_matches)[:limit]
+
+    def memory_usage(self):
+        """Approximate bytes held by the index and the resort records."""
+        containers = (self.resorts, self._exact, self._keys, self._ids)
+        size = sum(sys.getsizeof(c) for c in containers)
+        size += sum(sys.getsizeof(key) for key in self._keys)
+        size += sum(sys.getsizeof(key) for key in self._exact)
+        size += sum(sys.getsizeof(r) + sum(map(sys.getsizeof, r)) for r in self.resorts)
+        return size
+
+    def stats(self):
+        return {
+            "resorts": len(self.resorts),
+            "keys": len(self._keys),
+            "memory_bytes": self.memory_usage(),
+        }
+
+
+_gazetteer = None
+_load_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """The process-wide gazetteer, loaded from ``settings.GAZETTEER_PATH`` on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _load_lock:
+            if _gazetteer is None:
+                gazetteer = Gazetteer.from_csv(settings.GAZETTEER_PATH)
+                logger.info(
+                    "Loaded %(resorts)d resorts (%(keys)d index keys, %(memory_bytes)d bytes)",
+                    gazetteer.stats(),
+                )
+                _gazetteer = gazetteer
+    return _gazetteer
+
+
+def resolve_resort(name):
+    """Return the geocoded location of the resort ``name``, or None if unknown."""
+    resort = get_gazetteer().resolve(name)
+    return None if resort is None else as_location(resort)
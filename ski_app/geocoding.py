@@ -0,0 +1,216 @@
+"""City name -> coordinates lookups, cached in front of Nominatim.
+
+Names of known resorts are resolved from the bundled gazetteer without any
+I/O. Other lookups go through three tiers before Nominatim is contacted:
+
+1. an in-process LRU (per gunicorn worker),
+2. the shared Django cache (Redis in production),
+3. the ``GeocodedLocation`` table in Postgres.
+
+A hit in a lower tier is promoted into the tiers above it.
+"""
+import logging
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .gazetteer import resolve_resort
+from .http import NOMINATIM, aupstream_get, upstream_get
+from .metrics import count_lookup, stage
+from .models import GeocodedLocation
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "geocode:"
+
+
+def normalize_city(city):
+    """Return the cache key for a free-text city name.
+
+    Unicode is NFKC-normalized, case-folded and whitespace is collapsed, so
+    " Val  d'Isère" and "val d'isère" share one entry.
+    """
+    city = unicodedata.normalize("NFKC", city or "")
+    return " ".join(city.casefold().split())
+
+
+class LRUCache:
+    """A small thread-safe LRU mapping."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GeocodeCache:
+    """Two-tier (LRU + Django cache) geocode cache backed by the database."""
+
+    def __init__(self, maxsize=None, timeout=None):
+        self.lru = LRUCache(maxsize or settings.GEOCODE_LRU_SIZE)
+        self.timeout = timeout or settings.GEOCODE_CACHE_TIMEOUT
+        self.counters = Counter()
+        self._counter_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+        count_lookup("geocode", name)
+
+    def get(self, city):
+        """Return the cached location for ``city`` or None on a miss."""
+        key = normalize_city(city)
+        location = self.lru.get(key)
+        if location is not None:
+            self._count("lru_hits")
+            return location
+
+        with stage("cache"):
+            location = cache.get(CACHE_KEY_PREFIX + key)
+        if location is not None:
+            self._count("cache_hits")
+            self.lru.set(key, location)
+            return location
+
+        row = GeocodedLocation.objects.filter(query=key).first()
+        if row is not None:
+            self._count("db_hits")
+            location = row.as_location()
+            self._promote(key, location)
+            return location
+
+        self._count("misses")
+        return None
+
+    def set(self, city, location, persist=True):
+        """Store ``location`` in every tier."""
+        key = normalize_city(city)
+        if persist:
+            GeocodedLocation.objects.update_or_create(
+                query=key,
+                defaults={
+                    "latitude": location["lat"],
+                    "longitude": location["lon"],
+                    "display_name": location.get("display_name", ""),
+                },
+            )
+        self._promote(key, location)
+
+    def _promote(self, key, location):
+        self.lru.set(key, location)
+        cache.set(CACHE_KEY_PREFIX + key, location, self.timeout)
+
+    def stats(self):
+        with self._counter_lock:
+            stats = dict(self.counters)
+        hits = sum(v for k, v in stats.items() if k.endswith("_hits"))
+        lookups = hits + stats.get("misses", 0)
+        stats["hit_ratio"] = hits / lookups if lookups else 0.0
+        stats["lru_size"] = len(self.lru)
+        return stats
+
+
+geocode_cache = GeocodeCache()
+geocode_flight = SingleFlight("geocode")
+
+
+def _parse_location(payload):
+    result = payload[0]
+    return {
+        "lat": float(result["lat"]),
+        "lon": float(result["lon"]),
+        "display_name": result.get("display_name", ""),
+    }
+
+
+def fetch_location(city):
+    """Resolve ``city`` with Nominatim, bypassing every cache tier."""
+    response = upstream_get(
+        NOMINATIM, settings.NOMINATIM_URL, params={"q": city, "format": "json", "limit": 1}
+    )
+    return _parse_location(response.json())
+
+
+async def afetch_location(city):
+    """Async version of ``fetch_location`` using the pooled HTTP/2 client."""
+    response = await aupstream_get(
+        NOMINATIM, settings.NOMINATIM_URL, params={"q": city, "format": "json", "limit": 1}
+    )
+    return _parse_location(response.json())
+
+
+def geocode(city):
+    """Return ``{"lat", "lon", "display_name"}`` for ``city``.
+
+    Raises ``IndexError`` when Nominatim knows no such place, and
+    ``requests.RequestException`` on upstream errors.
+    """
+    location = resolve_resort(city) or geocode_cache.get(city)
+    if location is not None:
+        return location
+
+    def fetch():
+        location = fetch_location(city)
+        geocode_cache.set(city, location)
+        return location
+
+    key = normalize_city(city)
+    return geocode_flight.do(key, fetch, lookup=lambda: cache.get(CACHE_KEY_PREFIX + key))
+
+
+def cached_location(city):
+    """Return the location for ``city`` from the in-memory tier only.
+
+    Never blocks on I/O, so async callers can use it to start work for
+    already-geocoded cities right away.
+    """
+    return geocode_cache.lru.get(normalize_city(city))
+
+
+async def ageocode(city):
+    """Async version of ``geocode``.
+
+    Cache tiers that need I/O run in a thread; a miss is resolved with the
+    pooled async client, coalesced with concurrent misses like ``geocode``.
+    """
+    location = resolve_resort(city) or cached_location(city)
+    if location is not None:
+        return location
+    location = await sync_to_async(geocode_cache.get)(city)
+    if location is not None:
+        return location
+
+    async def fetch():
+        location = await afetch_location(city)
+        await sync_to_async(geocode_cache.set)(city, location)
+        return location
+
+    key = normalize_city(city)
+    return await geocode_flight.ado(key, fetch, lookup=lambda: cache.get(CACHE_KEY_PREFIX + key))
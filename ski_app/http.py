@@ -0,0 +1,140 @@
+"""Shared, pooled HTTP clients for upstream APIs.
+
+Reusing one client per process keeps TCP/TLS connections to Nominatim and
+Open-Meteo alive between requests instead of paying a new handshake for
+every call.
+
+Upstream calls go through ``upstream_get``/``aupstream_get``, which apply
+the upstream's connect and read timeouts from ``UPSTREAM_TIMEOUTS`` and
+its circuit breaker. Connection errors, timeouts and 5xx responses count
+as failures; a 4xx answer means the upstream itself is healthy.
+"""
+import asyncio
+import weakref
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .circuitbreaker import CircuitBreaker, CircuitOpenError
+from .metrics import UPSTREAM_REQUESTS, stage
+
+USER_AGENT = "SkiApp"
+NOMINATIM = "nominatim"
+OPEN_METEO = "open-meteo"
+OPEN_METEO_ARCHIVE = "open-meteo-archive"
+
+breakers = {
+    NOMINATIM: CircuitBreaker("Nominatim"),
+    OPEN_METEO: CircuitBreaker("Open-Meteo"),
+    OPEN_METEO_ARCHIVE: CircuitBreaker("Open-Meteo archive"),
+}
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        pool_maxsize=settings.HTTP_MAX_CONNECTIONS,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+# requests.Session is safe to share between the threads of a gunicorn worker.
+session = _build_session()
+
+# An httpx.AsyncClient is bound to the event loop it was first used on. Under
+# uvicorn there is one loop per process; under runserver every async request
+# gets its own loop, hence one client per loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Return the pooled HTTP/2 client for the running event loop."""
+    # httpx (with h2) takes longer to import than the rest of this module and only
+    # the async views use it, so WSGI workers never load it.
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _healthy(response):
+    return response is not None and response.status_code < 500
+
+
+def _before_call(upstream):
+    breaker = breakers[upstream]
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        UPSTREAM_REQUESTS.labels(upstream, "rejected").inc()
+        raise
+    return breaker
+
+
+def _record(upstream, breaker, response):
+    healthy = _healthy(response)
+    breaker.record(healthy)
+    outcome = "ok" if response is not None and response.status_code < 400 else "error"
+    UPSTREAM_REQUESTS.labels(upstream, outcome).inc()
+
+
+def upstream_get(upstream, url, params=None):
+    """GET ``url`` from ``upstream`` with its timeouts and circuit breaker.
+
+    Returns the response; raises ``CircuitOpenError`` without calling the
+    upstream while its circuit is open, and ``requests.RequestException``
+    on errors and non-2xx responses.
+    """
+    breaker = _before_call(upstream)
+    response = None
+    try:
+        with stage(upstream):
+            response = session.get(url, params=params, timeout=settings.UPSTREAM_TIMEOUTS[upstream])
+        response.raise_for_status()
+        return response
+    except requests.RequestException as e:
+        response = e.response
+        raise
+    finally:
+        _record(upstream, breaker, response)
+
+
+async def aupstream_get(upstream, url, params=None):
+    """Async version of ``upstream_get`` using the pooled HTTP/2 client."""
+    import httpx
+
+    breaker = _before_call(upstream)
+    connect, read = settings.UPSTREAM_TIMEOUTS[upstream]
+    response = None
+    try:
+        with stage(upstream):
+            response = await get_async_client().get(
+                url, params=params, timeout=httpx.Timeout(read, connect=connect)
+            )
+        response.raise_for_status()
+        return response
+    except httpx.HTTPStatusError as e:
+        response = e.response
+        raise
+    except httpx.HTTPError:
+        response = None
+        raise
+    finally:
+        _record(upstream, breaker, response)
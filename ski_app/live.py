@@ -0,0 +1,238 @@
+"""Forecast updates pushed to open result pages over Server-Sent Events.
+
+A results page subscribes to the grid cell of its forecast at
+``live/forecast/?lat=&lon=&since=<fetched_at>``. Whenever a new model run
+of a cell is stored (``snapshots_stored``, sent by whichever process
+fetched it: a page view, a background refresh or the prefetcher), the
+cell is published on one Redis channel. Every web process listens to that
+channel in one thread; for a cell with subscribers it reads the cached
+forecast once and hands its ``summary`` to all of them. So one upstream
+refresh reaches every open page, without a single reload or extra fetch.
+Runs are published when their snapshot batch is written, so at most
+``SNAPSHOT_FLUSH_INTERVAL`` seconds after the fetch.
+
+Each connection sends only the summary values that changed since its
+last event (``diff``). Without Redis (development, tests), publishing
+dispatches to the subscribers of the current process directly.
+
+Connections are held open, so the endpoint is only served by the async
+views under ASGI (``LIVE_UPDATES``).
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django_redis import get_redis_connection
+
+from .forecast import forecast_cache_key, grid_cell
+from .metrics import LIVE_SUBSCRIBERS
+from .signals import snapshots_stored
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "live:forecasts"
+CURRENT_FIELDS = ("temperature_2m", "snow_depth", "snowfall", "weather_code")
+CONDITION_FIELDS = (
+    "new_snow_24h",
+    "new_snow_72h",
+    "snow_depth_change_24h",
+    "snow_depth_change_72h",
+    "freeze_thaw_cycles_72h",
+    "best_powder_hour",
+    "best_powder_score",
+)
+
+
+def summary(entry):
+    """The values of a forecast cache entry that results pages update in place, by ``data-live`` key."""
+    current = entry["data"].get("current") or {}
+    conditions = entry.get("conditions") or {}
+    return {
+        "fetched_at": entry["fetched_at"],
+        **{f"current.{field}": current.get(field) for field in CURRENT_FIELDS},
+        **{f"conditions.{field}": conditions.get(field) for field in CONDITION_FIELDS},
+    }
+
+
+def diff(previous, current):
+    """The keys of ``current`` whose values differ from ``previous``."""
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+class ForecastHub:
+    """The subscribed pages of this process, by grid cell.
+
+    Each subscriber is an ``asyncio.Queue`` on its connection's event loop;
+    ``dispatch`` may be called from any thread.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, cell):
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers[cell].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, cell, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(cell, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(cell, None)
+
+    def dispatch(self, cell):
+        """Send the cached forecast of ``cell`` to its subscribers; returns how many there were."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(cell, ()))
+        if not subscribers:
+            return 0
+        entry = cache.get(forecast_cache_key(cell))
+        if entry is None:
+            return 0
+        update = summary(entry)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, update)
+            except RuntimeError:
+                # The connection's event loop has shut down.
+                pass
+        return len(subscribers)
+
+
+hub = ForecastHub()
+
+
+class RedisBroker:
+    """Fans published cells out to the ``hub`` of every process through Redis pub/sub."""
+
+    def __init__(self, client):
+        self.client = client
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, cells):
+        self.client.publish(CHANNEL, json.dumps(cells))
+
+    def listen(self):
+        """Start this process' listener thread, once."""
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="live-updates", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for message in pubsub.listen():
+                    for cell in json.loads(message["data"]):
+                        hub.dispatch(tuple(cell))
+            except Exception:
+                logger.warning("Live forecast updates lost their Redis subscription, reconnecting", exc_info=True)
+                time.sleep(1)
+
+
+class LocalBroker:
+    """In-process stand-in for cache backends without Redis (development, tests)."""
+
+    def publish(self, cells):
+        for cell in cells:
+            hub.dispatch(tuple(cell))
+
+    def listen(self):
+        pass
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        try:
+            _broker = RedisBroker(get_redis_connection("default"))
+        except NotImplementedError:
+            _broker = LocalBroker()
+    return _broker
+
+
+@receiver(snapshots_stored)
+def publish_new_runs(sender, snapshots, **kwargs):
+    """Publish the cells of newly stored model runs; errors are logged, not raised."""
+    cells = sorted({(snapshot.latitude, snapshot.longitude) for snapshot in snapshots})
+    if not cells:
+        return
+    try:
+        get_broker().publish(cells)
+    except Exception:
+        logger.warning("Publishing live forecast updates failed", exc_info=True)
+
+
+def server_sent_event(changes):
+    return f"event: forecast\nid: {changes['fetched_at']}\ndata: {json.dumps(changes)}\n\n"
+
+
+async def event_stream(cell, since):
+    """Server-Sent Events for the forecast of ``cell``, the page showing the one fetched at ``since``.
+
+    A page opened (or reconnecting) after a newer run was cached gets the
+    changes at once; after that, one event per new run. A comment is sent
+    every ``LIVE_KEEPALIVE`` seconds so proxies keep the connection open.
+    """
+    get_broker().listen()
+    # Subscribe first, so a run stored while the cache is read isn't missed.
+    queue = hub.subscribe(cell)
+    LIVE_SUBSCRIBERS.inc()
+    try:
+        yield f"retry: {settings.LIVE_RETRY_MS}\n\n"
+        entry = await cache.aget(forecast_cache_key(cell))
+        last = {"fetched_at": since}
+        if entry is not None:
+            last = summary(entry)
+            # The page's values aren't known here, so a newer run is sent whole.
+            if entry["fetched_at"] > since:
+                yield server_sent_event(last)
+        while True:
+            try:
+                update = await asyncio.wait_for(queue.get(), settings.LIVE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if update["fetched_at"] <= last["fetched_at"]:
+                continue
+            changes = diff(last, update)
+            last = update
+            yield server_sent_event(changes)
+    finally:
+        hub.unsubscribe(cell, queue)
+        LIVE_SUBSCRIBERS.dec()
+
+
+async def forecast_updates(request):
+    """The ``event_stream`` of ``?lat=&lon=``, picking up after ``?since=`` (or ``Last-Event-ID``)."""
+    if not settings.LIVE_UPDATES:
+        raise Http404("Live updates are disabled.")
+    try:
+        lat, lon = float(request.GET["lat"]), float(request.GET["lon"])
+        since = float(request.headers.get("Last-Event-ID") or request.GET.get("since") or 0)
+    except KeyError:
+        return JsonResponse({"error": "The 'lat' and 'lon' parameters are required."}, status=400)
+    except ValueError:
+        return JsonResponse({"error": "'lat', 'lon' and 'since' must be numbers."}, status=400)
+
+    response = StreamingHttpResponse(event_stream(grid_cell(lat, lon), since), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Don't let nginx-style proxies buffer the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
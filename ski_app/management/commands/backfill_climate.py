@@ -0,0 +1,48 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ski_app.climatology import backfill, default_end
+from ski_app.gazetteer import get_gazetteer
+
+
+class Command(BaseCommand):
+    help = "Fetch years of daily snow history per resort and recompute the weekly snow climatology."
+
+    def add_arguments(self, parser):
+        parser.add_argument("resorts", nargs="*", help="Resort names; all resorts in the gazetteer by default.")
+        parser.add_argument("--years", type=int, default=settings.CLIMATE_YEARS)
+        parser.add_argument("--end", type=datetime.date.fromisoformat,
+                            help="Last day to fetch (YYYY-MM-DD); defaults to CLIMATE_ARCHIVE_LAG_DAYS ago.")
+        parser.add_argument("--workers", type=int, default=settings.CLIMATE_BACKFILL_WORKERS,
+                            help="Resorts fetched concurrently.")
+        parser.add_argument("--full", action="store_true",
+                            help="Fetch every year again instead of extending the stored history.")
+
+    def handle(self, *args, **options):
+        gazetteer = get_gazetteer()
+        if options["resorts"]:
+            resorts = [gazetteer.resolve(name) for name in options["resorts"]]
+            unknown = [name for name, resort in zip(options["resorts"], resorts) if resort is None]
+            if unknown:
+                raise CommandError(f"Unknown resorts: {', '.join(unknown)}")
+        else:
+            resorts = gazetteer.resorts
+
+        started = time.perf_counter()
+        fetched = backfill(
+            resorts,
+            years=options["years"],
+            end=options["end"] or default_end(),
+            full=options["full"],
+            workers=options["workers"],
+        )
+        elapsed = time.perf_counter() - started
+        failed = len(resorts) - len(fetched)
+        self.stdout.write(self.style.SUCCESS(
+            f"Fetched {sum(fetched.values())} days for {sum(map(bool, fetched.values()))} resorts in {elapsed:.1f}s."
+        ))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Fetching failed for {failed} resorts; see the log."))
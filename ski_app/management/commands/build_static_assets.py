@@ -0,0 +1,51 @@
+import gzip
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ski_app.assets import build_site_css
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+def transfer_sizes(data):
+    """Bytes on the wire for ``data`` uncompressed, gzipped and brotli-compressed."""
+    return (
+        len(data),
+        len(gzip.compress(data, compresslevel=9)),
+        len(brotli.compress(data, quality=11)) if brotli else None,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Build static/build/site.min.css: Bootstrap purged of the classes our templates "
+        "don't use, plus the page styles. collectstatic then adds hashed, precompressed copies."
+    )
+
+    def handle(self, *args, **options):
+        static = Path(settings.BASE_DIR) / "static"
+        templates = sorted(Path(apps.get_app_config("ski_app").path).glob("templates/**/*.html"))
+        built, used = build_site_css(static, templates, settings.STATIC_PURGE_SAFELIST)
+
+        output = static / "build" / "site.min.css"
+        output.parent.mkdir(exist_ok=True)
+        output.write_bytes(built)
+
+        # Before: the full Bootstrap stylesheet and script bundle the page used to load
+        before = [
+            (static / "bootstrap" / "css" / "bootstrap.min.css").read_bytes(),
+            (static / "bootstrap" / "js" / "bootstrap.bundle.min.js").read_bytes(),
+        ]
+        self.stdout.write(f"{len(used)} classes used in {len(templates)} templates.")
+        self.stdout.write(f"{'':8}{'raw':>10}{'gzip':>10}{'brotli':>10}")
+        for label, files in (("before", before), ("after", [built])):
+            sizes = [transfer_sizes(data) for data in files]
+            totals = [sum(s[i] for s in sizes) if sizes[0][i] is not None else None for i in range(3)]
+            self.stdout.write(f"{label:8}" + "".join(f"{t:>10,}" if t is not None else f"{'n/a':>10}" for t in totals))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output.relative_to(settings.BASE_DIR)}."))
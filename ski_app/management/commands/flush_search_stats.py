@@ -0,0 +1,22 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ski_app.analytics import flush_search_stats
+
+
+class Command(BaseCommand):
+    help = "Copy search counters from Redis into the ResortSearchStats table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true",
+                            help="Keep running and flush every SEARCH_STATS_FLUSH_INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        while True:
+            rows = flush_search_stats()
+            self.stdout.write(f"Flushed search stats for {rows} resorts.")
+            if not options["loop"]:
+                break
+            time.sleep(settings.SEARCH_STATS_FLUSH_INTERVAL)
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ski_app.prefetch import Prefetcher, prefetch_targets
+from ski_app.snapshots import snapshot_buffer
+
+
+class Command(BaseCommand):
+    help = "Warm the forecast cache for configured and popular resorts, once or continuously."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=settings.PREFETCH_TOP_N,
+                            help="Number of known resorts to prefetch besides the configured ones.")
+        parser.add_argument("--concurrency", type=int, default=settings.PREFETCH_CONCURRENCY)
+        parser.add_argument("--rate", type=float, default=settings.PREFETCH_RATE_LIMIT,
+                            help="Maximum forecast requests per second.")
+        parser.add_argument("--loop", action="store_true",
+                            help="Keep running and refresh every resort once per PREFETCH_INTERVAL; "
+                                 "the popular resorts are looked up again every interval.")
+
+    def handle(self, *args, **options):
+        targets = prefetch_targets(options["top"])
+        prefetcher = Prefetcher(targets, concurrency=options["concurrency"], rate=options["rate"])
+        self.stdout.write(f"Prefetching forecasts for {len(targets)} resorts.")
+        try:
+            if options["loop"]:
+                prefetcher.run_forever(update_targets=lambda: prefetch_targets(options["top"]))
+            else:
+                fetched = prefetcher.run_once()
+                self.stdout.write(self.style.SUCCESS(f"Fetched {fetched} forecasts."))
+        finally:
+            snapshot_buffer.flush()
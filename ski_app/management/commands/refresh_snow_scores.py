@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ski_app.ranking import rebuild_scores
+
+
+class Command(BaseCommand):
+    help = "Rescore every grid cell from its latest stored forecast snapshot."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        scored = rebuild_scores()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Scored {scored} grid cells in {elapsed:.2f}s."))
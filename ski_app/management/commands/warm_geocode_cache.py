@@ -0,0 +1,48 @@
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from ski_app.geocoding import fetch_location, geocode_cache, normalize_city
+from ski_app.models import GeocodedLocation
+
+# Nominatim's usage policy allows at most one request per second.
+NOMINATIM_MIN_INTERVAL = 1.0
+
+
+class Command(BaseCommand):
+    help = "Load stored geocodes into the shared cache and geocode any new city names."
+
+    def add_arguments(self, parser):
+        parser.add_argument("cities", nargs="*", help="City names to geocode if not stored yet.")
+        parser.add_argument(
+            "--file",
+            help="Text file with one city name per line, e.g. a list of resorts.",
+        )
+
+    def handle(self, *args, **options):
+        warmed = 0
+        for row in GeocodedLocation.objects.iterator():
+            geocode_cache.set(row.query, row.as_location(), persist=False)
+            warmed += 1
+        self.stdout.write(f"Loaded {warmed} stored locations into the cache.")
+
+        cities = list(options["cities"])
+        if options["file"]:
+            with open(options["file"], encoding="utf-8") as fh:
+                cities.extend(line.strip() for line in fh if line.strip())
+
+        known = set(GeocodedLocation.objects.values_list("query", flat=True))
+        fetched = failed = 0
+        for city in dict.fromkeys(normalize_city(c) for c in cities):
+            if city in known:
+                continue
+            try:
+                geocode_cache.set(city, fetch_location(city))
+                fetched += 1
+            except (IndexError, requests.RequestException) as e:
+                failed += 1
+                self.stderr.write(f"Could not geocode {city!r}: {e}")
+            time.sleep(NOMINATIM_MIN_INTERVAL)
+
+        self.stdout.write(self.style.SUCCESS(f"Geocoded {fetched} new cities ({failed} failed)."))
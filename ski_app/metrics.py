@@ -0,0 +1,215 @@
+"""Prometheus metrics and ``Server-Timing`` headers for the web tier.
+
+Code on the request path wraps its stages in ``stage(name)``. Each stage
+is observed in the ``skiapp_stage_duration_seconds`` histogram and, for
+the current request, collected by ``MetricsMiddleware``, which sends the
+per-stage totals as a ``Server-Timing`` header. Database time is collected
+the same way by an execute wrapper installed on every connection.
+
+``metrics_view`` serves everything in the Prometheus text format, plus a
+``skiapp_cache_hit_ratio`` gauge derived from the lookup counters. Under
+gunicorn with several workers, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty
+directory so the scrape covers all workers rather than the one that
+happens to answer.
+"""
+import contextvars
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+REQUEST_SECONDS = Histogram(
+    "skiapp_request_duration_seconds", "Time to produce a response.", ["view", "status"]
+)
+STAGE_SECONDS = Histogram(
+    "skiapp_stage_duration_seconds", "Time spent in one stage of a request.", ["stage"]
+)
+UPSTREAM_REQUESTS = Counter(
+    "skiapp_upstream_requests", "Calls to upstream APIs by outcome.", ["upstream", "outcome"]
+)
+CACHE_LOOKUPS = Counter(
+    "skiapp_cache_lookups", "Cache lookups by cache and result.", ["cache", "result"]
+)
+SINGLEFLIGHT_CALLS = Counter(
+    "skiapp_singleflight_calls", "Single-flight lookups by flight and result.", ["flight", "result"]
+)
+IN_FLIGHT = Gauge(
+    "skiapp_requests_in_flight", "Requests being handled.", multiprocess_mode="livesum"
+)
+LIVE_SUBSCRIBERS = Gauge(
+    "skiapp_live_subscribers", "Open live forecast update streams.", multiprocess_mode="livesum"
+)
+
+# (stage, seconds) pairs of the request being handled, if any.
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage ``name`` of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def count_lookup(cache, result):
+    """Count one lookup in ``cache``; results ending in ``hits`` count as hits."""
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper: adds query time to the request's ``db`` stage."""
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.append(("db", time.perf_counter() - start))
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """``connection_created`` receiver that adds ``time_query`` once per connection."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def server_timing(timings):
+    """A ``Server-Timing`` header value with the total time per stage, in ms."""
+    totals = defaultdict(float)
+    for name, seconds in timings:
+        totals[name] += seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+class MetricsMiddleware:
+    """Times each request, tracks in-flight requests and adds ``Server-Timing``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token, start = self._start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            IN_FLIGHT.dec()
+            raise
+        return self._finish(request, response, token, start)
+
+    async def __acall__(self, request):
+        token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            IN_FLIGHT.dec()
+            raise
+        return self._finish(request, response, token, start)
+
+    def _start(self):
+        IN_FLIGHT.inc()
+        return _timings.set([]), time.perf_counter()
+
+    def _finish(self, request, response, token, start):
+        timings = _timings.get()
+        _timings.reset(token)
+        view = getattr(request.resolver_match, "url_name", None) or "unmatched"
+
+        finished = []
+
+        def done():
+            if not finished:
+                finished.append(time.perf_counter() - start)
+                IN_FLIGHT.dec()
+                REQUEST_SECONDS.labels(view, response.status_code).observe(finished[0])
+            return finished[0]
+
+        if response.streaming:
+            # A streamed view does its work while the content is consumed, so the
+            # request is timed and in flight until the stream ends or the response is
+            # closed (a stream that never started doesn't run its ``finally``). Its
+            # headers are sent before that, so it gets no Server-Timing; its stages
+            # are still observed in skiapp_stage_duration_seconds.
+            response.streaming_content = _closing(response.streaming_content, response.is_async, done)
+            response._resource_closers.append(done)
+            return response
+        response["Server-Timing"] = server_timing([*timings, ("total", done())])
+        return response
+
+
+def _closing(content, is_async, done):
+    """``content``, calling ``done()`` once it is exhausted or closed."""
+    if is_async:
+        async def stream():
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                done()
+    else:
+        def stream():
+            try:
+                yield from content
+            finally:
+                done()
+    return stream()
+
+
+class _WithHitRatios:
+    """Adds ``skiapp_cache_hit_ratio`` to what ``registry`` collects."""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def collect(self):
+        hits, totals = defaultdict(float), defaultdict(float)
+        for family in self.registry.collect():
+            yield family
+            if family.name != "skiapp_cache_lookups":
+                continue
+            for sample in family.samples:
+                if sample.name.endswith("_total"):
+                    cache = sample.labels["cache"]
+                    totals[cache] += sample.value
+                    if sample.labels["result"].endswith("hits"):
+                        hits[cache] += sample.value
+        ratios = GaugeMetricFamily(
+            "skiapp_cache_hit_ratio", "Share of lookups answered by a cache.", labels=["cache"]
+        )
+        for cache, total in sorted(totals.items()):
+            ratios.add_metric([cache], hits[cache] / total if total else 0.0)
+        yield ratios
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; needs ``Authorization: Bearer $METRICS_TOKEN`` if one is set."""
+    if settings.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(_WithHitRatios(registry)), content_type=CONTENT_TYPE_LATEST)
@@ -5,3 +5,11 @@ from django.db import migrations, models
 import django.db.models.deletion
 
 
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = []
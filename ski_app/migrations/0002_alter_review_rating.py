@@ -4,3 +4,11 @@ import django.core.validators
 from django.db import migrations, models
 
 
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ski_app', '0001_initial'),
+    ]
+
+    operations = []
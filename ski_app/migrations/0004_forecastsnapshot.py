@@ -0,0 +1,57 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:41
+
+import ski_app.fields
+from django.db import migrations, models
+
+from ski_app.partitioning import create_partitioned_table
+
+
+def create_forecastsnapshot_table(apps, schema_editor):
+    create_partitioned_table(schema_editor, apps.get_model('ski_app', 'ForecastSnapshot'), 'model_run')
+
+
+def drop_forecastsnapshot_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('ski_app', 'ForecastSnapshot'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ski_app', '0003_geocodedlocation'),
+    ]
+
+    # The table is partitioned by month on Postgres, which CreateModel can't express:
+    # the state is tracked by CreateModel, the table is created by RunPython.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ForecastSnapshot',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('latitude', models.FloatField()),
+                        ('longitude', models.FloatField()),
+                        ('model_run', models.DateTimeField()),
+                        ('fetched_at', models.DateTimeField()),
+                        ('timezone', models.CharField(max_length=64)),
+                        ('current', models.JSONField(default=dict)),
+                        ('hourly_start', models.DateTimeField()),
+                        ('hourly_temperature_2m', ski_app.fields.PackedArrayField(dtype='<f4')),
+                        ('hourly_snowfall', ski_app.fields.PackedArrayField(dtype='<f4')),
+                        ('hourly_snow_depth', ski_app.fields.PackedArrayField(dtype='<f4')),
+                        ('hourly_weather_code', ski_app.fields.PackedArrayField(dtype='<i2')),
+                        ('hourly_cloud_cover', ski_app.fields.PackedArrayField(dtype='<f4')),
+                        ('daily_start', models.DateField()),
+                        ('daily_temperature_2m_max', ski_app.fields.PackedArrayField(dtype='<f4')),
+                        ('daily_temperature_2m_min', ski_app.fields.PackedArrayField(dtype='<f4')),
+                        ('daily_sunshine_duration', ski_app.fields.PackedArrayField(dtype='<f4')),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['model_run'], name='ski_app_for_model_r_cbad1d_idx')],
+                        'constraints': [models.UniqueConstraint(fields=('latitude', 'longitude', 'model_run'), name='unique_snapshot_per_cell_run')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_forecastsnapshot_table, drop_forecastsnapshot_table),
+    ]
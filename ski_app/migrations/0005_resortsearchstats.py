@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ski_app', '0004_forecastsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResortSearchStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('query', models.CharField(max_length=255)),
+                ('searches', models.PositiveIntegerField(default=0)),
+                ('unique_visitors', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', '-searches'], name='ski_app_res_day_b077c9_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resortsearchstats',
+            constraint=models.UniqueConstraint(fields=('day', 'query'), name='unique_search_stats_per_day'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ski_app', '0005_resortsearchstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResortSnowScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('model_run', models.DateTimeField()),
+                ('score', models.FloatField(db_index=True)),
+                ('new_snow', models.FloatField(help_text='Snowfall over the scoring window, in cm.')),
+                ('snow_depth', models.FloatField(help_text='Maximum snow depth over the scoring window, in m.')),
+                ('mean_temperature', models.FloatField()),
+                ('mean_cloud_cover', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='resortsnowscore',
+            constraint=models.UniqueConstraint(fields=('latitude', 'longitude'), name='unique_snow_score_per_cell'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.6 on 2026-10-17 13:12
+
+import ski_app.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ski_app', '0006_resortsnowscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resort', models.CharField(max_length=255, unique=True)),
+                ('country', models.CharField(max_length=64)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('start_date', models.DateField()),
+                ('snow_depth', ski_app.fields.PackedArrayField(dtype='<f4', help_text='Daily maximum snow depth, in m.')),
+                ('snowfall', ski_app.fields.PackedArrayField(dtype='<f4', help_text='Daily snowfall, in cm.')),
+                ('temperature_mean', ski_app.fields.PackedArrayField(dtype='<f4', help_text='Daily mean temperature, in °C.')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SnowClimatology',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resort', models.CharField(max_length=255, unique=True)),
+                ('country', models.CharField(max_length=64)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('years', models.FloatField(help_text='Length of the history, in years.')),
+                ('snow_depth_p10', ski_app.fields.PackedArrayField(dtype='<f4')),
+                ('snow_depth_p25', ski_app.fields.PackedArrayField(dtype='<f4')),
+                ('snow_depth_p50', ski_app.fields.PackedArrayField(dtype='<f4')),
+                ('snow_depth_p75', ski_app.fields.PackedArrayField(dtype='<f4')),
+                ('snow_depth_p90', ski_app.fields.PackedArrayField(dtype='<f4')),
+                ('snowfall_mean', ski_app.fields.PackedArrayField(dtype='<f4', help_text='Mean snowfall per week, in cm.')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'snow climatologies',
+            },
+        ),
+    ]
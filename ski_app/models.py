@@ -1,5 +1,182 @@
+import datetime
+
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
-# Create your models here.
+from .fields import PackedArrayField
+
+
+class GeocodedLocation(models.Model):
+    """Durable tier of the geocode cache: one row per normalized city name."""
+
+    query = models.CharField(max_length=255, unique=True)
+    display_name = models.CharField(max_length=512, blank=True)
+    latitude = models.FloatField(validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.query} ({self.latitude}, {self.longitude})"
+
+    def as_location(self):
+        return {
+            "lat": self.latitude,
+            "lon": self.longitude,
+            "display_name": self.display_name,
+        }
+
+
+class ForecastSnapshot(models.Model):
+    """One Open-Meteo forecast for a grid cell, as fetched at ``model_run``.
+
+    Hourly and daily series are stored as packed arrays, one column per
+    variable, so a query can load just the series it needs. Timestamps are
+    implied: hourly values start at ``hourly_start`` one hour apart, daily
+    values start at ``daily_start`` one day apart.
+
+    On Postgres the table is partitioned by month of ``model_run`` (see
+    ``ski_app.partitioning``).
+    """
+
+    # Open-Meteo variable name -> model field
+    HOURLY_FIELDS = {
+        "temperature_2m": "hourly_temperature_2m",
+        "snowfall": "hourly_snowfall",
+        "snow_depth": "hourly_snow_depth",
+        "weather_code": "hourly_weather_code",
+        "cloud_cover": "hourly_cloud_cover",
+    }
+    DAILY_FIELDS = {
+        "temperature_2m_max": "daily_temperature_2m_max",
+        "temperature_2m_min": "daily_temperature_2m_min",
+        "sunshine_duration": "daily_sunshine_duration",
+    }
+
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    model_run = models.DateTimeField()
+    fetched_at = models.DateTimeField()
+    timezone = models.CharField(max_length=64)
+    current = models.JSONField(default=dict)
+
+    hourly_start = models.DateTimeField()
+    hourly_temperature_2m = PackedArrayField()
+    hourly_snowfall = PackedArrayField()
+    hourly_snow_depth = PackedArrayField()
+    hourly_weather_code = PackedArrayField(dtype="<i2")
+    hourly_cloud_cover = PackedArrayField()
+
+    daily_start = models.DateField()
+    daily_temperature_2m_max = PackedArrayField()
+    daily_temperature_2m_min = PackedArrayField()
+    daily_sunshine_duration = PackedArrayField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["latitude", "longitude", "model_run"], name="unique_snapshot_per_cell_run"
+            ),
+        ]
+        indexes = [models.Index(fields=["model_run"])]
+
+    def __str__(self):
+        return f"({self.latitude}, {self.longitude}) @ {self.model_run:%Y-%m-%d %H:%M}"
+
+
+class ResortSearchStats(models.Model):
+    """Daily search totals per normalized city name, flushed from Redis in batches."""
+
+    day = models.DateField()
+    query = models.CharField(max_length=255)
+    searches = models.PositiveIntegerField(default=0)
+    unique_visitors = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "query"], name="unique_search_stats_per_day"),
+        ]
+        indexes = [models.Index(fields=["day", "-searches"])]
+
+    def __str__(self):
+        return f"{self.query} on {self.day}: {self.searches}"
+
+
+class ResortSnowScore(models.Model):
+    """Latest "best snow this week" score per forecast grid cell.
+
+    Refreshed from each newly stored ``ForecastSnapshot`` by
+    ``ski_app.ranking``; rankings are plain ordered reads of this table.
+    """
+
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    name = models.CharField(max_length=255, blank=True)
+    model_run = models.DateTimeField()
+    score = models.FloatField(db_index=True)
+    new_snow = models.FloatField(help_text="Snowfall over the scoring window, in cm.")
+    snow_depth = models.FloatField(help_text="Maximum snow depth over the scoring window, in m.")
+    mean_temperature = models.FloatField()
+    mean_cloud_cover = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["latitude", "longitude"], name="unique_snow_score_per_cell"),
+        ]
+
+    def __str__(self):
+        return f"{self.name or (self.latitude, self.longitude)}: {self.score:.1f}"
+
+
+class ClimateHistory(models.Model):
+    """Daily weather history of one resort, from the Open-Meteo archive.
+
+    One packed column per variable, like ``ForecastSnapshot``: values start
+    at ``start_date`` one day apart. Written by ``manage.py backfill_climate``.
+    """
+
+    resort = models.CharField(max_length=255, unique=True)
+    country = models.CharField(max_length=64)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    start_date = models.DateField()
+    snow_depth = PackedArrayField(help_text="Daily maximum snow depth, in m.")
+    snowfall = PackedArrayField(help_text="Daily snowfall, in cm.")
+    temperature_mean = PackedArrayField(help_text="Daily mean temperature, in °C.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.resort} from {self.start_date}"
+
+    @property
+    def end_date(self):
+        return self.start_date + datetime.timedelta(days=len(self.snow_depth) - 1)
+
+
+class SnowClimatology(models.Model):
+    """Week-of-year snow statistics per resort, precomputed from its ``ClimateHistory``.
+
+    Every array has one value per week of the year: week 1 is 1-7 January,
+    week 52 runs from 23 December to the end of the year.
+    """
+
+    resort = models.CharField(max_length=255, unique=True)
+    country = models.CharField(max_length=64)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    first_date = models.DateField()
+    last_date = models.DateField()
+    years = models.FloatField(help_text="Length of the history, in years.")
+    snow_depth_p10 = PackedArrayField()
+    snow_depth_p25 = PackedArrayField()
+    snow_depth_p50 = PackedArrayField()
+    snow_depth_p75 = PackedArrayField()
+    snow_depth_p90 = PackedArrayField()
+    snowfall_mean = PackedArrayField(help_text="Mean snowfall per week, in cm.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "snow climatologies"
 
+    def __str__(self):
+        return f"{self.resort} ({self.first_date} to {self.last_date})"
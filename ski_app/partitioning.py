@@ -0,0 +1,79 @@
+"""Monthly range partitioning of time-series tables on Postgres.
+
+Django has no notion of partitioned tables, so migrations create them with
+``create_partitioned_table`` and writers call ``ensure_month_partitions``
+for the months they are about to insert into. On other databases (sqlite
+in tests) both fall back to a plain table and do nothing respectively.
+"""
+import datetime
+import re
+import threading
+
+from django.db import connections
+
+_known_partitions = set()
+_lock = threading.Lock()
+
+
+def create_partitioned_table(schema_editor, model, partition_key):
+    """Create ``model``'s table partitioned by month of ``partition_key``.
+
+    Postgres requires the partition key to be part of the primary key, so
+    the primary key becomes ``(id, partition_key)``. A DEFAULT partition
+    catches rows for months nobody created a partition for.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.create_model(model)
+        return
+
+    qn = schema_editor.quote_name
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+    sql, params = schema_editor.table_sql(model)
+    sql = re.sub(r" PRIMARY KEY", "", sql, count=1)
+    sql = (
+        f"{sql[:-1]}, PRIMARY KEY ({qn(pk)}, {qn(partition_key)}))"
+        f" PARTITION BY RANGE ({qn(partition_key)})"
+    )
+    schema_editor.execute(sql, params)
+    schema_editor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+def month_start(value):
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def next_month(value):
+    return month_start(value + datetime.timedelta(days=32))
+
+
+def ensure_month_partitions(model, months, using="default"):
+    """Create the monthly partitions of ``model`` covering ``months``.
+
+    ``months`` is an iterable of datetimes; each stands for its month.
+    Partitions created by this process are remembered, so repeat calls cost
+    nothing.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+
+    table = model._meta.db_table
+    qn = connection.ops.quote_name
+    with _lock:
+        missing = {month_start(m) for m in months} - {
+            month for name, month in _known_partitions if name == table
+        }
+        if not missing:
+            return
+        with connection.cursor() as cursor:
+            for start in sorted(missing):
+                partition = f"{table}_y{start:%Y}m{start:%m}"
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {qn(partition)} PARTITION OF {qn(table)} "
+                    "FOR VALUES FROM (%s) TO (%s)",
+                    [start, next_month(start)],
+                )
+                _known_partitions.add((table, start))
@@ -0,0 +1,156 @@
+"""Background prefetching of forecasts for popular resorts.
+
+The prefetcher refreshes the forecast cache entries of a set of resorts
+shortly before they go stale, so page views for those resorts are warm
+hits. Each resort gets a fixed slot within the refresh interval, derived
+from its name, so refreshes are spread out instead of firing together.
+"""
+import hashlib
+import heapq
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .analytics import trending_resorts
+from .forecast import prefetch_forecast
+from .gazetteer import resolve_resort
+from .geocoding import geocode, geocode_cache, normalize_city
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket shared by threads: at most ``rate`` calls per second."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def prefetch_targets(top):
+    """Names of the resorts to keep warm: configured ones first, then the most searched."""
+    configured = list(dict.fromkeys(normalize_city(name) for name in settings.PREFETCH_RESORTS))
+    popular = [query for query, *_ in trending_resorts(limit=top + len(configured))]
+    return configured + [query for query in popular if query not in configured][:top]
+
+
+def slot_offset(name, interval):
+    """Stable offset of ``name`` within the refresh interval."""
+    digest = hashlib.sha1(name.encode()).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32 * interval
+
+
+class Prefetcher:
+    """Keeps the forecasts of ``targets`` warm in the forecast cache."""
+
+    def __init__(self, targets, concurrency=None, rate=None, interval=None):
+        self.targets = targets
+        self.concurrency = concurrency or settings.PREFETCH_CONCURRENCY
+        self.interval = interval or settings.PREFETCH_INTERVAL
+        self.forecast_limiter = RateLimiter(rate or settings.PREFETCH_RATE_LIMIT)
+        # Nominatim allows one request per second; only cache misses use it.
+        self.geocode_limiter = RateLimiter(1)
+
+    def _locate(self, name):
+        # Gazetteer resorts are resolved offline, without waiting for the limiter.
+        location = resolve_resort(name) or geocode_cache.get(name)
+        if location is None:
+            self.geocode_limiter.acquire()
+            location = geocode(name)
+        return location
+
+    def refresh(self, name):
+        """Refresh one resort's forecast if it is close to going stale."""
+        try:
+            location = self._locate(name)
+            # Refresh entries that would go stale before this resort's next slot.
+            min_age = max(settings.FORECAST_CACHE_TTL - self.interval, 0)
+            return prefetch_forecast(
+                location["lat"], location["lon"], min_age=min_age, limiter=self.forecast_limiter
+            )
+        except Exception:
+            logger.exception("Prefetching the forecast for %r failed", name)
+            return False
+        finally:
+            close_old_connections()
+
+    def run_once(self):
+        """Refresh every target now; returns the number of upstream fetches."""
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="prefetch") as executor:
+            return sum(executor.map(self.refresh, self.targets))
+
+    def _update_targets(self, update_targets):
+        try:
+            targets = update_targets()
+        except Exception:
+            logger.exception("Updating the prefetch targets failed, keeping the current ones")
+            return
+        finally:
+            close_old_connections()
+        if set(targets) != set(self.targets):
+            logger.info("Prefetching forecasts for %d resorts from now on", len(targets))
+        self.targets = targets
+
+    def run_forever(self, stop=None, update_targets=None):
+        """Refresh each target once per interval, in its own slot.
+
+        With ``update_targets``, the targets are replaced by what it returns
+        once per interval: new targets join in their slot, dropped ones are
+        no longer refreshed.
+        """
+        stop = stop or threading.Event()
+        start = time.monotonic()
+        next_update = start + self.interval
+        schedule, scheduled = [], set()
+
+        def plan(now):
+            for name in set(self.targets) - scheduled:
+                # The next time this target's slot comes round.
+                slot = start + slot_offset(name, self.interval)
+                due = slot + max(math.ceil((now - slot) / self.interval), 0) * self.interval
+                heapq.heappush(schedule, (due, name))
+                scheduled.add(name)
+
+        plan(start)
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="prefetch") as executor:
+            while not stop.is_set():
+                now = time.monotonic()
+                if update_targets is not None and now >= next_update:
+                    self._update_targets(update_targets)
+                    plan(now)
+                    next_update += self.interval
+                    continue
+                if not schedule and update_targets is None:
+                    break
+                due, name = schedule[0] if schedule else (next_update, None)
+                if update_targets is not None and next_update < due:
+                    stop.wait(next_update - now)
+                    continue
+                if stop.wait(max(due - now, 0)):
+                    break
+                heapq.heappop(schedule)
+                if name not in self.targets:
+                    scheduled.discard(name)
+                    continue
+                executor.submit(self.refresh, name)
+                heapq.heappush(schedule, (due + self.interval, name))
@@ -0,0 +1,196 @@
+"""Vectorized "best snow this week" scoring of every tracked grid cell.
+
+Scores are computed over the stored hourly series of the latest snapshot
+per grid cell. All cells are scored at once: the series are stacked into
+``(cells, hours)`` matrices and reduced with NumPy, so scoring thousands of
+cells is a handful of array operations.
+
+``ResortSnowScore`` holds the result; it is updated whenever new snapshots
+are stored and read by the rankings API. A cell that is no longer fetched
+keeps its last score, so rankings only include scores of recent model runs.
+"""
+import datetime
+import warnings
+
+import numpy as np
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .forecast import grid_cell
+from .models import ForecastSnapshot, GeocodedLocation, ResortSnowScore
+from .signals import snapshots_stored
+from .spatial import KM_PER_DEGREE_LATITUDE, nearest_resorts
+
+SCORED_FIELDS = ("hourly_snowfall", "hourly_snow_depth", "hourly_temperature_2m", "hourly_cloud_cover")
+
+# Points per cm of new snow, per cm of base, per °C of mean temperature above
+# freezing (a penalty) and per % of clear sky.
+WEIGHTS = {"new_snow": 1.0, "snow_depth": 0.5, "thaw": -2.0, "clear_sky": 0.05}
+
+
+def stack(arrays):
+    """Stack 1-D arrays of different lengths into a NaN-padded float32 matrix."""
+    matrix = np.full((len(arrays), max((len(a) for a in arrays), default=0)), np.nan, np.float32)
+    for row, array in zip(matrix, arrays):
+        row[: len(array)] = array
+    return matrix
+
+
+def score_cells(snowfall, snow_depth, temperature, cloud_cover, start, window):
+    """Score cells from ``(cells, hours)`` matrices of hourly series.
+
+    Only the ``window`` hours beginning at column ``start`` (one start per
+    cell) are scored. Returns a dict of per-cell arrays: ``score`` and the
+    components it was computed from.
+    """
+    hours = np.arange(snowfall.shape[1])
+    in_window = (hours >= start[:, None]) & (hours < (start + window)[:, None])
+
+    def windowed(matrix):
+        return np.where(in_window, matrix, np.nan)
+
+    with warnings.catch_warnings():
+        # Cells without data in the window reduce to NaN; they're zeroed below.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        components = {
+            "new_snow": np.nansum(windowed(snowfall), axis=1),
+            "snow_depth": np.nanmax(windowed(snow_depth), axis=1),
+            "mean_temperature": np.nanmean(windowed(temperature), axis=1),
+            "mean_cloud_cover": np.nanmean(windowed(cloud_cover), axis=1),
+        }
+    components = {name: np.nan_to_num(values) for name, values in components.items()}
+    components["score"] = (
+        WEIGHTS["new_snow"] * components["new_snow"]
+        + WEIGHTS["snow_depth"] * components["snow_depth"] * 100
+        + WEIGHTS["thaw"] * np.clip(components["mean_temperature"], 0, None)
+        + WEIGHTS["clear_sky"] * (100 - components["mean_cloud_cover"])
+    )
+    return components
+
+
+def cell_names(cells):
+    """Map ``cells`` to the name of a place inside them.
+
+    That is the nearest gazetteer resort in the cell or, for cells without
+    one, a place geocoded in it. Cells with neither are left out.
+    """
+    resolution = settings.FORECAST_GRID_RESOLUTION
+    # No point of a cell is further than this from its centre.
+    max_km = resolution * KM_PER_DEGREE_LATITUDE
+    names = {}
+    for cell in cells:
+        for resort, _ in nearest_resorts(*cell, n=5, max_km=max_km):
+            if grid_cell(resort.latitude, resort.longitude) == cell:
+                names[cell] = resort.name
+                break
+
+    unnamed = [cell for cell in cells if cell not in names]
+    if unnamed:
+        lats, lons = [lat for lat, _ in unnamed], [lon for _, lon in unnamed]
+        places = GeocodedLocation.objects.filter(
+            latitude__range=(min(lats) - resolution, max(lats) + resolution),
+            longitude__range=(min(lons) - resolution, max(lons) + resolution),
+        ).values_list("query", "latitude", "longitude")
+        wanted = set(unnamed)
+        for query, lat, lon in places:
+            cell = grid_cell(lat, lon)
+            if cell in wanted:
+                names.setdefault(cell, query)
+    return names
+
+
+def update_scores(snapshots, now=None):
+    """Score ``snapshots`` and store the results, newest snapshot per cell wins.
+
+    Cells whose stored score is already based on a newer model run are left
+    alone, so this can be called with any batch of snapshots.
+    """
+    now = now or timezone.now()
+    latest = {}
+    for snapshot in snapshots:
+        cell = (snapshot.latitude, snapshot.longitude)
+        if cell not in latest or snapshot.model_run > latest[cell].model_run:
+            latest[cell] = snapshot
+    if not latest:
+        return 0
+
+    scored_runs = {
+        (lat, lon): run
+        for lat, lon, run in ResortSnowScore.objects.filter(
+            latitude__in={lat for lat, _ in latest}, longitude__in={lon for _, lon in latest}
+        ).values_list("latitude", "longitude", "model_run")
+    }
+    snapshots = [s for cell, s in latest.items() if cell not in scored_runs or s.model_run >= scored_runs[cell]]
+    if not snapshots:
+        return 0
+
+    series = {field: stack([np.asarray(getattr(s, field), np.float32) for s in snapshots]) for field in SCORED_FIELDS}
+    hourly_start = np.array([s.hourly_start.timestamp() for s in snapshots])
+    start = np.maximum((now.timestamp() - hourly_start) // 3600, 0).astype(int)
+    results = score_cells(
+        series["hourly_snowfall"],
+        series["hourly_snow_depth"],
+        series["hourly_temperature_2m"],
+        series["hourly_cloud_cover"],
+        start,
+        settings.SNOW_SCORE_WINDOW_HOURS,
+    )
+
+    names = cell_names([(s.latitude, s.longitude) for s in snapshots])
+    ResortSnowScore.objects.bulk_create(
+        [
+            ResortSnowScore(
+                latitude=s.latitude,
+                longitude=s.longitude,
+                name=names.get((s.latitude, s.longitude), ""),
+                model_run=s.model_run,
+                score=float(results["score"][i]),
+                new_snow=float(results["new_snow"][i]),
+                snow_depth=float(results["snow_depth"][i]),
+                mean_temperature=float(results["mean_temperature"][i]),
+                mean_cloud_cover=float(results["mean_cloud_cover"][i]),
+            )
+            for i, s in enumerate(snapshots)
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["latitude", "longitude"],
+        update_fields=[
+            "name", "model_run", "score", "new_snow", "snow_depth",
+            "mean_temperature", "mean_cloud_cover", "updated_at",
+        ],
+    )
+    return len(snapshots)
+
+
+def rebuild_scores(chunk_size=1000):
+    """Rescore every cell from its latest stored snapshot."""
+    newest_run = (
+        ForecastSnapshot.objects.filter(latitude=OuterRef("latitude"), longitude=OuterRef("longitude"))
+        .order_by("-model_run")
+        .values("model_run")[:1]
+    )
+    latest = ForecastSnapshot.objects.filter(model_run=Subquery(newest_run)).only(
+        "latitude", "longitude", "model_run", "hourly_start", *SCORED_FIELDS
+    )
+    now = timezone.now()
+    batch, scored = [], 0
+    for snapshot in latest.iterator(chunk_size=chunk_size):
+        batch.append(snapshot)
+        if len(batch) == chunk_size:
+            scored += update_scores(batch, now)
+            batch = []
+    return scored + update_scores(batch, now)
+
+
+def top_resorts(limit=20, now=None):
+    """The best scored cells whose model run is at most ``SNOW_SCORE_MAX_AGE_HOURS`` old."""
+    since = (now or timezone.now()) - datetime.timedelta(hours=settings.SNOW_SCORE_MAX_AGE_HOURS)
+    return ResortSnowScore.objects.filter(model_run__gte=since).order_by("-score")[:limit]
+
+
+@receiver(snapshots_stored)
+def score_new_snapshots(sender, snapshots, **kwargs):
+    update_scores(snapshots)
@@ -0,0 +1,159 @@
+"""A django-redis serializer that stores forecast entries as packed arrays.
+
+Forecast cache entries are mostly long numeric series. Pickled, each value
+is a separate Python float; here every hourly/daily series is written as
+one little-endian float32 (or int16, for non-negative integer series such
+as weather codes) buffer inside a msgpack document. On load the buffers become
+read-only NumPy arrays over the decoded bytes, without converting values
+one by one, so the series of an entry read from Redis are ``ndarray``\\s
+rather than lists. Missing values are NaN in float series and -1 in
+integer series, as in ``PackedArrayField``. A ``time`` series of evenly
+spaced timestamps is stored as its first value, length and step, and
+read back as a tuple.
+
+Every other value is pickled exactly as by django-redis' default
+``PickleSerializer``. Packed entries start with a byte that neither pickle
+nor msgpack output ever starts with, so both kinds can share one cache.
+"""
+import functools
+import pickle
+
+import msgpack
+import numpy as np
+from django_redis.serializers.base import BaseSerializer
+
+# 0xc1 is the one byte msgpack never uses; pickle output starts with 0x80.
+MAGIC = b"\xc1\x01"
+ARRAY_EXT, TIMES_EXT = 1, 2
+# Codes for the dtypes arrays are packed with, kept to 4 bytes so the data after them stays aligned.
+DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<i2"), 2: np.dtype("<f8"), 3: np.dtype("<i4"), 4: np.dtype("<i8")}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+INT16 = np.iinfo(np.int16)
+
+
+def is_forecast_entry(value):
+    return (
+        isinstance(value, dict)
+        and "fetched_at" in value
+        and isinstance(value.get("data"), dict)
+        and "hourly" in value["data"]
+    )
+
+
+def pack_series(values):
+    """A series as an array: int16 when every value is a non-negative integer that fits, float32 otherwise.
+
+    Gaps are -1 in an int16 series, which is only unambiguous while no
+    value is negative: whole-degree temperatures go to float32, with NaN
+    gaps, so a real -1 °C doesn't read back as None.
+
+    Series that aren't numeric are returned unchanged.
+    """
+    if isinstance(values, np.ndarray):
+        return values
+    array = np.asarray(values)
+    if array.dtype == object:
+        present = [v for v in values if v is not None]
+        if present and all(type(v) is int and 0 <= v <= INT16.max for v in present):
+            return np.array([-1 if v is None else v for v in values], np.int16)
+        try:
+            array = np.array(values, np.float64)
+        except (TypeError, ValueError):
+            return values
+    if array.ndim != 1:
+        return values
+    if array.dtype.kind in "iu" and (not len(array) or 0 <= array.min() and array.max() <= INT16.max):
+        return array.astype(np.int16)
+    if array.dtype.kind in "iuf":
+        return array.astype(np.float32)
+    return values
+
+
+def pack_times(times):
+    """A regular series of ISO dates or minutes as ``[first, count, step]``, else None."""
+    if len(times) < 2 or not isinstance(times[0], str) or len(times[0]) not in (10, 16):
+        return None
+    unit = "D" if len(times[0]) == 10 else "m"
+    try:
+        parsed = np.array(times, f"datetime64[{unit}]")
+    except (TypeError, ValueError):
+        return None
+    steps = np.diff(parsed)
+    # Same spacing throughout, and written the way numpy writes them back.
+    if str(parsed[0]) != times[0] or str(parsed[-1]) != times[-1] or not (steps == steps[0]).all():
+        return None
+    return [times[0], len(times), int(steps[0].astype(int))]
+
+
+@functools.lru_cache(maxsize=256)
+def unpack_times(first, count, step):
+    """The timestamps of ``pack_times``, as a tuple.
+
+    Entries fetched in the same hour share their time axis, so the tuple
+    is built once and then shared between them.
+    """
+    unit = "D" if len(first) == 10 else "m"
+    start, step = np.datetime64(first, unit), np.timedelta64(step, unit)
+    return tuple(np.arange(start, start + step * count, step).astype(str).tolist())
+
+
+def _pack_block(block):
+    packed = {}
+    for name, values in block.items():
+        if name == "time":
+            times = pack_times(values)
+            packed[name] = values if times is None else msgpack.ExtType(TIMES_EXT, msgpack.packb(times))
+        else:
+            packed[name] = pack_series(values)
+    return packed
+
+
+def _default(value):
+    if isinstance(value, np.ndarray):
+        dtype = value.dtype.newbyteorder("<") if value.dtype.byteorder == ">" else value.dtype
+        code = DTYPE_CODES.get(dtype)
+        if code is None or value.ndim != 1:
+            raise TypeError(f"can't pack a {value.ndim}-d {value.dtype} array")
+        return msgpack.ExtType(ARRAY_EXT, bytes((code, 0, 0, 0)) + value.astype(dtype, copy=False).tobytes())
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"can't pack {type(value).__name__}")
+
+
+def _ext_hook(code, data):
+    if code == ARRAY_EXT:
+        return np.frombuffer(data, DTYPES[data[0]], offset=4)
+    if code == TIMES_EXT:
+        return unpack_times(*msgpack.unpackb(data))
+    return msgpack.ExtType(code, data)
+
+
+def dumps_entry(entry):
+    """Encode a forecast cache entry with its series packed."""
+    data = dict(entry["data"])
+    for block in ("hourly", "daily"):
+        if isinstance(data.get(block), dict):
+            data[block] = _pack_block(data[block])
+    return MAGIC + msgpack.packb({**entry, "data": data}, default=_default)
+
+
+def loads_entry(value):
+    return msgpack.unpackb(memoryview(value)[len(MAGIC):], ext_hook=_ext_hook, strict_map_key=False)
+
+
+class ForecastSerializer(BaseSerializer):
+    """Packed arrays for forecast entries, pickle for everything else."""
+
+    def __init__(self, options):
+        self._pickle_version = int(options.get("PICKLE_VERSION", pickle.DEFAULT_PROTOCOL))
+        super().__init__(options=options)
+
+    def dumps(self, value):
+        if is_forecast_entry(value):
+            return dumps_entry(value)
+        return pickle.dumps(value, self._pickle_version)
+
+    def loads(self, value):
+        if value[: len(MAGIC)] == MAGIC:
+            return loads_entry(value)
+        return pickle.loads(value)
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by ski_app.snapshots after a batch of ForecastSnapshot rows was written.
+# Receivers get ``snapshots``: the snapshot instances of that batch that weren't
+# stored before. A run another worker stores at the same moment may be included.
+snapshots_stored = Signal()
@@ -0,0 +1,216 @@
+"""Coalescing of concurrent identical upstream lookups ("single flight").
+
+Within a process, the first caller for a key runs the fetch and every other
+thread asking for the same key waits for its result. Across gunicorn
+workers, the fetching thread additionally holds a Redis lock; a worker that
+finds the lock taken waits for it and then reads the result the holder
+wrote to the shared cache instead of calling the upstream itself.
+
+Async views use ``ado``, which shares calls with the threads using ``do``.
+"""
+import asyncio
+import logging
+import threading
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import SINGLEFLIGHT_CALLS
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY_PREFIX = "singleflight:"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        # (event loop, future) of the async callers waiting for the result
+        self.waiters = []
+
+    def finish(self):
+        self.done.set()
+        for loop, future in self.waiters:
+            try:
+                loop.call_soon_threadsafe(self._resolve, future)
+            except RuntimeError:
+                # The waiter's event loop has shut down.
+                pass
+
+    def _resolve(self, future):
+        # A waiter that timed out has cancelled its future.
+        if future.done():
+            return
+        if self.error is not None:
+            future.set_exception(self.error)
+        else:
+            future.set_result(self.value)
+
+
+class SingleFlight:
+    """Runs at most one fetch per key at a time and shares its result."""
+
+    def __init__(self, name, timeout=None, lock_ttl=None):
+        self.name = name
+        self.timeout = timeout or settings.SINGLEFLIGHT_TIMEOUT
+        self.lock_ttl = lock_ttl or settings.SINGLEFLIGHT_LOCK_TTL
+        self.counters = Counter()
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+        SINGLEFLIGHT_CALLS.labels(self.name, name).inc()
+
+    def do(self, key, fetch, lookup=None):
+        """Return ``fetch()``, sharing one call among concurrent callers of ``key``.
+
+        ``lookup`` reads the result a fetch in another worker stored in the
+        shared cache (returning None if there is none); without it only
+        callers in this process are coalesced.
+
+        Waiters give up after ``timeout`` seconds: in-process waiters raise
+        ``TimeoutError``, a worker waiting on another worker's lock fetches
+        the value itself.
+        """
+        call, leader, _ = self._join(key)
+        if not leader:
+            if not call.done.wait(self.timeout):
+                self._count("timeouts")
+                raise TimeoutError(f"Timed out waiting for in-flight {self.name} lookup of {key!r}")
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._run_exclusive(key, fetch, lookup)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self._leave(key, call)
+
+    async def ado(self, key, fetch, lookup=None):
+        """Async version of ``do``; ``fetch`` is a coroutine function.
+
+        The fetch runs on the event loop; ``lookup`` and waiting for another
+        worker's lock run in a thread.
+        """
+        call, leader, future = self._join(key, asyncio.get_running_loop())
+        if not leader:
+            try:
+                return await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                self._count("timeouts")
+                raise TimeoutError(f"Timed out waiting for in-flight {self.name} lookup of {key!r}") from None
+
+        try:
+            call.value = await self._arun_exclusive(key, fetch, lookup)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        except asyncio.CancelledError:
+            # The request went away; its waiters get an error rather than None.
+            call.error = RuntimeError(f"In-flight {self.name} lookup of {key!r} was cancelled")
+            raise
+        finally:
+            self._leave(key, call)
+
+    def _join(self, key, loop=None):
+        """Return ``(call, leader, future)`` for ``key``; ``future`` gets the result for a waiter on ``loop``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            future = None
+            if leader:
+                call = self._calls[key] = _Call()
+            elif loop is not None:
+                future = loop.create_future()
+                call.waiters.append((loop, future))
+        if not leader:
+            self._count("coalesced")
+        return call, leader, future
+
+    def _leave(self, key, call):
+        with self._lock:
+            del self._calls[key]
+        call.finish()
+
+    def _shared_lock(self, key):
+        # Only django-redis provides locks; other cache backends coalesce per process.
+        if not hasattr(cache, "lock"):
+            return None
+        return cache.lock(
+            f"{LOCK_KEY_PREFIX}{self.name}:{key}",
+            timeout=self.lock_ttl,
+            sleep=0.05,
+            blocking_timeout=self.timeout,
+            # ado acquires and releases the lock in different threads.
+            thread_local=False,
+        )
+
+    def _run_exclusive(self, key, fetch, lookup):
+        lock = self._shared_lock(key) if lookup is not None else None
+        if lock is None:
+            self._count("fetches")
+            return fetch()
+
+        acquired = lock.acquire(blocking=False)
+        if not acquired:
+            acquired = lock.acquire()
+            value = lookup()
+            if value is not None:
+                self._count("coalesced_remote")
+                self._release(lock, acquired)
+                return value
+            if not acquired:
+                self._count("timeouts")
+        try:
+            self._count("fetches")
+            return fetch()
+        finally:
+            self._release(lock, acquired)
+
+    async def _arun_exclusive(self, key, fetch, lookup):
+        lock = self._shared_lock(key) if lookup is not None else None
+        if lock is None:
+            self._count("fetches")
+            return await fetch()
+
+        in_thread = sync_to_async(thread_sensitive=False)
+        acquired = await in_thread(lock.acquire)(blocking=False)
+        if not acquired:
+            acquired = await in_thread(lock.acquire)()
+            value = await in_thread(lookup)()
+            if value is not None:
+                self._count("coalesced_remote")
+                await in_thread(self._release)(lock, acquired)
+                return value
+            if not acquired:
+                self._count("timeouts")
+        try:
+            self._count("fetches")
+            return await fetch()
+        finally:
+            await in_thread(self._release)(lock, acquired)
+
+    @staticmethod
+    def _release(lock, acquired):
+        if not acquired:
+            return
+        try:
+            lock.release()
+        except Exception:
+            # The lock expired while we were fetching; nothing to release.
+            logger.warning("Single-flight lock expired before release", exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
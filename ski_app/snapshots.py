@@ -0,0 +1,216 @@
+"""Persisting fetched forecasts as ``ForecastSnapshot`` rows.
+
+Fetches are buffered in memory and written with one ``bulk_create`` per
+batch from a background thread, so the request that fetched a forecast
+never waits on the database. A timer thread writes what is pending every
+``SNAPSHOT_FLUSH_INTERVAL`` seconds even when no more forecasts come in,
+and gunicorn's ``worker_exit`` hook writes the rest when a worker stops.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+import zoneinfo
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import ForecastSnapshot
+from .partitioning import ensure_month_partitions
+from .signals import snapshots_stored
+
+logger = logging.getLogger(__name__)
+
+
+def model_run_for(fetched_at):
+    """Return the model run a forecast fetched at ``fetched_at`` belongs to.
+
+    Open-Meteo doesn't report model run times, so a run is approximated by
+    the fetch time floored to the model update cadence.
+    """
+    cadence = settings.FORECAST_CACHE_TTL
+    return datetime.datetime.fromtimestamp(fetched_at // cadence * cadence, tz=datetime.timezone.utc)
+
+
+def series_start(series, utc_offset):
+    """The UTC start time of an Open-Meteo series given in local time."""
+    local = datetime.datetime.fromisoformat(series["time"][0])
+    return local.replace(tzinfo=datetime.timezone.utc) - datetime.timedelta(seconds=utc_offset)
+
+
+def snapshot_from_forecast(cell, entry):
+    """Build an unsaved ``ForecastSnapshot`` from a forecast cache entry."""
+    data = entry["data"]
+    hourly, daily = data["hourly"], data["daily"]
+    snapshot = ForecastSnapshot(
+        latitude=cell[0],
+        longitude=cell[1],
+        model_run=model_run_for(entry["fetched_at"]),
+        fetched_at=datetime.datetime.fromtimestamp(entry["fetched_at"], tz=datetime.timezone.utc),
+        timezone=data.get("timezone", ""),
+        current=data.get("current", {}),
+        hourly_start=series_start(hourly, data.get("utc_offset_seconds", 0)),
+        daily_start=datetime.date.fromisoformat(daily["time"][0]),
+    )
+    for variable, field in ForecastSnapshot.HOURLY_FIELDS.items():
+        setattr(snapshot, field, hourly[variable])
+    for variable, field in ForecastSnapshot.DAILY_FIELDS.items():
+        setattr(snapshot, field, daily[variable])
+    return snapshot
+
+
+def series_values(values):
+    """A packed series as a list, with None for missing values."""
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        # float32 -> float64 and rounding turns 0.1000000015 back into 0.1
+        return [None if np.isnan(v) else v for v in values.astype(np.float64).round(3).tolist()]
+    return [None if v == -1 else v for v in values.tolist()]
+
+
+def entry_from_snapshot(snapshot):
+    """Rebuild a forecast cache entry from a stored snapshot.
+
+    The entry is flagged ``stale``: it is only used when the upstream can't
+    be reached.
+    """
+    try:
+        tz = zoneinfo.ZoneInfo(snapshot.timezone or "UTC")
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        tz = datetime.timezone.utc
+    hourly_start = snapshot.hourly_start.astimezone(tz)
+    hourly = {field: series_values(getattr(snapshot, field)) for field in ForecastSnapshot.HOURLY_FIELDS.values()}
+    daily = {field: series_values(getattr(snapshot, field)) for field in ForecastSnapshot.DAILY_FIELDS.values()}
+    hours = max(map(len, hourly.values()), default=0)
+    days = max(map(len, daily.values()), default=0)
+    data = {
+        "latitude": snapshot.latitude,
+        "longitude": snapshot.longitude,
+        "timezone": snapshot.timezone,
+        "utc_offset_seconds": int(hourly_start.utcoffset().total_seconds()),
+        "current": snapshot.current,
+        "hourly": {
+            "time": [
+                (snapshot.hourly_start + datetime.timedelta(hours=i)).astimezone(tz).strftime("%Y-%m-%dT%H:%M")
+                for i in range(hours)
+            ],
+            **{variable: hourly[field] for variable, field in ForecastSnapshot.HOURLY_FIELDS.items()},
+        },
+        "daily": {
+            "time": [(snapshot.daily_start + datetime.timedelta(days=i)).isoformat() for i in range(days)],
+            **{variable: daily[field] for variable, field in ForecastSnapshot.DAILY_FIELDS.items()},
+        },
+    }
+    return {"data": data, "fetched_at": snapshot.fetched_at.timestamp(), "stale": True}
+
+
+def last_known_entry(cell):
+    """The forecast entry of the newest stored snapshot for ``cell``, or None."""
+    snapshot = (
+        ForecastSnapshot.objects.filter(latitude=cell[0], longitude=cell[1])
+        .order_by("-model_run")
+        .first()
+    )
+    return None if snapshot is None else entry_from_snapshot(snapshot)
+
+
+def ingest_snapshots(snapshots):
+    """Insert ``snapshots`` in bulk, skipping runs that are already stored.
+
+    Sends ``snapshots_stored`` with the new snapshots once the batch is
+    written, and returns them.
+    """
+    if not snapshots:
+        return []
+    runs = {s.model_run for s in snapshots}
+    ensure_month_partitions(ForecastSnapshot, runs)
+    stored = set(
+        ForecastSnapshot.objects.filter(
+            model_run__in=runs,
+            latitude__in={s.latitude for s in snapshots},
+            longitude__in={s.longitude for s in snapshots},
+        ).values_list("latitude", "longitude", "model_run")
+    )
+    new = [s for s in snapshots if (s.latitude, s.longitude, s.model_run) not in stored]
+    if not new:
+        return []
+    # Another worker may store the same run in the meantime; that one is skipped here.
+    ForecastSnapshot.objects.bulk_create(new, batch_size=settings.SNAPSHOT_BATCH_SIZE, ignore_conflicts=True)
+    snapshots_stored.send(sender=ForecastSnapshot, snapshots=new)
+    return new
+
+
+class SnapshotBuffer:
+    """Collects fetched forecasts and writes them to the database in batches.
+
+    A batch is written once ``batch_size`` forecasts are waiting or
+    ``interval`` seconds have passed since the last write; the timer thread
+    checks for the latter, started by the first ``add`` in each process.
+    """
+
+    def __init__(self, batch_size=None, interval=None):
+        self.batch_size = batch_size or settings.SNAPSHOT_BATCH_SIZE
+        self.interval = interval or settings.SNAPSHOT_FLUSH_INTERVAL
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-flush")
+        self._timer_pid = None
+
+    def add(self, cell, entry):
+        with self._lock:
+            # Repeat fetches of the same cell within one model run collapse to one row.
+            self._pending[(cell, model_run_for(entry["fetched_at"]))] = (cell, entry)
+            due = (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.interval
+            )
+        if due:
+            self._executor.submit(self._flush_in_background)
+        self._start_timer()
+
+    def _start_timer(self):
+        # Threads don't survive a fork, so each (preloaded gunicorn) worker starts its own.
+        pid = os.getpid()
+        with self._lock:
+            if self._timer_pid == pid:
+                return
+            self._timer_pid = pid
+        threading.Thread(target=self._flush_periodically, name="snapshot-timer", daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            with self._lock:
+                wait = self._last_flush + self.interval - time.monotonic()
+                due = wait <= 0 and bool(self._pending)
+            if due:
+                self._flush_in_background()
+            else:
+                time.sleep(wait if wait > 0 else self.interval)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Writing forecast snapshots failed")
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        """Write all pending forecasts now and return the number written."""
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+            self._last_flush = time.monotonic()
+        snapshots = []
+        for cell, entry in pending:
+            try:
+                snapshots.append(snapshot_from_forecast(cell, entry))
+            except (KeyError, IndexError, ValueError):
+                logger.warning("Skipping malformed forecast for %s", cell, exc_info=True)
+        return len(ingest_snapshots(snapshots))
+
+
+snapshot_buffer = SnapshotBuffer()
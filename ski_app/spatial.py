@@ -0,0 +1,114 @@
+"""Nearest-resort lookups over the gazetteer's coordinates.
+
+``ResortIndex`` keeps the resorts sorted by latitude in NumPy arrays. A
+query takes the latitude band around the point with ``searchsorted`` and
+computes haversine distances for that band only: no point outside a band
+of half-width ``r`` can be closer than ``r``, so once the band holds
+enough resorts within ``r`` the answer is exact. The band is widened until
+that holds.
+
+An index is never modified after it is built, so threads share it without
+locking. Adding resorts builds a new index by merging into the sorted
+arrays and swaps it in.
+"""
+import threading
+
+import numpy as np
+
+from .gazetteer import get_gazetteer
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LATITUDE = np.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from one point to arrays of points."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class ResortIndex:
+    """Immutable latitude-sorted index of ``gazetteer.Resort`` records."""
+
+    def __init__(self, resorts):
+        resorts = list(resorts)
+        lats = np.array([r.latitude for r in resorts], np.float64)
+        order = np.argsort(lats, kind="stable")
+        self.resorts = [resorts[i] for i in order]
+        self._lats = lats[order]
+        self._lons = np.array([r.longitude for r in self.resorts], np.float64)
+
+    def __len__(self):
+        return len(self.resorts)
+
+    def with_resorts(self, resorts):
+        """A new index holding these resorts as well; this one is unchanged."""
+        resorts = sorted(resorts, key=lambda r: r.latitude)
+        if not resorts:
+            return self
+        lats = np.array([r.latitude for r in resorts], np.float64)
+        positions = np.searchsorted(self._lats, lats, side="right")
+        index = object.__new__(ResortIndex)
+        index._lats = np.insert(self._lats, positions, lats)
+        index._lons = np.insert(self._lons, positions, [r.longitude for r in resorts])
+        merged = []
+        start = 0
+        for position, resort in zip(positions, resorts):
+            merged.extend(self.resorts[start:position])
+            merged.append(resort)
+            start = position
+        merged.extend(self.resorts[start:])
+        index.resorts = merged
+        return index
+
+    def nearest(self, lat, lon, n=5, max_km=None, radius_km=50.0):
+        """The ``n`` resorts closest to a point as ``(resort, km)`` pairs, nearest first.
+
+        ``radius_km`` is the initial search radius; resorts further than
+        ``max_km`` are left out.
+        """
+        if not len(self) or n <= 0:
+            return []
+        while True:
+            if max_km is not None:
+                radius_km = min(radius_km, max_km)
+            band = radius_km / KM_PER_DEGREE_LATITUDE
+            lo = np.searchsorted(self._lats, lat - band, side="left")
+            hi = np.searchsorted(self._lats, lat + band, side="right")
+            distances = haversine_km(lat, lon, self._lats[lo:hi], self._lons[lo:hi])
+            covered = (lo == 0 and hi == len(self)) or radius_km == max_km
+            if covered or np.count_nonzero(distances <= radius_km) >= n:
+                break
+            radius_km *= 4
+        within = np.flatnonzero(distances <= max_km) if max_km is not None else np.arange(len(distances))
+        nearest = within[np.argsort(distances[within], kind="stable")[:n]]
+        return [(self.resorts[lo + i], float(distances[i])) for i in nearest]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_resort_index():
+    """The process-wide index over the gazetteer's resorts, built on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ResortIndex(get_gazetteer().resorts)
+    return _index
+
+
+def add_resorts(resorts):
+    """Make ``resorts`` findable by ``nearest_resorts`` from now on."""
+    global _index
+    index = get_resort_index()
+    with _index_lock:
+        _index = (_index or index).with_resorts(resorts)
+    return _index
+
+
+def nearest_resorts(lat, lon, n=5, max_km=None):
+    return get_resort_index().nearest(lat, lon, n=n, max_km=max_km)
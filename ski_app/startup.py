@@ -0,0 +1,91 @@
+"""Process start-up work for the web container.
+
+With ``FAST_START=1`` gunicorn loads the application once in its master
+process (``gunicorn.conf.py``) and calls ``prepare_master`` before forking
+the workers:
+
+* migrations are applied only when some are pending, instead of running
+  ``manage.py migrate`` (a second Django start) on every boot;
+* everything workers would otherwise build on their first requests (the
+  resort indexes, compiled templates, the async HTTP client's modules) is
+  built once and shared copy-on-write;
+* with ``STARTUP_WARMUP=1`` the shared cache is warmed as well.
+
+Database connections are closed before the fork, so no worker inherits one.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES = ("search_results.html", "search_page_start.html", "search_results_body.html", "search_page_end.html")
+WARMUP_LOCK_KEY = "startup:warmup"
+
+
+def pending_migrations(using="default"):
+    """Migrations not yet applied to the ``using`` database."""
+    executor = MigrationExecutor(connections[using])
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def migrate_if_needed():
+    """Run ``migrate`` if any migration is pending; returns whether it ran."""
+    plan = pending_migrations()
+    if not plan:
+        return False
+    logger.info("Applying %d pending migrations", len(plan))
+    call_command("migrate", interactive=False, skip_checks=True)
+    return True
+
+
+def load_in_memory_state():
+    """Build what every worker needs on its first requests."""
+    from .gazetteer import get_gazetteer
+    from .spatial import get_resort_index
+
+    get_gazetteer()
+    get_resort_index()
+    for name in TEMPLATES:
+        get_template(name)
+    if settings.ASYNC_VIEWS:
+        import httpx  # noqa: F401
+
+
+def warm_shared_cache():
+    """Load stored geocodes and the trending resorts into the shared cache.
+
+    Only the first instance to start within ``GEOCODE_CACHE_TIMEOUT`` does
+    this; a scale-out event doesn't reload the cache once per instance.
+    """
+    from .analytics import cached_trending_resorts
+    from .geocoding import geocode_cache
+    from .models import GeocodedLocation
+
+    if not cache.add(WARMUP_LOCK_KEY, True, settings.GEOCODE_CACHE_TIMEOUT):
+        return 0
+    warmed = 0
+    for row in GeocodedLocation.objects.iterator():
+        geocode_cache.set(row.query, row.as_location(), persist=False)
+        warmed += 1
+    cached_trending_resorts()
+    return warmed
+
+
+def prepare_master():
+    """Start-up work for the gunicorn master under ``FAST_START``; returns a summary line."""
+    started = time.perf_counter()
+    migrated = migrate_if_needed()
+    load_in_memory_state()
+    warmed = warm_shared_cache() if settings.STARTUP_WARMUP else 0
+    connections.close_all()
+    return (
+        f"Start-up work done in {time.perf_counter() - started:.2f}s "
+        f"(migrations {'applied' if migrated else 'up to date'}, {warmed} geocodes warmed)"
+    )
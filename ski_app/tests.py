@@ -1,3 +1,917 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import io
+import json
+import threading
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import requests
+from asgiref.sync import sync_to_async
+from benchmarks.stubs import start_stubs
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from .analytics import LocalSearchCounter, cached_trending_resorts, flush_search_stats, trending_resorts
+from .assets import build_site_css, purge_css
+from .climatology import weekly_statistics
+from .circuitbreaker import CircuitBreaker, CircuitOpenError
+from .conditions import derive_conditions
+from .api import normalized_forecast
+from .forecast import (
+    _forecast_from_entry, fetch_forecast, forecast_cache_key, get_forecast, get_forecasts, grid_cell, new_entry,
+    snap_to_cached_cell,
+)
+from .gazetteer import Resort, get_gazetteer
+from .geocoding import GeocodeCache, fetch_location, geocode, geocode_cache, normalize_city
+from .http import NOMINATIM, OPEN_METEO, breakers
+from .live import event_stream, hub, publish_new_runs
+from .models import ClimateHistory, ForecastSnapshot, GeocodedLocation, ResortSearchStats, ResortSnowScore
+from .prefetch import Prefetcher, prefetch_targets, slot_offset
+from .ranking import score_cells, top_resorts
+from .serializers import ForecastSerializer
+from .singleflight import SingleFlight
+from .snapshots import SnapshotBuffer, series_values
+from .spatial import ResortIndex, haversine_km
+from .startup import migrate_if_needed, warm_shared_cache
+from .views import forecast_rows, live_url, search_weather_async
+
+INNSBRUCK = {"lat": 47.26, "lon": 11.39, "display_name": "Innsbruck, Tirol, Österreich"}
+INNSBRUCK_POINT = (INNSBRUCK["lat"], INNSBRUCK["lon"])
+
+
+def fake_response(payload):
+    response = mock.Mock()
+    response.json.return_value = payload
+    response.raise_for_status.return_value = None
+    response.status_code = 200
+    return response
+
+
+def fake_upstream(url, *args, params=None, **kwargs):
+    """Stand-in for ``requests.Session.get`` that answers for both upstream APIs."""
+    if "nominatim" in url:
+        return fake_response(NOMINATIM_PAYLOAD)
+    latitudes = str((params or {}).get("latitude", "")).split(",")
+    if len(latitudes) > 1:
+        return fake_response([FORECAST_PAYLOAD] * len(latitudes))
+    return fake_response(FORECAST_PAYLOAD)
+
+
+NOMINATIM_PAYLOAD = [{"lat": "47.26", "lon": "11.39", "display_name": INNSBRUCK["display_name"]}]
+FORECAST_PAYLOAD = {
+    "timezone": "Europe/Berlin",
+    "utc_offset_seconds": 3600,
+    "current": {"temperature_2m": -3.0, "snow_depth": 0.5, "snowfall": 0.2, "weather_code": 71},
+    "hourly": {
+        "time": ["2024-01-01T00:00", "2024-01-01T01:00"],
+        "temperature_2m": [-3.0, -4.0],
+        "snowfall": [0.2, 0.4],
+        "snow_depth": [0.5, 0.52],
+        "weather_code": [71, 73],
+        "cloud_cover": [90, 100],
+    },
+    "daily": {
+        "time": ["2024-01-01"],
+        "temperature_2m_max": [-1.0],
+        "temperature_2m_min": [-6.0],
+        "sunshine_duration": [3600.0],
+    },
+}
+
+
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.lru.clear()
+
+    def test_normalize_city(self):
+        self.assertEqual(normalize_city("  Val   d'ISÈRE "), "val d'isère")
+
+    def test_promotes_database_hits(self):
+        GeocodedLocation.objects.create(query="innsbruck", latitude=47.26, longitude=11.39)
+        geocodes = GeocodeCache(maxsize=8)
+
+        self.assertEqual(geocodes.get("Innsbruck")["lat"], 47.26)
+        self.assertEqual(geocodes.get("INNSBRUCK")["lon"], 11.39)
+        self.assertEqual(geocodes.counters["db_hits"], 1)
+        self.assertEqual(geocodes.counters["lru_hits"], 1)
+        self.assertIsNotNone(cache.get("geocode:innsbruck"))
+
+    def test_lru_evicts_least_recently_used(self):
+        geocodes = GeocodeCache(maxsize=2)
+        for city in ("a", "b", "c"):
+            geocodes.set(city, INNSBRUCK, persist=False)
+        self.assertIsNone(geocodes.lru.get("a"))
+        self.assertIsNotNone(geocodes.lru.get("c"))
+
+
+class GazetteerTests(TestCase):
+    def test_prefix_search_folds_accents_and_indexes_words(self):
+        gazetteer = get_gazetteer()
+        self.assertEqual(gazetteer.complete("sold")[0].name, "Sölden")
+        self.assertEqual(gazetteer.complete("ANTON")[0].name, "St. Anton am Arlberg")
+        self.assertEqual([r.name for r in gazetteer.complete("val d'is")], ["Val d'Isère"])
+        self.assertEqual(gazetteer.complete("zzz"), [])
+        self.assertGreater(gazetteer.stats()["memory_bytes"], 0)
+
+    def test_autocomplete_api(self):
+        response = self.client.get(reverse("autocomplete_api"), {"q": "zer"})
+        self.assertEqual(response.json()["resorts"][0]["name"], "Zermatt")
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_known_resorts_are_geocoded_offline(self, upstream_get):
+        location = geocode("soelden")
+        self.assertEqual(location["display_name"], "Sölden, AT")
+        upstream_get.assert_not_called()
+
+
+class SpatialIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_nearest_matches_brute_force(self):
+        index = ResortIndex(get_gazetteer().resorts)
+        for lat, lon in [(47.26, 11.39), (46.5, 7.9), (60.0, 10.0), (-33.0, 151.0)]:
+            distances = haversine_km(lat, lon, [r.latitude for r in index.resorts], [r.longitude for r in index.resorts])
+            expected = [index.resorts[i].name for i in np.argsort(distances, kind="stable")[:5]]
+            self.assertEqual([r.name for r, _ in index.nearest(lat, lon, n=5)], expected)
+        self.assertEqual(index.nearest(-33.0, 151.0, max_km=100), [])
+
+    def test_added_resorts_are_found_without_changing_the_old_index(self):
+        index = ResortIndex(get_gazetteer().resorts)
+        patscherkofel = Resort("Patscherkofel", "AT", 47.2090, 11.4610)
+        bigger = index.with_resorts([patscherkofel])
+        self.assertEqual(bigger.nearest(47.26, 11.39, n=1)[0][0], patscherkofel)
+        self.assertNotEqual(index.nearest(47.26, 11.39, n=1)[0][0], patscherkofel)
+        self.assertEqual(len(bigger), len(index) + 1)
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_uncached_point_snaps_to_adjacent_cached_cell(self, upstream_get):
+        get_forecast(47.3, 11.4)
+        with override_settings(FORECAST_SNAP_KM=5):
+            self.assertEqual(snap_to_cached_cell(47.3, 11.46), (47.3, 11.4))
+            self.assertEqual(snap_to_cached_cell(47.3, 11.52), (47.3, 11.5))
+            get_forecast(47.3, 11.46)
+        self.assertEqual(upstream_get.call_count, 1)
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_nearby_api(self, upstream_get):
+        response = self.client.get(reverse("nearby_api"), {"lat": 46.03, "lon": 7.75, "n": 2})
+        resorts = response.json()["resorts"]
+        self.assertEqual([r["city"] for r in resorts], ["Zermatt", "Cervinia"])
+        self.assertLess(resorts[0]["distance_km"], 2)
+
+
+class ForecastCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_nearby_points_share_a_grid_cell(self):
+        self.assertEqual(grid_cell(47.262, 11.394), grid_cell(47.281, 11.362))
+        self.assertNotEqual(grid_cell(47.26, 11.39), grid_cell(47.46, 11.39))
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_fresh_entry_is_served_from_cache(self, upstream_get):
+        get_forecast(47.262, 11.394)
+        get_forecast(47.281, 11.362)
+        self.assertEqual(upstream_get.call_count, 1)
+
+    @mock.patch("ski_app.forecast.refresh_executor")
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_stale_entry_is_served_and_refreshed_in_background(self, upstream_get, executor):
+        key = forecast_cache_key(grid_cell(47.26, 11.39))
+        cache.set(key, {"data": {"timezone": "stale"}, "fetched_at": time.time() - 7200})
+
+        self.assertEqual(get_forecast(47.26, 11.39)["timezone"], "stale")
+        self.assertEqual(get_forecast(47.26, 11.39)["timezone"], "stale")
+        self.assertEqual(upstream_get.call_count, 0)
+        # Only one refresh is scheduled however many stale reads there are
+        self.assertEqual(executor.submit.call_count, 1)
+
+        refresh, *args = executor.submit.call_args.args
+        refresh(*args)
+        self.assertEqual(get_forecast(47.26, 11.39)["timezone"], "Europe/Berlin")
+
+
+class PrefetchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.lru.clear()
+
+    @override_settings(PREFETCH_RESORTS=["Innsbruck", "innsbruck", "Ischgl"])
+    def test_targets_start_with_configured_resorts(self):
+        today = timezone.now().date()
+        ResortSearchStats.objects.create(day=today, query="ischgl", searches=9)
+        ResortSearchStats.objects.create(day=today, query="zermatt", searches=5)
+        ResortSearchStats.objects.create(day=today, query="laax", searches=1)
+        self.assertEqual(prefetch_targets(top=1), ["innsbruck", "ischgl", "zermatt"])
+
+    def test_slots_are_spread_over_the_interval(self):
+        offsets = {slot_offset(name, 600) for name in ("innsbruck", "ischgl", "zermatt")}
+        self.assertEqual(len(offsets), 3)
+        self.assertTrue(all(0 <= offset < 600 for offset in offsets))
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_prefetched_forecasts_are_cache_hits(self, upstream_get):
+        geocode_cache.set("innsbruck", INNSBRUCK, persist=False)
+        prefetcher = Prefetcher(["innsbruck"], concurrency=2, rate=100)
+        self.assertEqual(prefetcher.run_once(), 1)
+        # Still fresh, so a second pass doesn't go upstream again
+        self.assertEqual(prefetcher.run_once(), 0)
+
+        self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+        self.assertEqual(upstream_get.call_count, 1)
+
+    def test_looping_prefetcher_follows_the_targets(self):
+        prefetcher = Prefetcher(["innsbruck", "laax"], concurrency=1, interval=0.2)
+        targets = iter([["innsbruck", "zermatt"]])
+        stop = threading.Event()
+        refreshed = []
+
+        def refresh(name):
+            refreshed.append((time.monotonic(), name))
+
+        with mock.patch.object(prefetcher, "refresh", side_effect=refresh):
+            runner = threading.Thread(
+                target=prefetcher.run_forever, args=(stop, lambda: next(targets, ["innsbruck", "zermatt"]))
+            )
+            started = time.monotonic()
+            runner.start()
+            time.sleep(0.9)
+            stop.set()
+            runner.join()
+
+        names = [name for _, name in refreshed]
+        self.assertIn("zermatt", names)
+        # Laax is dropped at the first update, after one interval.
+        self.assertTrue(all(at - started < 0.25 for at, name in refreshed if name == "laax"))
+        self.assertGreaterEqual(names.count("innsbruck"), 4)
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_gazetteer_resorts_skip_the_geocode_limiter(self, upstream_get):
+        prefetcher = Prefetcher(["zermatt", "ischgl"], concurrency=2, rate=100)
+        with mock.patch.object(prefetcher.geocode_limiter, "acquire") as acquire:
+            self.assertEqual(prefetcher.run_once(), 2)
+        acquire.assert_not_called()
+        self.assertFalse([c for c in upstream_get.call_args_list if "nominatim" in c.args[0]])
+
+
+@mock.patch("ski_app.analytics._counter", new_callable=LocalSearchCounter)
+class SearchAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_searches_are_flushed_to_trending(self, counter, upstream_get):
+        url = reverse("search_weather")
+        self.client.get(url, {"city": "Innsbruck"}, REMOTE_ADDR="10.0.0.1")
+        self.client.get(url, {"city": "innsbruck"}, REMOTE_ADDR="10.0.0.2")
+        self.client.get(url, {"city": "Innsbruck"}, REMOTE_ADDR="10.0.0.2")
+        # Nothing reaches the database before a flush
+        self.assertFalse(ResortSearchStats.objects.exists())
+
+        self.assertEqual(flush_search_stats(), 1)
+        # Flushing again writes the same totals instead of adding them up
+        flush_search_stats()
+        self.assertEqual(trending_resorts(), [("innsbruck", 3, 2)])
+
+    def test_cached_trending_is_cached_per_limit(self, counter):
+        day = timezone.now().date()
+        for query, searches in (("innsbruck", 3), ("ischgl", 2)):
+            ResortSearchStats.objects.create(day=day, query=query, searches=searches, unique_visitors=1)
+        self.assertEqual(len(cached_trending_resorts()), 2)
+        self.assertEqual(cached_trending_resorts(limit=1), [("innsbruck", 3, 1)])
+
+
+class ForecastSnapshotTests(TestCase):
+    def test_idle_buffer_is_written_by_its_timer(self):
+        buffer = SnapshotBuffer(batch_size=10, interval=0.2)
+        written = threading.Event()
+        with mock.patch("ski_app.snapshots.ingest_snapshots", side_effect=lambda snapshots: written.set()):
+            buffer.add((47.3, 11.4), {"data": FORECAST_PAYLOAD, "fetched_at": time.time()})
+            # Nothing else is added, yet the batch is written.
+            self.assertTrue(written.wait(2))
+
+    def test_buffered_forecasts_are_stored_as_packed_arrays(self):
+        buffer = SnapshotBuffer(batch_size=10, interval=3600)
+        fetched_at = time.time()
+        buffer.add((47.3, 11.4), {"data": FORECAST_PAYLOAD, "fetched_at": fetched_at})
+        # A refetch within the same model run is the same snapshot
+        buffer.add((47.3, 11.4), {"data": FORECAST_PAYLOAD, "fetched_at": fetched_at})
+        self.assertEqual(buffer.flush(), 1)
+
+        snowfall, codes = ForecastSnapshot.objects.values_list(
+            "hourly_snowfall", "hourly_weather_code"
+        ).get()
+        self.assertEqual(snowfall.dtype.str, "<f4")
+        self.assertEqual(snowfall.tolist(), [np.float32(0.2), np.float32(0.4)])
+        self.assertEqual(codes.tolist(), [71, 73])
+
+        # Stored runs are neither written nor announced again.
+        with mock.patch("ski_app.snapshots.snapshots_stored.send") as send:
+            buffer.add((47.3, 11.4), {"data": FORECAST_PAYLOAD, "fetched_at": fetched_at})
+            self.assertEqual(buffer.flush(), 0)
+        send.assert_not_called()
+
+
+def unreachable_upstream(url, *args, **kwargs):
+    raise requests.ConnectTimeout(url)
+
+
+class UpstreamFailureTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.lru.clear()
+        self.addCleanup(lambda: [breaker.reset() for breaker in breakers.values()])
+
+    @override_settings(CIRCUIT_FAILURE_THRESHOLD=2, CIRCUIT_RESET_TIMEOUT=30)
+    def test_circuit_opens_after_repeated_failures(self):
+        breaker = CircuitBreaker("Open-Meteo")
+        with mock.patch.dict(breakers, {OPEN_METEO: breaker}), mock.patch(
+            "requests.Session.get", side_effect=unreachable_upstream
+        ) as upstream_get:
+            for _ in range(2):
+                with self.assertRaises(requests.ConnectTimeout):
+                    fetch_forecast(*INNSBRUCK_POINT)
+            with self.assertRaises(CircuitOpenError):
+                fetch_forecast(*INNSBRUCK_POINT)
+        self.assertEqual(upstream_get.call_count, 2)
+        self.assertEqual(upstream_get.call_args.kwargs["timeout"], (3.05, 10))
+
+        # After the reset timeout one trial call goes through and closes the circuit
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 31), mock.patch.dict(
+            breakers, {OPEN_METEO: breaker}
+        ), mock.patch("requests.Session.get", side_effect=fake_upstream):
+            fetch_forecast(*INNSBRUCK_POINT)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_client_errors_keep_the_circuit_closed(self):
+        breaker = CircuitBreaker("Nominatim", failure_threshold=1)
+        response = fake_response([])
+        response.status_code = 404
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+        with mock.patch.dict(breakers, {NOMINATIM: breaker}), mock.patch(
+            "requests.Session.get", return_value=response
+        ):
+            with self.assertRaises(requests.HTTPError):
+                fetch_location("Nowhere")
+        self.assertEqual(breaker.state, "closed")
+
+    def test_page_falls_back_to_the_last_stored_forecast(self):
+        geocode_cache.set("Innsbruck", INNSBRUCK, persist=False)
+        buffer = SnapshotBuffer(batch_size=10, interval=3600)
+        buffer.add(grid_cell(*INNSBRUCK_POINT), {"data": FORECAST_PAYLOAD, "fetched_at": time.time() - 7200})
+        buffer.flush()
+
+        with mock.patch("requests.Session.get", side_effect=unreachable_upstream):
+            response = self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+        self.assertIsNone(response.context["error"])
+        self.assertTrue(response.context["weather"]["stale"])
+        self.assertEqual(response.context["weather"]["hourly"]["snowfall"], [0.2, 0.4])
+        self.assertEqual(response.context["weather"]["hourly"]["time"], FORECAST_PAYLOAD["hourly"]["time"])
+        self.assertContains(response, "Showing the last known forecast")
+
+
+class UpstreamStubTests(TestCase):
+    """The load-test stubs must answer like the real upstreams."""
+
+    def setUp(self):
+        cache.clear()
+        self.stubs = start_stubs(latency=0)
+        for stub in self.stubs.values():
+            self.addCleanup(stub.server_close)
+            self.addCleanup(stub.shutdown)
+
+    def test_app_parses_stub_responses(self):
+        with override_settings(
+            NOMINATIM_URL=self.stubs["nominatim"].url + "search",
+            OPEN_METEO_URL=self.stubs["open-meteo"].url + "v1/forecast",
+        ):
+            location = fetch_location("Somewhere")
+            weather = get_forecast(location["lat"], location["lon"])
+            batch = get_forecasts([(46.0, 7.0), (47.0, 8.0)])
+        self.assertEqual(len(weather["hourly"]["time"]), 24 * 7)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(self.stubs["open-meteo"].counters["calls"], 2)
+
+
+class ForecastApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.set("innsbruck", INNSBRUCK, persist=False)
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_compressed_json_with_strong_etag(self, upstream_get):
+        url = reverse("forecast_api")
+        response = self.client.get(url, {"city": "innsbruck"}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].startswith('"') and response["ETag"].endswith('-gzip"'))
+        payload = json.loads(gzip.decompress(response.content))
+        self.assertEqual(payload["hourly"]["snowfall"], [0.2, 0.4])
+        self.assertEqual(payload["grid_cell"], [47.3, 11.4])
+
+        plain = self.client.get(url, {"city": "innsbruck"})
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertNotEqual(plain["ETag"], response["ETag"])
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_unchanged_forecast_is_not_modified(self, upstream_get):
+        url = reverse("forecast_api")
+        first = self.client.get(url, {"city": "innsbruck"}, HTTP_ACCEPT_ENCODING="br, gzip")
+        with mock.patch("ski_app.api.normalized_forecast") as build:
+            revalidated = self.client.get(
+                url, {"city": "innsbruck"}, HTTP_ACCEPT_ENCODING="br, gzip",
+                HTTP_IF_NONE_MATCH=first["ETag"],
+            )
+            since = self.client.get(
+                url, {"city": "innsbruck"}, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"],
+            )
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b"")
+        self.assertEqual(since.status_code, 304)
+        build.assert_not_called()
+
+    @override_settings(FORECAST_BATCH_SIZE=2)
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_compare_fetches_misses_in_batches(self, upstream_get):
+        resorts = {"ischgl": (47.01, 10.29), "zermatt": (46.02, 7.75), "laax": (46.81, 9.26)}
+        for name, (lat, lon) in resorts.items():
+            geocode_cache.set(name, {"lat": lat, "lon": lon}, persist=False)
+        get_forecast(*INNSBRUCK_POINT)
+
+        cities = ["innsbruck", *resorts]
+        response = self.client.get(reverse("compare_api"), {"city": cities})
+        self.assertEqual([f["city"] for f in response.json()["forecasts"]], cities)
+        # One call for Innsbruck up front, then two batches for the three misses
+        self.assertEqual(upstream_get.call_count, 3)
+        self.assertEqual(upstream_get.call_args_list[1].kwargs["params"]["latitude"], "47.0,46.0")
+
+        self.client.get(reverse("compare_api"), {"city": cities})
+        self.assertEqual(upstream_get.call_count, 3)
+
+    def test_missing_city(self):
+        self.assertEqual(self.client.get(reverse("forecast_api")).status_code, 400)
+
+
+class SnowRankingTests(TestCase):
+    def test_scores_only_the_window(self):
+        snowfall = np.array([[5, 5, 5, 5], [0, 0, 10, 10]], np.float32)
+        depth = np.array([[0.5] * 4, [1.0] * 4], np.float32)
+        temperature = np.array([[-5] * 4, [2, 2, 2, np.nan]], np.float32)
+        cloud = np.zeros((2, 4), np.float32)
+        results = score_cells(snowfall, depth, temperature, cloud, np.array([0, 2]), window=2)
+
+        np.testing.assert_allclose(results["new_snow"], [10, 20])
+        np.testing.assert_allclose(results["mean_temperature"], [-5, 2])
+        self.assertGreater(results["score"][1], results["score"][0])
+
+    def test_thousands_of_cells_score_quickly(self):
+        rng = np.random.default_rng(0)
+        matrices = [rng.random((5000, 168), np.float32) for _ in range(4)]
+        started = time.perf_counter()
+        score_cells(*matrices, start=np.zeros(5000, int), window=168)
+        self.assertLess(time.perf_counter() - started, 1)
+
+    def test_new_snapshots_update_rankings(self):
+        GeocodedLocation.objects.create(query="innsbruck", latitude=47.26, longitude=11.39)
+        buffer = SnapshotBuffer(batch_size=10, interval=3600)
+        buffer.add((47.3, 11.4), {"data": FORECAST_PAYLOAD, "fetched_at": time.time()})
+        buffer.flush()
+
+        score = ResortSnowScore.objects.get()
+        self.assertEqual(score.name, "innsbruck")
+        response = self.client.get(reverse("rankings_api"), {"limit": 5})
+        self.assertEqual(response.json()["resorts"][0]["name"], "innsbruck")
+
+    def test_cells_are_named_after_their_resort(self):
+        GeocodedLocation.objects.create(query="neustift im stubaital", latitude=47.11, longitude=11.31)
+        buffer = SnapshotBuffer(batch_size=10, interval=3600)
+        # Stubai Glacier is in the gazetteer and never geocoded.
+        buffer.add(grid_cell(47.109, 11.306), {"data": FORECAST_PAYLOAD, "fetched_at": time.time()})
+        buffer.flush()
+        self.assertEqual(ResortSnowScore.objects.get().name, "Stubai Glacier")
+
+    def test_scores_of_old_model_runs_drop_out(self):
+        now = timezone.now()
+        components = {"new_snow": 0, "snow_depth": 0, "mean_temperature": 0, "mean_cloud_cover": 0}
+        for name, score, age in (("fresh", 10, 2), ("forgotten", 50, 72)):
+            ResortSnowScore.objects.create(
+                latitude=score, longitude=score, name=name, score=score,
+                model_run=now - datetime.timedelta(hours=age), **components,
+            )
+        self.assertEqual([s.name for s in top_resorts(now=now)], ["fresh"])
+
+
+class SkiConditionsTests(TestCase):
+    def test_metrics_start_at_the_fetch_hour(self):
+        times = [f"2024-01-0{1 + i // 24}T{i % 24:02d}:00" for i in range(96)]
+        data = {
+            "utc_offset_seconds": 3600,
+            "hourly": {
+                "time": times,
+                "snowfall": [1.0] * 96,
+                "snow_depth": [0.5 + i * 0.01 for i in range(96)],
+                # Six hours above freezing, six below, ...
+                "temperature_2m": [3.0 if (i // 6) % 2 else -3.0 for i in range(96)],
+                "cloud_cover": [50] * 90 + [None] * 6,
+            },
+        }
+        # 2024-01-01T05:00 local time
+        fetched_at = datetime.datetime(2024, 1, 1, 4, tzinfo=datetime.timezone.utc).timestamp()
+        conditions = derive_conditions(data, fetched_at)
+
+        self.assertEqual(conditions["new_snow_24h"], 24.0)
+        self.assertEqual(conditions["new_snow_72h"], 72.0)
+        self.assertEqual(conditions["snow_depth_change_24h"], 24.0)
+        self.assertEqual(conditions["freeze_thaw_cycles_72h"], 6)
+        self.assertEqual(len(conditions["powder_score"]), 96)
+        self.assertEqual(conditions["powder_score"][0], 23)
+        self.assertGreaterEqual(conditions["best_powder_hour"], "2024-01-01T05:00")
+        self.assertEqual(derive_conditions({}, 0)["powder_score"], [])
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_conditions_are_derived_once_per_fetch(self, upstream_get):
+        cache.clear()
+        with mock.patch("ski_app.forecast.derive_conditions", wraps=derive_conditions) as derive:
+            for _ in range(2):
+                forecast = get_forecast(*INNSBRUCK_POINT)
+        self.assertEqual(derive.call_count, 1)
+        # The fixture's hours are long past, so the windows hold only its last hour.
+        self.assertEqual(forecast["conditions"]["new_snow_24h"], 0.4)
+
+        response = self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+        self.assertContains(response, "Powder Score")
+
+
+class ForecastSerializerTests(TestCase):
+    def setUp(self):
+        self.serializer = ForecastSerializer({})
+
+    def test_forecast_entries_decode_to_packed_arrays(self):
+        payload = json.loads(json.dumps(FORECAST_PAYLOAD))
+        payload["hourly"]["cloud_cover"] = [90, None]
+        entry = new_entry(payload, time.time())
+        decoded = self.serializer.loads(self.serializer.dumps(entry))
+
+        hourly = decoded["data"]["hourly"]
+        self.assertEqual(list(hourly["time"]), FORECAST_PAYLOAD["hourly"]["time"])
+        self.assertEqual(hourly["snow_depth"].dtype, np.float32)
+        self.assertEqual(hourly["weather_code"].dtype, np.int16)
+        self.assertFalse(hourly["snowfall"].flags.owndata)
+        self.assertEqual(decoded["conditions"], entry["conditions"])
+
+        # The page and the API see the same values as before packing.
+        forecast = _forecast_from_entry(decoded, grid_cell(*INNSBRUCK_POINT))
+        self.assertEqual(forecast_rows(forecast["hourly"], ("snow_depth", "cloud_cover")), [(0.5, 90), (0.52, None)])
+        api = json.loads(json.dumps(normalized_forecast("Innsbruck", INNSBRUCK, forecast)))
+        self.assertEqual(api["hourly"]["snowfall"], [0.2, 0.4])
+        self.assertEqual(api["daily"]["time"], ["2024-01-01"])
+
+    def test_negative_whole_numbers_are_not_read_as_gaps(self):
+        payload = json.loads(json.dumps(FORECAST_PAYLOAD))
+        payload["hourly"]["temperature_2m"] = [-1, None]
+        decoded = self.serializer.loads(self.serializer.dumps(new_entry(payload, time.time())))
+
+        temperature = decoded["data"]["hourly"]["temperature_2m"]
+        self.assertEqual(temperature.dtype, np.float32)
+        self.assertEqual(series_values(temperature), [-1, None])
+
+    def test_other_values_are_pickled(self):
+        for value in ({"lat": 47.26, "lon": 11.39}, [("innsbruck", 3, 2)], b"\x1f\x8b", "fragment"):
+            self.assertEqual(self.serializer.loads(self.serializer.dumps(value)), value)
+
+
+class ClimatologyTests(TestCase):
+    def test_weekly_percentiles_match_a_per_week_scan(self):
+        start = datetime.date(2020, 1, 1)
+        depth = np.random.default_rng(0).random(366 * 3)
+        percentiles, snowfall = weekly_statistics(start, depth, np.ones_like(depth))
+
+        dates = [start + datetime.timedelta(days=i) for i in range(len(depth))]
+        for week in (0, 20, 51):
+            values = [d for d, day in zip(depth, dates) if min((day.timetuple().tm_yday - 1) // 7, 51) == week]
+            self.assertAlmostEqual(percentiles[50][week], np.percentile(values, 50))
+            self.assertAlmostEqual(percentiles[90][week], np.percentile(values, 90))
+        self.assertEqual(snowfall[10], 7)
+
+    def test_backfill_from_the_archive_stub(self):
+        stubs = start_stubs(latency=0)
+        for stub in stubs.values():
+            self.addCleanup(stub.server_close)
+            self.addCleanup(stub.shutdown)
+        names = [resort.name for resort in get_gazetteer().resorts[:3]]
+
+        with override_settings(OPEN_METEO_ARCHIVE_URL=stubs["open-meteo-archive"].url + "v1/archive"):
+            call_command("backfill_climate", *names, years=2, end=datetime.date(2024, 6, 30), stdout=io.StringIO())
+            # A later run only fetches the days since.
+            call_command("backfill_climate", *names, years=2, end=datetime.date(2024, 7, 31), stdout=io.StringIO())
+        self.assertEqual(stubs["open-meteo-archive"].counters["calls"], 6)
+        history = ClimateHistory.objects.get(resort=names[0])
+        self.assertEqual(history.start_date, datetime.date(2022, 7, 1))
+        self.assertEqual(history.end_date, datetime.date(2024, 7, 31))
+
+        response = self.client.get(reverse("climatology_api"), {"resort": names[0]})
+        weeks = response.json()["weeks"]
+        self.assertEqual(len(weeks), 52)
+        self.assertEqual(weeks[5]["starts"], "02-05")
+        self.assertGreater(weeks[5]["snow_depth"]["p50"], weeks[30]["snow_depth"]["p50"])
+        self.assertLessEqual(weeks[5]["snow_depth"]["p10"], weeks[5]["snow_depth"]["p90"])
+
+        best = self.client.get(reverse("climatology_best_api"), {"week": 6}).json()["resorts"]
+        self.assertEqual(sorted(r["name"] for r in best), sorted(names))
+        medians = [r["snow_depth"]["p50"] for r in best]
+        self.assertEqual(medians, sorted(medians, reverse=True))
+        self.assertEqual(self.client.get(reverse("climatology_best_api"), {"week": 53}).status_code, 400)
+
+
+class StartupTests(TestCase):
+    def test_migrate_runs_only_when_migrations_are_pending(self):
+        with mock.patch("ski_app.startup.call_command") as call:
+            self.assertFalse(migrate_if_needed())
+            call.assert_not_called()
+            with mock.patch("ski_app.startup.pending_migrations", return_value=[("migration", False)]):
+                self.assertTrue(migrate_if_needed())
+            call.assert_called_once_with("migrate", interactive=False, skip_checks=True)
+
+    def test_shared_cache_is_warmed_once(self):
+        cache.clear()
+        geocode_cache.lru.clear()
+        GeocodedLocation.objects.create(query="innsbruck", latitude=47.26, longitude=11.39)
+
+        self.assertEqual(warm_shared_cache(), 1)
+        self.assertEqual(warm_shared_cache(), 0)
+        geocode_cache.lru.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(geocode_cache.get("innsbruck")["lat"], 47.26)
+
+
+class LiveUpdatesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(LIVE_KEEPALIVE=0.01)
+    async def test_stored_runs_are_pushed_as_diffs(self):
+        cell = grid_cell(*INNSBRUCK_POINT)
+        await cache.aset(forecast_cache_key(cell), new_entry(FORECAST_PAYLOAD, 1000.0))
+        stream = event_stream(cell, since=1000.0)
+        self.assertTrue((await anext(stream)).startswith("retry:"))
+        # Nothing newer than the page's forecast yet.
+        self.assertEqual(await anext(stream), ": keepalive\n\n")
+
+        payload = {**FORECAST_PAYLOAD, "current": {**FORECAST_PAYLOAD["current"], "snow_depth": 0.6}}
+        await cache.aset(forecast_cache_key(cell), new_entry(payload, 2000.0))
+        # As the snapshot flush thread does once the run is stored.
+        snapshots = [ForecastSnapshot(latitude=cell[0], longitude=cell[1])]
+        await sync_to_async(publish_new_runs)(ForecastSnapshot, snapshots)
+        event = await anext(stream)
+        self.assertIn("id: 2000.0", event)
+        self.assertEqual(json.loads(event.split("data: ")[1]), {"fetched_at": 2000.0, "current.snow_depth": 0.6})
+        await stream.aclose()
+        self.assertEqual(hub.dispatch(cell), 0)
+
+        # A page opened before that run catches up at once.
+        stream = event_stream(cell, since=1000.0)
+        await anext(stream)
+        self.assertEqual(json.loads((await anext(stream)).split("data: ")[1])["current.snow_depth"], 0.6)
+        await stream.aclose()
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_results_page_subscribes_to_its_forecast(self, upstream_get):
+        with override_settings(LIVE_UPDATES=True):
+            response = self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+            self.assertContains(response, 'data-live="current.snow_depth"')
+            self.assertContains(response, "new EventSource")
+            self.assertEqual(self.client.get(reverse("live_forecast")).status_code, 400)
+        self.assertNotContains(self.client.get(reverse("search_weather"), {"city": "Innsbruck"}), "new EventSource")
+        self.assertEqual(self.client.get(reverse("live_forecast"), {"lat": 47.26, "lon": 11.39}).status_code, 404)
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_snapped_page_subscribes_to_the_cell_it_was_served_from(self, upstream_get):
+        get_forecast(47.3, 11.4)
+        with override_settings(FORECAST_SNAP_KM=5):
+            forecast = get_forecast(47.3, 11.46)
+        self.assertEqual(forecast["cell"], (47.3, 11.4))
+        self.assertIn("?lat=47.3&lon=11.4&", live_url(forecast))
+
+
+class StaticAssetTests(TestCase):
+    def test_purge_keeps_only_rules_for_used_classes(self):
+        css = (
+            '@charset "UTF-8";/*! banner */:root{--x:1}body{margin:0}.btn,.modal{color:red}'
+            ".modal-open{overflow:hidden}.btn:not(.disabled):hover{color:blue}"
+            "@media (min-width:576px){.container{max-width:540px}.navbar{display:flex}}"
+            "@media print{.navbar{display:none}}@keyframes spin{to{transform:rotate(1turn)}}"
+        )
+        self.assertEqual(
+            purge_css(css, {"btn", "container"}),
+            '@charset "UTF-8";/*! banner */:root{--x:1}body{margin:0}.btn{color:red}'
+            ".btn:not(.disabled):hover{color:blue}@media (min-width:576px){.container{max-width:540px}}"
+            "@keyframes spin{to{transform:rotate(1turn)}}",
+        )
+
+    def test_committed_stylesheet_is_up_to_date(self):
+        static = Path(settings.BASE_DIR) / "static"
+        templates = sorted((Path(__file__).parent / "templates").glob("**/*.html"))
+        built, _ = build_site_css(static, templates, settings.STATIC_PURGE_SAFELIST)
+        self.assertEqual(
+            (static / "build" / "site.min.css").read_bytes(), built,
+            "static/build/site.min.css is out of date; run manage.py build_static_assets.",
+        )
+
+    def test_page_preloads_the_built_stylesheet(self):
+        response = self.client.get(reverse("search_weather"))
+        self.assertEqual(response["Link"], "</static/build/site.min.css>; rel=preload; as=style")
+        self.assertContains(response, 'href="/static/build/site.min.css"')
+        self.assertNotContains(response, "cdn.jsdelivr.net")
+
+
+class SingleFlightTests(TestCase):
+    def run_concurrently(self, flight, fetch, n=5):
+        results, errors = [], []
+
+        def worker():
+            try:
+                results.append(flight.do("innsbruck", fetch))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_callers_share_one_fetch(self):
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return INNSBRUCK
+
+        flight = SingleFlight("shared", timeout=5)
+        threads, results, errors = self.run_concurrently(flight, fetch)
+        while flight.stats().get("coalesced", 0) < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [INNSBRUCK] * 5)
+        self.assertEqual(errors, [])
+        for result, count in (("coalesced", 4), ("fetches", 1)):
+            labels = {"flight": "shared", "result": result}
+            self.assertEqual(REGISTRY.get_sample_value("skiapp_singleflight_calls_total", labels), count)
+
+    async def test_async_callers_share_the_fetch_with_threads(self):
+        release = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return INNSBRUCK
+
+        flight = SingleFlight("test", timeout=5)
+        callers = [asyncio.ensure_future(flight.ado("innsbruck", fetch)) for _ in range(3)]
+        callers.append(asyncio.ensure_future(asyncio.to_thread(flight.do, "innsbruck", lambda: calls.append(1))))
+        while flight.stats().get("coalesced", 0) < 3:
+            await asyncio.sleep(0.01)
+        release.set()
+
+        self.assertEqual(await asyncio.gather(*callers), [INNSBRUCK] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_waiters_time_out(self):
+        release = threading.Event()
+        flight = SingleFlight("test", timeout=0.05)
+        threads, results, errors = self.run_concurrently(flight, lambda: release.wait(5), n=2)
+        while not errors:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(errors[0], TimeoutError)
+
+
+class SearchWeatherTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.lru.clear()
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_repeat_search_skips_nominatim(self, upstream_get):
+        for city in ("Innsbruck", "innsbruck "):
+            response = self.client.get(reverse("search_weather"), {"city": city})
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.context["error"])
+
+        nominatim_calls = [c for c in upstream_get.call_args_list if "nominatim" in c.args[0]]
+        self.assertEqual(len(nominatim_calls), 1)
+        self.assertTrue(GeocodedLocation.objects.filter(query="innsbruck").exists())
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_stage_timings_and_metrics(self, upstream_get):
+        response = self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+        stages = [entry.split(";")[0] for entry in response["Server-Timing"].split(", ")]
+        for name in ("geocode", "nominatim", "forecast", "open-meteo", "cache", "db", "render", "total"):
+            self.assertIn(name, stages)
+
+        self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+        metrics = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('skiapp_stage_duration_seconds_count{stage="render"}', metrics)
+        self.assertIn('skiapp_upstream_requests_total{outcome="ok",upstream="open-meteo"}', metrics)
+        self.assertIn('skiapp_cache_hit_ratio{cache="forecast"}', metrics)
+        self.assertIn("skiapp_requests_in_flight", metrics)
+
+        with override_settings(METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+            self.assertEqual(
+                self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret").status_code, 200
+            )
+
+    @mock.patch("requests.Session.get", side_effect=fake_upstream)
+    def test_forecast_tables_are_rendered_once_per_fetch(self, upstream_get):
+        with mock.patch("ski_app.views.forecast_rows", wraps=forecast_rows) as rows:
+            first = self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+            second = self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+
+        self.assertContains(first, "<td>2024-01-01T01:00</td>")
+        self.assertContains(second, "<td>2024-01-01T01:00</td>")
+        # Daily and hourly rows are built for the first page view only
+        self.assertEqual(rows.call_count, 2)
+
+    @override_settings(STREAM_SEARCH_PAGE=True)
+    def test_page_shell_is_streamed_before_the_lookups(self):
+        def requests_seen():
+            labels = {"view": "search_weather", "status": "200"}
+            return REGISTRY.get_sample_value("skiapp_request_duration_seconds_count", labels) or 0
+
+        before = requests_seen()
+        with mock.patch("requests.Session.get", side_effect=fake_upstream) as upstream_get:
+            response = self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+            chunks = iter(response.streaming_content)
+            shell = next(chunks).decode()
+            self.assertEqual(upstream_get.call_count, 0)
+            # The request is timed and in flight until the stream is done.
+            self.assertEqual(REGISTRY.get_sample_value("skiapp_requests_in_flight"), 1)
+            self.assertEqual(requests_seen(), before)
+            rest = b"".join(chunks).decode()
+        self.assertEqual(REGISTRY.get_sample_value("skiapp_requests_in_flight"), 0)
+        self.assertEqual(requests_seen(), before + 1)
+        self.assertNotIn("Server-Timing", response)
+
+        self.assertIn("build/site.min.css", shell)
+        self.assertIn('id="loading"', shell)
+        self.assertIn("<td>2024-01-01T01:00</td>", rest)
+        self.assertTrue(rest.rstrip().endswith("</html>"))
+
+    @override_settings(STREAM_SEARCH_PAGE=True)
+    @mock.patch("ski_app.views.cached_trending_resorts", side_effect=ConnectionError("redis down"))
+    def test_streamed_page_is_finished_without_trending_resorts(self, trending):
+        with mock.patch("requests.Session.get", side_effect=fake_upstream):
+            response = self.client.get(reverse("search_weather"), {"city": "Innsbruck"})
+            page = b"".join(response.streaming_content).decode()
+
+        self.assertIn("<td>2024-01-01T01:00</td>", page)
+        self.assertTrue(page.rstrip().endswith("</html>"))
+
+    @mock.patch("ski_app.views.cached_trending_resorts", side_effect=ConnectionError("redis down"))
+    def test_page_renders_without_trending_resorts(self, trending):
+        response = self.client.get(reverse("search_weather"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["trending"], [])
+
+    @override_settings(STREAM_SEARCH_PAGE=True)
+    @mock.patch("httpx.AsyncClient.get", side_effect=fake_upstream)
+    async def test_async_view_streams_the_page(self, upstream_get):
+        response = await search_weather_async(RequestFactory().get("/", {"city": "Innsbruck"}))
+        chunks = [chunk async for chunk in response.streaming_content]
+
+        self.assertGreater(len(chunks), 1)
+        self.assertIn(b"-3.0", b"".join(chunks))
+
+    @mock.patch("httpx.AsyncClient.get", side_effect=fake_upstream)
+    async def test_async_view_reuses_cached_location(self, upstream_get):
+        request = RequestFactory().get("/", {"city": "Innsbruck"})
+        for _ in range(2):
+            response = await search_weather_async(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"-3.0", response.content)
+
+        nominatim_calls = [c for c in upstream_get.call_args_list if "nominatim" in c.args[0]]
+        self.assertEqual(len(nominatim_calls), 1)
+        self.assertEqual(upstream_get.call_count, 2)
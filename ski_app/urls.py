@@ -1,6 +1,16 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, live, metrics, views
 
 urlpatterns = [
-    path('', views.search_weather, name='search_weather'),
+    path('', views.search_weather_async if settings.ASYNC_VIEWS else views.search_weather, name='search_weather'),
+    path('api/forecast/', api.forecast_api, name='forecast_api'),
+    path('api/compare/', api.compare_api, name='compare_api'),
+    path('api/nearby/', api.nearby_api, name='nearby_api'),
+    path('api/rankings/', api.rankings_api, name='rankings_api'),
+    path('metrics', metrics.metrics_view, name='metrics'),
+    path('api/autocomplete/', api.autocomplete_api, name='autocomplete_api'),
+    path('api/climatology/', api.climatology_api, name='climatology_api'),
+    path('api/climatology/best/', api.climatology_best_api, name='climatology_best_api'),
+    path('live/forecast/', live.forecast_updates, name='live_forecast'),
 ]
\ No newline at end of file
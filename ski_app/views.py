@@ -1,38 +1,198 @@
+import datetime
+import logging
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
-from django.http import HttpResponse
-import requests
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .analytics import cached_trending_resorts, record_search, visitor_id
+from .forecast import aget_forecast, get_forecast, peek_forecasts
+from .geocoding import ageocode, geocode
+from .metrics import stage
+from .snapshots import series_values
+from .spatial import nearest_resorts
+
+HOURLY_COLUMNS = ("time", "temperature_2m", "snowfall", "snow_depth", "weather_code", "cloud_cover", "powder_score")
+DAILY_COLUMNS = ("time", "temperature_2m_min", "temperature_2m_max", "sunshine_duration")
+
+logger = logging.getLogger(__name__)
+
+
+def preload_assets(response):
+    """Let the browser (or a CDN sending 103 Early Hints) fetch the stylesheet right away."""
+    response['Link'] = f"<{static('build/site.min.css')}>; rel=preload; as=style"
+    return response
+
+
+def forecast_rows(series, columns):
+    """Zip an Open-Meteo ``hourly``/``daily`` block into one tuple per row.
+
+    Series read from Redis are packed arrays (``ski_app.serializers``); they
+    are turned back into plain values first.
+    """
+    values = (series[column] for column in columns)
+    return list(zip(*(series_values(v) if isinstance(v, np.ndarray) else v for v in values)))
+
+
+def nearby_resorts(lat, lon):
+    """Resorts near a searched place, with their forecast when it is already cached.
+
+    The resort that was searched for itself is left out.
+    """
+    nearby = [
+        (resort, km)
+        for resort, km in nearest_resorts(lat, lon, n=settings.NEARBY_RESORTS + 1, max_km=settings.NEARBY_MAX_KM)
+        if km > 0.1
+    ][:settings.NEARBY_RESORTS]
+    forecasts = peek_forecasts([(resort.latitude, resort.longitude) for resort, _ in nearby])
+    return [
+        {"name": resort.name, "country": resort.country, "distance_km": round(km, 1), "forecast": forecast}
+        for (resort, km), forecast in zip(nearby, forecasts)
+    ]
+
+
+def live_url(weather):
+    """Where the page gets runs of its forecast newer than the one it shows (``ski_app.live``)."""
+    # The cell the forecast was served from, which may be adjacent to the searched point's.
+    lat, lon = weather['cell']
+    query = urlencode({"lat": lat, "lon": lon, "since": weather['fetched_at']})
+    return f"{reverse('live_forecast')}?{query}"
+
+
+def trending_or_nothing():
+    """``cached_trending_resorts``, or an empty list when Redis or the database fails.
+
+    A streamed page has already been sent its 200 and shell by the time this
+    runs, so an error here would cut it off mid-way.
+    """
+    try:
+        return cached_trending_resorts()
+    except Exception:
+        logger.warning("Loading trending resorts failed", exc_info=True)
+        return []
+
+
+def results_context(city, weather, error, trending, nearby=()):
+    """Template context for ``search_results.html``.
+
+    The forecast tables are cached as a template fragment per grid cell and
+    fetch, so their rows are passed as callables: the template only builds
+    them when it actually renders the fragment.
+    """
+    context = {"city": city, "weather": weather, "error": error, "trending": trending, "nearby": nearby}
+    if weather:
+        cell = weather['cell']
+        context.update({
+            "live_url": live_url(weather) if settings.LIVE_UPDATES else None,
+            "fetched_at": datetime.datetime.fromtimestamp(weather['fetched_at'], tz=datetime.timezone.utc),
+            "forecast_version": f"{cell[0]}:{cell[1]}:{weather['fetched_at']}",
+            "fragment_timeout": settings.FORECAST_CACHE_TTL,
+            "daily_rows": lambda: forecast_rows(weather['daily'], DAILY_COLUMNS),
+            "hourly_rows": lambda: forecast_rows(
+                {**weather['hourly'], 'powder_score': weather['conditions']['powder_score']}, HOURLY_COLUMNS
+            ),
+        })
+    return context
+
+
+def load_results(request, city):
+    """Geocode ``city`` and look up its forecast; returns ``(weather, error, nearby)``."""
+    try:
+        # Fetch latitude and longitude, from cache when we've seen this city before
+        with stage("geocode"):
+            location = geocode(city)
+        lat, lon = location['lat'], location['lon']
+
+        # Fetch weather data for the forecast grid cell, served from cache when warm
+        with stage("forecast"):
+            weather = get_forecast(lat, lon)
+        weather['latitude'] = lat
+        weather['longitude'] = lon
+        with stage("nearby"):
+            nearby = nearby_resorts(lat, lon)
+        record_search(city, visitor_id(request))
+    except Exception as e:
+        return None, f"{e} City not found or an error occurred. Please try again.", ()
+    return weather, None, nearby
+
+
+async def aload_results(request, city):
+    """Async version of ``load_results``."""
+    try:
+        with stage("geocode"):
+            location = await ageocode(city)
+        lat, lon = location['lat'], location['lon']
+
+        with stage("forecast"):
+            weather = await aget_forecast(lat, lon)
+        weather['latitude'] = lat
+        weather['longitude'] = lon
+        with stage("nearby"):
+            nearby = await sync_to_async(nearby_resorts)(lat, lon)
+        await sync_to_async(record_search)(city, visitor_id(request))
+    except Exception as e:
+        return None, f"{e} City not found or an error occurred. Please try again.", ()
+    return weather, None, nearby
+
+
+def stream_page(request, city, results):
+    """Yield the page shell at once, then the results once ``results()`` returns.
+
+    ``results`` returns the ``results_context`` for the page; while it runs
+    the browser is already fetching the stylesheet and showing the form.
+    """
+    yield render_to_string("search_page_start.html", {"city": city, "loading": True}, request)
+    context = results()
+    with stage("render"):
+        yield render_to_string("search_results_body.html", {**context, "loading": True}, request)
+        yield render_to_string("search_page_end.html", context, request)
+
+
+async def astream_page(request, city, results):
+    """Async version of ``stream_page``; ``results`` is a coroutine function."""
+    yield render_to_string("search_page_start.html", {"city": city, "loading": True}, request)
+    context = await results()
+    with stage("render"):
+        yield render_to_string("search_results_body.html", {**context, "loading": True}, request)
+        yield render_to_string("search_page_end.html", context, request)
+
 
 def search_weather(request):
     city = request.GET.get('city')
-    error = None
-    weather = None
-
-    if city:
-        try:
-            # Fetch latitude and longitude
-            headers = {"User-Agent": "SkiApp"}
-            nominatim_url = f"https://nominatim.openstreetmap.org/search?q={city}&format=json"
-            nom_response = requests.get(nominatim_url, headers=headers)
-            nom_response.raise_for_status()
-            location = nom_response.json()[0]
-            lat, lon = location['lat'], location['lon']
-
-            # Fetch weather data
-            weather_url = "https://api.open-meteo.com/v1/forecast"
-            params = {
-                "latitude": lat,
-                "longitude": lon,
-                "hourly": ["temperature_2m", "snowfall", "snow_depth", "weather_code", "cloud_cover"],
-                "daily": ["temperature_2m_max", "temperature_2m_min", "sunshine_duration"],
-                "current": ["temperature_2m","snow_depth","snowfall","weather_code"],
-                "timezone": "Europe/Berlin"
-            }
-            weather_response = requests.get(weather_url, params=params)
-            weather_response.raise_for_status()
-            weather = weather_response.json()
-            weather['latitude'] = lat
-            weather['longitude'] = lon
-        except Exception as e:
-            error = f"{e} City not found or an error occurred. Please try again."
-
-    return render(request, "search_results.html", {"city": city, "weather": weather, "error": error})
+
+    def results():
+        weather, error, nearby = load_results(request, city) if city else (None, None, ())
+        return results_context(city, weather, error, trending_or_nothing(), nearby)
+
+    if city and settings.STREAM_SEARCH_PAGE:
+        return preload_assets(StreamingHttpResponse(stream_page(request, city, results)))
+    context = results()
+    with stage("render"):
+        return preload_assets(render(request, "search_results.html", context))
+
+
+async def search_weather_async(request):
+    """Async version of ``search_weather`` for ASGI servers.
+
+    Upstream calls go through the pooled HTTP/2 client and don't hold a
+    worker thread while waiting. Cities already in the in-memory geocode
+    tier resolve without any I/O, so their forecast fetch starts at once.
+    """
+    city = request.GET.get('city')
+
+    async def results():
+        weather, error, nearby = await aload_results(request, city) if city else (None, None, ())
+        trending = await sync_to_async(trending_or_nothing)()
+        return results_context(city, weather, error, trending, nearby)
+
+    if city and settings.STREAM_SEARCH_PAGE:
+        return preload_assets(StreamingHttpResponse(astream_page(request, city, results)))
+    context = await results()
+    with stage("render"):
+        return preload_assets(render(request, "search_results.html", context))
@@ -11,6 +11,18 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'skiproject.settings')
+# Check for the WEBSITE_HOSTNAME environment variable to see if we are running in Azure Ap Service
+# If so, then load the settings from production.py
+settings_module = 'skiproject.production' if 'WEBSITE_HOSTNAME' in os.environ else 'skiproject.settings'
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+# The ASGI server can run the async search view, so prefer it unless told otherwise
+os.environ.setdefault('ASYNC_VIEWS', '1')
+
+# Servers flush streamed responses, so send the search page shell early
+os.environ.setdefault('STREAM_SEARCH_PAGE', '1')
+
+# Open search pages can hold a live update stream without tying up a worker
+os.environ.setdefault('LIVE_UPDATES', '1')
 
 application = get_asgi_application()
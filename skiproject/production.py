@@ -11,6 +11,8 @@ DEBUG = False
 
 # WhiteNoise configuration
 MIDDLEWARE = [
+    # Outermost, so its timings cover the other middleware too
+    'ski_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # Add whitenoise middleware after the security middleware
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -23,7 +25,12 @@ MIDDLEWARE = [
 ]
 
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# collectstatic writes content-hashed copies of every file plus gzip and (with brotli
+# installed) brotli variants; WhiteNoise serves hashed files as immutable for a year+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # Configure Postgres database based on connection string of the libpq Keyword/Value form
@@ -44,9 +51,13 @@ CACHES = {
         "default": {  
             "BACKEND": "django_redis.cache.RedisCache",
             "LOCATION": os.environ.get('AZURE_REDIS_CONNECTIONSTRING'),
+            # Values are stored in a new format (forecast entries as packed arrays,
+            # LZ4 instead of zlib), so keys of the old format are left to expire
+            "VERSION": 2,
             "OPTIONS": {
                 "CLIENT_CLASS": "django_redis.client.DefaultClient",
-                "COMPRESSOR": "django_redis.compressors.zlib.ZlibCompressor",
+                "SERIALIZER": "ski_app.serializers.ForecastSerializer",
+                "COMPRESSOR": "django_redis.compressors.lz4.Lz4Compressor",
         },
     }
 }
\ No newline at end of file
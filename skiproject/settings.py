@@ -40,10 +40,12 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'ski_app.apps.StaticFilesConfig',
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover the other middleware too
+    'ski_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -152,3 +154,111 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Geocode cache: per-process LRU in front of the shared cache and the database
+GEOCODE_LRU_SIZE = int(os.environ.get('GEOCODE_LRU_SIZE', 2048))
+GEOCODE_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Forecast cache: entries are keyed by model grid cell (in degrees) and are fresh for one
+# model update cycle, then served stale while a background refresh runs
+FORECAST_GRID_RESOLUTION = 0.1
+FORECAST_CACHE_TTL = 60 * 60
+FORECAST_STALE_TTL = 60 * 60 * 24
+FORECAST_REFRESH_LOCK_TIMEOUT = 60
+
+# Single-flight coalescing of identical upstream lookups: how long waiters wait for the
+# in-flight fetch, and how long the cross-worker Redis lock may be held
+SINGLEFLIGHT_TIMEOUT = 10
+SINGLEFLIGHT_LOCK_TTL = 30
+
+# Serve search_weather with the async view; enable when running under an ASGI server
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '').lower() in ('1', 'true')
+
+# Connection pool for upstream API clients, shared per worker process
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_KEEPALIVE_EXPIRY = 60
+
+# Fetched forecasts are stored as ForecastSnapshot rows, written in batches
+SNAPSHOT_BATCH_SIZE = 50
+SNAPSHOT_FLUSH_INTERVAL = 60
+
+# Forecast prefetcher (manage.py prefetch_forecasts): resorts that are always kept warm,
+# how many other known resorts to add, and how hard it may hit Open-Meteo
+PREFETCH_RESORTS = [name for name in os.environ.get('PREFETCH_RESORTS', '').split(',') if name.strip()]
+PREFETCH_TOP_N = 100
+PREFETCH_INTERVAL = 60 * 30
+PREFETCH_CONCURRENCY = 4
+PREFETCH_RATE_LIMIT = 5
+
+# Search analytics are counted in Redis and flushed to the database by
+# manage.py flush_search_stats; trending resorts cover the last TRENDING_DAYS days
+SEARCH_STATS_FLUSH_INTERVAL = 60
+TRENDING_DAYS = 7
+
+# JSON API responses are compressed once per forecast; brotli quality 5 is a good
+# size/CPU trade-off for small JSON bodies
+API_BROTLI_QUALITY = 5
+API_MAX_RANKING_LIMIT = 500
+API_MAX_COMPARE_CITIES = 50
+
+# Resorts are ranked on the next SNOW_SCORE_WINDOW_HOURS hours of their latest forecast
+SNOW_SCORE_WINDOW_HOURS = 24 * 7
+# Cells whose latest scored model run is older than this drop out of the rankings
+SNOW_SCORE_MAX_AGE_HOURS = 24
+
+# Cache misses for several locations are fetched with one Open-Meteo request per batch
+FORECAST_BATCH_SIZE = 50
+
+# Bundled resort gazetteer, used for autocomplete and to geocode known resorts offline
+GAZETTEER_PATH = BASE_DIR / 'ski_app' / 'data' / 'resorts.csv'
+AUTOCOMPLETE_LIMIT = 10
+
+# A point whose forecast cell isn't cached uses an adjacent cached cell whose centre
+# is at most this far away (0 disables snapping); searches show the nearest resorts
+FORECAST_SNAP_KM = 3
+NEARBY_RESORTS = 5
+NEARBY_MAX_KM = 50
+
+# Upstream API endpoints; the load-test harness points these at local stubs
+NOMINATIM_URL = os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/search')
+OPEN_METEO_URL = os.environ.get('OPEN_METEO_URL', 'https://api.open-meteo.com/v1/forecast')
+OPEN_METEO_ARCHIVE_URL = os.environ.get('OPEN_METEO_ARCHIVE_URL', 'https://archive-api.open-meteo.com/v1/archive')
+
+# Upstream (connect, read) timeouts in seconds. Each upstream gets a circuit breaker
+# that opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures and lets one trial
+# call through every CIRCUIT_RESET_TIMEOUT seconds; while it's open, calls fail fast
+UPSTREAM_TIMEOUTS = {
+    'nominatim': (3.05, 5),
+    'open-meteo': (3.05, 10),
+    'open-meteo-archive': (3.05, 60),
+}
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+
+# /metrics requires "Authorization: Bearer <METRICS_TOKEN>" when the variable is set
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Classes added at runtime that `manage.py build_static_assets` can't find in the templates
+STATIC_PURGE_SAFELIST = []
+
+# Stream search pages: send the page shell before the upstream lookups finish and
+# the results once they have. On by default under wsgi.py/asgi.py
+STREAM_SEARCH_PAGE = os.environ.get('STREAM_SEARCH_PAGE', '').lower() in ('1', 'true')
+
+# Snow climatology (manage.py backfill_climate): years of daily history per resort, and
+# how far behind today the archive's reanalysis data ends
+CLIMATE_YEARS = 10
+CLIMATE_ARCHIVE_LAG_DAYS = 7
+CLIMATE_BACKFILL_WORKERS = 4
+
+# Under FAST_START (startup.sh) the gunicorn master also loads stored geocodes and the
+# trending resorts into the shared cache, at most once per GEOCODE_CACHE_TIMEOUT
+STARTUP_WARMUP = os.environ.get('STARTUP_WARMUP', '').lower() in ('1', 'true')
+
+# Push new model runs to open search pages over Server-Sent Events (ski_app.live). The
+# streams are held open, so this is on by default under asgi.py only. Streams send a
+# keepalive comment every LIVE_KEEPALIVE seconds; browsers reconnect after LIVE_RETRY_MS
+LIVE_UPDATES = os.environ.get('LIVE_UPDATES', '').lower() in ('1', 'true')
+LIVE_KEEPALIVE = 15
+LIVE_RETRY_MS = 5000
@@ -16,4 +16,7 @@ from django.core.wsgi import get_wsgi_application
 settings_module = 'skiproject.production' if 'WEBSITE_HOSTNAME' in os.environ else 'skiproject.settings'
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
 
+# Servers flush streamed responses, so send the search page shell early
+os.environ.setdefault('STREAM_SEARCH_PAGE', '1')
+
 application = get_wsgi_application()
@@ -1,5 +1,13 @@
 # startup.sh is used by infra/resources.bicep to automate database migrations and isn't used by the sample application
-python manage.py migrate
-gunicorn --workers 2 --threads 4 --timeout 60 --access-logfile \
-    '-' --error-logfile '-' --bind=0.0.0.0:8000 \
-     --chdir=/home/site/wwwroot skiproject.wsgi
\ No newline at end of file
+# With FAST_START=1 gunicorn applies pending migrations itself after loading the app once
+# (gunicorn.conf.py), so the container doesn't start Django twice
+if [ "$FAST_START" != "1" ]; then
+    python manage.py migrate
+fi
+
+# Worker settings live in gunicorn.conf.py; set ASGI=1 to serve the async views with uvicorn workers
+if [ "$ASGI" = "1" ]; then
+    gunicorn --config gunicorn.conf.py --chdir=/home/site/wwwroot skiproject.asgi:application
+else
+    gunicorn --config gunicorn.conf.py --chdir=/home/site/wwwroot skiproject.wsgi
+fi
\ No newline at end of file